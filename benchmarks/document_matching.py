@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+Measures what it costs to check a candidate assignment against the document
+of a MATCH pattern, e.g. ``(n:SOMECLASS {kind: "wanted"})``, on nodes that
+carry nested documents. For every candidate, the report gives the time taken
+and the number of objects and bytes that ``copy.deepcopy`` allocated, which
+is where matching used to spend most of its allocations. Each measurement
+runs in its own subprocess.
+
+Point ``--path`` at another checkout to compare against it::
+
+    python benchmarks/document_matching.py --path /tmp/old_checkout
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SNIPPET = '''
+import copy, json, sys, time
+sys.path.insert(0, {path!r})
+from python_cypher import python_cypher
+import networkx as nx
+python_cypher.PRINT_TOKENS = False
+
+copied = {{'calls': 0, 'objects': 0, 'bytes': 0}}
+original_deepcopy = copy.deepcopy
+
+
+def deep_size(obj):
+    copied['objects'] += 1
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += deep_size(key) + deep_size(value)
+    elif isinstance(obj, (list, tuple)):
+        for value in obj:
+            size += deep_size(value)
+    return size
+
+
+def counting_deepcopy(obj, *args, **kwargs):
+    result = original_deepcopy(obj, *args, **kwargs)
+    copied['calls'] += 1
+    copied['bytes'] += deep_size(result)
+    return result
+copy.deepcopy = counting_deepcopy
+
+graph_object = nx.MultiDiGraph()
+for i in range({nodes}):
+    position = dict(('k%d' % j, j) for j in range({width}))
+    position.update({{'x': i % 10, 'y': {{'z': i % 10}}}})
+    graph_object.add_node(
+        'n%d' % i, **{{'class': 'SOMECLASS',
+                      'kind': 'wanted' if i % 10 == 0 else 'other',
+                      'position': position}})
+parser = python_cypher.CypherToNetworkx()
+query = ('MATCH (n:SOMECLASS {{kind: "wanted", position: {{%s, x: 0, '
+         'y: {{z: 0}}}}}}) RETURN n.kind' % ', '.join(
+             'k%d: %d' % (j, j) for j in range({width})))
+list(parser.query(graph_object, query))  # Warm up the parser
+for key in copied:
+    copied[key] = 0
+start = time.time()
+for _ in range({repeat}):
+    rows = list(parser.query(graph_object, query))
+elapsed = time.time() - start
+assignments = float({nodes} * {repeat})
+print(json.dumps({{
+    'rows': len(rows),
+    'seconds_per_assignment': elapsed / assignments,
+    'deepcopy_calls_per_assignment': copied['calls'] / assignments,
+    'objects_copied_per_assignment': copied['objects'] / assignments,
+    'bytes_copied_per_assignment': copied['bytes'] / assignments}}))
+'''
+
+
+def measure(path, nodes, width, repeat):
+    output = subprocess.check_output(
+        [sys.executable, '-c', SNIPPET.format(
+            path=path, nodes=nodes, width=width, repeat=repeat)],
+        stderr=open(os.devnull, 'w'))
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def main():
+    argument_parser = argparse.ArgumentParser(description=__doc__)
+    argument_parser.add_argument('--nodes', type=int, default=1000)
+    argument_parser.add_argument('--width', type=int, default=10,
+                                 help='number of keys in the nested map')
+    argument_parser.add_argument('--repeat', type=int, default=5)
+    argument_parser.add_argument('--path', default=ROOT)
+    arguments = argument_parser.parse_args()
+    path = os.path.abspath(arguments.path)
+    report = measure(path, arguments.nodes, arguments.width,
+                     arguments.repeat)
+    report.update({'path': path,
+                   'nodes': arguments.nodes,
+                   'width': arguments.width,
+                   'repeat': arguments.repeat})
+    print(json.dumps(report, indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
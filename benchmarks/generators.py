@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Seeded generators of synthetic graphs for the benchmarks, shaped like real
+data rather than uniformly random:
+
+* node classes and edge labels follow a Zipf distribution, so a few are
+  common and most are rare;
+* edge endpoints are drawn with a power-law bias towards low-numbered
+  nodes, so a few hubs have very high degree and most nodes have few
+  edges;
+* every node carries a nested property document.
+
+The same arguments always give the same graph::
+
+    graph_object, parser, info = generators.build_graph(10000, seed=0)
+"""
+
+import bisect
+import random
+
+import networkx as nx
+
+from python_cypher import python_cypher
+
+# Node ``i`` of ``n`` is picked with probability roughly proportional to
+# ``(i + 1) ** -(1 - 1 / HUB_BIAS)``; higher values make bigger hubs.
+HUB_BIAS = 3.0
+
+
+def zipf_weights(count, exponent=1.0):
+    """Cumulative weights of ``count`` categories whose frequencies fall
+       off as ``rank ** -exponent``."""
+    cumulative = []
+    total = 0.0
+    for rank in range(1, count + 1):
+        total += rank ** -exponent
+        cumulative.append(total)
+    return cumulative
+
+
+def weighted_choice(rng, cumulative):
+    """Index drawn from the cumulative weights ``cumulative``."""
+    return bisect.bisect_right(cumulative, rng.random() * cumulative[-1])
+
+
+def hub_index(rng, count):
+    """A node index in ``range(count)``, biased towards low indices so that
+       degrees follow a power law."""
+    return min(int(count * rng.random() ** HUB_BIAS), count - 1)
+
+
+def node_class(label):
+    return 'LABEL' + str(label)
+
+
+def edge_label(label):
+    return 'REL' + str(label)
+
+
+def node_document(rng, name):
+    """A nested property document for the node numbered ``name``."""
+    return {
+        'name': name,
+        'rank': rng.randrange(1000),
+        'group': name % 100,
+        'meta': {
+            'score': rng.randrange(1000),
+            'tags': {'region': rng.randrange(10),
+                     'tier': rng.randrange(3)}}}
+
+
+def build_graph(node_count, average_degree=4, node_classes=8,
+                edge_labels=6, seed=0, parser=None, graph_object=None):
+    """Build a graph of ``node_count`` nodes and about ``average_degree``
+       edges per node through the parser's bulk-loading methods, with hash
+       indexes on every class's ``name``. Returns ``(graph_object, parser,
+       info)``, where ``info`` has the node ids and the ``name`` properties
+       by class (``'nodes'``, ``'names'``) and the counts (``'node_count'``,
+       ``'edge_count'``)."""
+    rng = random.Random(seed)
+    if parser is None:
+        parser = python_cypher.CypherToNetworkx()
+    if graph_object is None:
+        graph_object = nx.MultiDiGraph()
+    for label in range(node_classes):
+        parser.create_index(graph_object, node_class(label), 'name')
+    class_weights = zipf_weights(node_classes)
+    names_by_class = {}
+    for name in range(node_count):
+        names_by_class.setdefault(
+            weighted_choice(rng, class_weights), []).append(name)
+    nodes = [None] * node_count
+    nodes_by_class = {}
+    for label in sorted(names_by_class):
+        names = names_by_class[label]
+        new_ids = parser._create_nodes(
+            graph_object, node_class(label),
+            (node_document(rng, name) for name in names))
+        nodes_by_class[node_class(label)] = new_ids
+        for name, new_id in zip(names, new_ids):
+            nodes[name] = new_id
+    label_weights = zipf_weights(edge_labels)
+    pairs_by_label = {}
+    for _ in range(node_count * average_degree):
+        pairs_by_label.setdefault(
+            weighted_choice(rng, label_weights), []).append(
+                (nodes[hub_index(rng, node_count)],
+                 nodes[hub_index(rng, node_count)],))
+    edge_count = 0
+    for label in sorted(pairs_by_label):
+        parser._create_edges(graph_object, pairs_by_label[label],
+                             edge_label=edge_label(label))
+        edge_count += len(pairs_by_label[label])
+    info = {'nodes': nodes_by_class,
+            'names': dict((node_class(label), names) for label, names in
+                          names_by_class.items()),
+            'node_count': node_count,
+            'edge_count': edge_count}
+    return graph_object, parser, info
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Measures the cold-start cost of ``python_cypher``: the time to import it in
+a fresh interpreter, the latency of the first query (which includes building
+the lexer and parser), and whether anything was written to disk along the
+way. Each measurement runs in its own subprocess inside an empty temporary
+directory, after one unmeasured run that leaves the ``.pyc`` files an
+installed package would have.
+
+The first query builds the lexer and parser, which are no longer built at
+import, so it's slower on its own than it was (some 5ms against 0.2ms) even
+though import and first query together are much faster. The tables aren't
+regenerated: ``build`` is the time taken to compile the lexer's regular
+expression from ``lextab`` (most of it) and load ``parsetab``, which no
+query after the first pays again, and which a process that forks workers
+pays once before forking. ``build`` is ``null`` for a checkout that builds
+them at import instead.
+
+Point ``--path`` at another checkout to compare against it::
+
+    python benchmarks/import_time.py --repeat 20 --path /tmp/old_checkout
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SNIPPET = '''
+import os, sys, time, json
+sys.path.insert(0, {path!r})
+start = time.time()
+from python_cypher import python_cypher
+imported = time.time()
+import networkx as nx
+python_cypher.PRINT_TOKENS = False
+graph_object = nx.MultiDiGraph()
+graph_object.add_node('n', **{{'class': 'SOMECLASS', 'foo': 'bar'}})
+query_start = time.time()
+# Older trees build the lexer and parser at import, and have no getters
+get_tokenizer = getattr(python_cypher, 'get_tokenizer', None)
+get_parser = getattr(python_cypher, 'get_parser', None)
+build = None
+if get_tokenizer is not None and get_parser is not None:
+    get_tokenizer()
+    get_parser()
+    build = time.time() - query_start
+rows = list(python_cypher.CypherToNetworkx().query(
+    graph_object, 'MATCH (n:SOMECLASS) RETURN n.foo'))
+done = time.time()
+print(json.dumps({{'import': imported - start,
+                   'build': build,
+                   'first_query': done - query_start}}))
+'''
+
+
+def files_under(directory):
+    found = set()
+    for root, _, files in os.walk(directory):
+        for file_name in files:
+            found.add(os.path.join(root, file_name))
+    return found
+
+
+def environment():
+    """The environment of the subprocesses, with ``.pyc`` files allowed."""
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    return env
+
+
+def measure_once(path):
+    """Run the snippet in a fresh interpreter and empty working directory.
+       Returns the timings and the files that appeared in the working
+       directory or the package directory."""
+    working_directory = tempfile.mkdtemp()
+    package_directory = os.path.join(path, 'python_cypher')
+    before = files_under(package_directory)
+    try:
+        output = subprocess.check_output(
+            [sys.executable, '-c', SNIPPET.format(path=path)],
+            cwd=working_directory, stderr=open(os.devnull, 'w'),
+            env=environment())
+        written = (sorted(files_under(working_directory)) +
+                   sorted(name for name in files_under(package_directory) -
+                          before if not name.endswith('.pyc')))
+    finally:
+        shutil.rmtree(working_directory)
+    result = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+    result['files_written'] = written
+    return result
+
+
+def median(values):
+    """The median of ``values``, or ``None`` if there are none."""
+    if not values:
+        return None
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+def main():
+    argument_parser = argparse.ArgumentParser(description=__doc__)
+    argument_parser.add_argument('--repeat', type=int, default=10)
+    argument_parser.add_argument('--path', default=ROOT)
+    arguments = argument_parser.parse_args()
+    measure_once(os.path.abspath(arguments.path))
+    runs = [measure_once(os.path.abspath(arguments.path))
+            for _ in range(arguments.repeat)]
+    report = {
+        'path': os.path.abspath(arguments.path),
+        'repeat': arguments.repeat,
+        'import_seconds_median': median([run['import'] for run in runs]),
+        'build_seconds_median': median(
+            [run['build'] for run in runs if run['build'] is not None]),
+        'first_query_seconds_median': median(
+            [run['first_query'] for run in runs]),
+        'cold_start_seconds_median': median(
+            [run['import'] + run['first_query'] for run in runs]),
+        'files_written': sorted(set(
+            name for run in runs for name in run['files_written']))}
+    print(json.dumps(report, indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
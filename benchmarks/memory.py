@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Measures how much memory a graph takes in each backend: ``networkx``
+(``CypherToNetworkx`` on a ``MultiDiGraph``) and ``compact``
+(``CypherToCompactGraph`` on a ``CompactGraph``). Each backend is loaded in
+its own subprocess with the same random graph, a query is run against it,
+and the growth of the peak resident set size is reported. The graph is
+measured once for each number of edge labels in ``--edge-labels``, since a
+backend whose adjacency grew with the number of labels would only show it
+on a graph with many of them::
+
+    python benchmarks/memory.py --nodes 200000 --edges 1000000
+    python benchmarks/memory.py --edge-labels 1,50,200
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SNIPPET = '''
+import json, random, resource, sys, time
+sys.path.insert(0, {path!r})
+from python_cypher import python_cypher
+import networkx as nx
+
+
+def peak_bytes():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+if {backend!r} == 'compact':
+    parser = python_cypher.CypherToCompactGraph()
+    graph_object = python_cypher.CompactGraph()
+else:
+    parser = python_cypher.CypherToNetworkx()
+    graph_object = nx.MultiDiGraph()
+random.seed(0)
+before = peak_bytes()
+start = time.time()
+nodes = parser._create_nodes(
+    graph_object, 'SOMECLASS',
+    ({{'name': 'node%d' % (i % 1000), 'bar': i % 100}}
+     for i in xrange({nodes})))
+pairs_by_label = {{}}
+for _ in xrange({edges}):
+    pairs_by_label.setdefault(random.randrange({edge_labels}), []).append(
+        (nodes[random.randrange({nodes})], nodes[random.randrange({nodes})]))
+for label, pairs in sorted(pairs_by_label.items()):
+    parser._create_edges(
+        graph_object, pairs,
+        edge_label='EDGECLASS' if label == 0 else 'EDGECLASS%d' % label)
+del pairs_by_label, pairs
+loaded = time.time()
+rows = list(parser.query(
+    graph_object, 'MATCH (n:SOMECLASS {{name: "node7", bar: 7}})'
+    '-[:EDGECLASS]->(m) RETURN m.bar'))
+done = time.time()
+print(json.dumps({{'bytes': peak_bytes() - before,
+                   'load_seconds': loaded - start,
+                   'query_seconds': done - loaded,
+                   'rows': len(rows)}}))
+'''
+
+
+def measure(path, backend, nodes, edges, edge_labels):
+    output = subprocess.check_output(
+        [sys.executable, '-c', SNIPPET.format(
+            path=path, backend=backend, nodes=nodes, edges=edges,
+            edge_labels=edge_labels)])
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def main():
+    argument_parser = argparse.ArgumentParser(description=__doc__)
+    argument_parser.add_argument('--nodes', type=int, default=100000)
+    argument_parser.add_argument('--edges', type=int, default=500000)
+    argument_parser.add_argument('--edge-labels', default='1,200',
+                                 help='comma-separated numbers of labels')
+    argument_parser.add_argument('--path', default=ROOT)
+    arguments = argument_parser.parse_args()
+    path = os.path.abspath(arguments.path)
+    report = {'nodes': arguments.nodes, 'edges': arguments.edges,
+              'edge_labels': {}}
+    for edge_labels in arguments.edge_labels.split(','):
+        case = {}
+        for backend in ('networkx', 'compact',):
+            result = measure(path, backend, arguments.nodes, arguments.edges,
+                             int(edge_labels))
+            result['bytes_per_element'] = (
+                float(result['bytes']) / (arguments.nodes + arguments.edges))
+            case[backend] = result
+        case['ratio'] = (float(case['networkx']['bytes']) /
+                         max(case['compact']['bytes'], 1))
+        report['edge_labels'][edge_labels] = case
+    print(json.dumps(report, indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
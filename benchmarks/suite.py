@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""
+Runs a fixed catalogue of queries through ``CypherToNetworkx.query`` on
+synthetic graphs of several sizes (see ``generators.py``) and reports, for
+each size and query, the latency percentiles, the throughput, and the peak
+memory of the process, as JSON. Each size runs in ``--rounds`` separate
+subprocesses, and each query's figures are those of its fastest round,
+since a whole process is sometimes slower than the rest.
+
+The sizes default to 1k, 10k and 100k nodes; ``--sizes 1000000`` also
+works, but needs roughly ten times the memory of 100k (some 6GB).
+
+The report can be saved as a baseline, and later runs compared with it
+(by default with ``baseline.json`` here; ``--baseline ''`` skips it):
+any median latency or peak memory that grew by more than ``--tolerance``
+is listed under ``regressions``, and the exit status is then 1::
+
+    python benchmarks/suite.py --sizes 1000,10000 --save-baseline base.json
+    python benchmarks/suite.py --sizes 1000,10000 --baseline base.json
+
+Each process also times a fixed pure-Python workload, and latencies are
+compared in units of that time (``calibration_seconds``), which cancels
+out most of the drift in a shared machine's speed. Even so, the baseline
+checked in as ``baseline.json`` was taken on a single core, and only
+compares well on similar hardware; save a new one before comparing
+elsewhere. Point ``--path`` at another checkout to run its code on the
+same graphs; the report doesn't record it.
+"""
+
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+BASELINE = os.path.join(BENCHMARKS, 'baseline.json')
+
+# Latencies that grew by less than this many seconds are too noisy to flag
+# as regressions, whatever the fraction
+LATENCY_FLOOR = 0.001
+
+SNIPPET = '''
+import json, sys
+sys.path.insert(0, {benchmarks!r})
+sys.path.insert(0, {path!r})
+import suite
+print(json.dumps(suite.run_size({nodes}, {repeat}, {seed})))
+'''
+
+# Rows created by each run of the bulk load
+BULK_ROWS = 1000
+
+
+def _name(rng, info, node_class='LABEL0'):
+    return {'name': rng.choice(info['names'][node_class])}
+
+
+def _bulk_rows(rng, info):
+    start = info['node_count'] + rng.randrange(10 ** 9)
+    return {'rows': [{'name': start + i, 'rank': i % 1000, 'score': i}
+                     for i in range(BULK_ROWS)]}
+
+
+# ``(name, query, parameters)``, where ``parameters(rng, info)`` returns
+# the parameters of one run. The CREATE comes last since it adds nodes.
+CATALOGUE = [
+    ('point_lookup',
+     'MATCH (n:LABEL0) WHERE n.name = $name RETURN n.rank', _name),
+    ('label_scan', 'MATCH (n:LABEL3) RETURN n.name', None),
+    ('where_filter',
+     'MATCH (n:LABEL0) WHERE n.rank > 900 AND n.meta.score < 100 '
+     'RETURN n.name', None),
+    ('where_nested',
+     'MATCH (n:LABEL1) WHERE n.meta.tags.region = 3 RETURN n.name', None),
+    ('one_hop',
+     'MATCH (a:LABEL0)-[:REL0]->(b) WHERE a.name = $name RETURN b.name',
+     _name),
+    ('two_hop',
+     'MATCH (a:LABEL0)-[:REL0]->(b)-[:REL0]->(c) WHERE a.name = $name '
+     'RETURN c.name', _name),
+    ('three_hop',
+     'MATCH (a:LABEL0)-[:REL0]->(b)-[:REL0]->(c)-[:REL1]->(d) '
+     'WHERE a.name = $name RETURN d.name', _name),
+    ('bulk_create',
+     'UNWIND $rows AS r CREATE (n:BULK {name: r.name, rank: r.rank, '
+     'meta: {score: r.score}})', _bulk_rows),
+]
+
+
+def peak_bytes():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def calibrate(runs=5):
+    """The fastest of ``runs`` timings of a fixed workload of dictionary
+       building and sorting, the operations that dominate query time."""
+    best = None
+    for _ in range(runs):
+        start = time.time()
+        documents = dict((i, {'name': i, 'meta': {'score': -i}})
+                         for i in range(20000))
+        sorted(documents, key=lambda i: documents[i]['meta']['score'])
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run_query(parser, graph_object, info, query, parameters, repeat, rng):
+    """Run ``query`` once to warm up and then ``repeat`` times, and return
+       its sorted latencies and throughput."""
+    def _params():
+        return None if parameters is None else parameters(rng, info)
+    list(parser.query(graph_object, query, params=_params()))
+    latencies = []
+    rows = 0
+    for _ in range(repeat):
+        params = _params()
+        start = time.time()
+        rows += len(list(parser.query(graph_object, query, params=params)))
+        latencies.append(time.time() - start)
+    total = sum(latencies)
+    return {'latencies': sorted(latencies),
+            'mean': total / repeat,
+            'queries_per_second': repeat / max(total, 1e-9),
+            'rows_per_query': float(rows) / repeat}
+
+
+def run_size(node_count, repeat, seed):
+    """Build the graph with ``node_count`` nodes and run the catalogue on
+       it. This is what each subprocess does."""
+    import generators
+    # The calibration comes after the load, since the peak it sets would
+    # hide the growth of a small graph
+    before = peak_bytes()
+    start = time.time()
+    graph_object, parser, info = generators.build_graph(node_count,
+                                                        seed=seed)
+    load_seconds = time.time() - start
+    loaded_bytes = peak_bytes() - before
+    calibration = calibrate()
+    rng = random.Random(seed)
+    queries = {}
+    for name, query, parameters in CATALOGUE:
+        queries[name] = run_query(parser, graph_object, info, query,
+                                  parameters, repeat, rng)
+    return {'nodes': node_count,
+            'edges': info['edge_count'],
+            'calibration_seconds': min(calibration, calibrate()),
+            'load_seconds': load_seconds,
+            'load_peak_bytes': loaded_bytes,
+            'peak_bytes': peak_bytes() - before,
+            'queries': queries}
+
+
+def measure(path, nodes, repeat, seed):
+    """Run ``run_size`` in a subprocess on the code at ``path``, and replace
+       each query's latencies with their percentiles. These are computed
+       here, with this checkout's code, which ``path`` may predate."""
+    from python_cypher.instrumentation import percentile
+    output = subprocess.check_output(
+        [sys.executable, '-c', SNIPPET.format(
+            benchmarks=BENCHMARKS, path=path, nodes=nodes, repeat=repeat,
+            seed=seed)])
+    result = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+    for figures in result['queries'].values():
+        latencies = figures.pop('latencies')
+        figures['p50'] = percentile(latencies, 0.5)
+        figures['p95'] = percentile(latencies, 0.95)
+        figures['p99'] = percentile(latencies, 0.99)
+    return result
+
+
+def best_of(results):
+    """Merge the results of several rounds on one size, keeping each
+       query's figures from the round where its median was lowest."""
+    best = dict(results[0])
+    best['peak_bytes'] = min(result['peak_bytes'] for result in results)
+    best['load_peak_bytes'] = min(
+        result['load_peak_bytes'] for result in results)
+    best['load_seconds'] = min(result['load_seconds'] for result in results)
+    best['calibration_seconds'] = min(
+        result['calibration_seconds'] for result in results)
+    best['queries'] = {}
+    for query in results[0]['queries']:
+        best['queries'][query] = min(
+            (result['queries'][query] for result in results),
+            key=lambda figures: figures['p50'])
+    return best
+
+
+def regressions(report, baseline, tolerance):
+    """The figures in ``report`` that exceed those in ``baseline`` by more
+       than the fraction ``tolerance``. Latencies are scaled by the ratio of
+       the two reports' calibration times first."""
+    found = []
+
+    def _compare(size, query, metric, current, previous, floor=0,
+                 scale=1.0):
+        if previous is None:
+            return
+        previous *= scale
+        if (current > previous * (1 + tolerance) and
+                current - previous > floor):
+            found.append({'size': size, 'query': query, 'metric': metric,
+                          'expected': previous, 'current': current,
+                          'change': current / max(previous, 1e-12) - 1})
+    for size, result in sorted(report['sizes'].items()):
+        previous = baseline.get('sizes', {}).get(size, None)
+        if previous is None:
+            continue
+        _compare(size, None, 'peak_bytes', result['peak_bytes'],
+                 previous.get('peak_bytes', None))
+        scale = (result['calibration_seconds'] /
+                 previous.get('calibration_seconds',
+                              result['calibration_seconds']))
+        for query, figures in sorted(result['queries'].items()):
+            previous_figures = previous['queries'].get(query, {})
+            # The tail percentiles of a few dozen runs are too noisy
+            _compare(size, query, 'p50', figures['p50'],
+                     previous_figures.get('p50', None), floor=LATENCY_FLOOR,
+                     scale=scale)
+    return found
+
+
+def main():
+    argument_parser = argparse.ArgumentParser(description=__doc__)
+    argument_parser.add_argument('--sizes', default='1000,10000,100000',
+                                 help='comma-separated numbers of nodes')
+    argument_parser.add_argument('--repeat', type=int, default=50)
+    argument_parser.add_argument('--rounds', type=int, default=3)
+    argument_parser.add_argument('--seed', type=int, default=0)
+    argument_parser.add_argument('--path', default=ROOT)
+    argument_parser.add_argument(
+        '--baseline', default=BASELINE if os.path.exists(BASELINE) else None,
+        help='compare with this report (default: baseline.json)')
+    argument_parser.add_argument('--save-baseline', default=None,
+                                 help='save the report here')
+    argument_parser.add_argument('--tolerance', type=float, default=0.25)
+    arguments = argument_parser.parse_args()
+    sys.path.insert(0, ROOT)
+    path = os.path.abspath(arguments.path)
+    report = {'repeat': arguments.repeat,
+              'rounds': arguments.rounds,
+              'seed': arguments.seed,
+              'sizes': {}}
+    for size in arguments.sizes.split(','):
+        report['sizes'][size] = best_of(
+            [measure(path, int(size), arguments.repeat, arguments.seed)
+             for _ in range(arguments.rounds)])
+    if arguments.baseline:
+        with open(arguments.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        report['regressions'] = regressions(report, baseline,
+                                            arguments.tolerance)
+    if arguments.save_baseline is not None:
+        with open(arguments.save_baseline, 'w') as baseline_file:
+            json.dump(report, baseline_file, indent=2, sort_keys=True)
+    print(json.dumps(report, indent=2, sort_keys=True))
+    if report.get('regressions'):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
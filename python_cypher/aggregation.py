@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+This script contains the streaming hash aggregation behind aggregate
+functions in RETURN clauses, such as ``RETURN n.class, count(*)``. Each
+matching assignment updates the accumulators of its group as it arrives,
+so memory grows with the number of groups rather than with the number of
+matches. The RETURN items that aren't aggregates are the grouping keys.
+"""
+
+from collections import OrderedDict
+
+
+class Count(object):
+    """``count(x)`` counts the values that aren't ``None``; ``count(*)``
+       is given ``True`` for every row."""
+    def __init__(self):
+        self.count = 0
+
+    def add(self, value):
+        if value is not None:
+            self.count += 1
+
+    def result(self):
+        return self.count
+
+
+class Sum(object):
+    def __init__(self):
+        self.total = 0
+
+    def add(self, value):
+        if value is not None:
+            self.total += value
+
+    def result(self):
+        return self.total
+
+
+class Average(object):
+    def __init__(self):
+        self.total = 0
+        self.count = 0
+
+    def add(self, value):
+        if value is not None:
+            self.total += value
+            self.count += 1
+
+    def result(self):
+        if self.count == 0:
+            return None
+        return float(self.total) / self.count
+
+
+class Minimum(object):
+    def __init__(self):
+        self.value = None
+
+    def add(self, value):
+        if value is not None and (self.value is None or value < self.value):
+            self.value = value
+
+    def result(self):
+        return self.value
+
+
+class Maximum(object):
+    def __init__(self):
+        self.value = None
+
+    def add(self, value):
+        if value is not None and (self.value is None or value > self.value):
+            self.value = value
+
+    def result(self):
+        return self.value
+
+
+class Collect(object):
+    def __init__(self):
+        self.values = []
+
+    def add(self, value):
+        if value is not None:
+            self.values.append(value)
+
+    def result(self):
+        return self.values
+
+
+ACCUMULATORS = {
+    'count': Count,
+    'sum': Sum,
+    'avg': Average,
+    'min': Minimum,
+    'max': Maximum,
+    'collect': Collect}
+
+
+def group_key(value):
+    """A hashable stand-in for ``value`` that's equal for equal values,
+       so dictionaries and lists can be grouped on."""
+    if isinstance(value, dict):
+        return (dict, tuple(sorted((key, group_key(one_value),) for
+                                   key, one_value in value.iteritems())),)
+    elif isinstance(value, (list, tuple,)):
+        return (type(value), tuple(group_key(item) for item in value),)
+    return value
+
+
+class Aggregation(object):
+    """Groups assignments and aggregates them. ``items`` has one entry for
+       each RETURN item, in order:
+
+       * ``(None, get_value, get_key)`` for a grouping key, where
+         ``get_value`` gives its value in the result and ``get_key`` what
+         the groups are told apart by (both functions of the assignment);
+       * ``(function_name, get_value, None)`` for an aggregate, where
+         ``get_value`` gives the value to aggregate.
+
+       Groups are returned in the order they were first seen."""
+    def __init__(self, items):
+        self.items = items
+        self.key_getters = [get_key for function_name, _, get_key in items
+                            if function_name is None]
+        self.aggregates = [(position, get_value,) for
+                           position, (function_name, get_value, _) in
+                           enumerate(items) if function_name is not None]
+        self.groups = OrderedDict()
+
+    def _new_group(self, assignment):
+        return [get_value(assignment) if function_name is None else
+                ACCUMULATORS[function_name]() for
+                function_name, get_value, _ in self.items]
+
+    def add(self, assignment):
+        key = tuple(group_key(get_key(assignment)) for
+                    get_key in self.key_getters)
+        group = self.groups.get(key, None)
+        if group is None:
+            group = self.groups[key] = self._new_group(assignment)
+        for position, get_value in self.aggregates:
+            group[position].add(get_value(assignment))
+
+    def rows(self):
+        """Generator over the result rows, one for each group. Without
+           grouping keys there's always exactly one row, even if nothing
+           matched (so ``count(*)`` gives 0)."""
+        if len(self.groups) == 0 and len(self.key_getters) == 0:
+            self.groups[()] = [
+                ACCUMULATORS[function_name]() for
+                function_name, _, _ in self.items]
+        for group in self.groups.itervalues():
+            yield [value.result() if function_name is not None else value
+                   for value, (function_name, _, _) in
+                   zip(group, self.items)]
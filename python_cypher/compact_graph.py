@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+"""
+This script contains ``CompactGraph``, a graph store for
+``CypherToCompactGraph`` that keeps nodes and edges under dense integer ids
+in flat arrays instead of NetworkX's dictionaries of dictionaries.
+
+Node ids are ``0, 1, 2, ...`` and the edge with index ``i`` has the id
+``~i`` (that is, ``-1, -2, ...``), so the two can't be confused. Node and
+edge labels are interned as small integers, and string values are
+interned with ``intern``. Properties are stored by column: one list per
+top-level key, with a slot for each node.
+
+Adjacency is kept in CSR form for each direction: for node ``n``, the
+neighbors are ``neighbors[offsets[n]:offsets[n + 1]]``, sorted by edge
+label so that the edges with one label are found by bisecting that slice.
+This takes memory in proportion to the nodes and edges, however many labels
+there are. Edges added after the CSR arrays were built are kept in a small
+per-node overflow until there are enough of them to make rebuilding
+worthwhile.
+"""
+
+import bisect
+from array import array
+from indexes import GraphStatistics
+from vectorized import ColumnStore
+
+# Placeholder in a property column for nodes that lack the key
+MISSING = object()
+
+# Rebuild the CSR arrays once this many edges (or a quarter of those already
+# in the arrays, if that's more) have been added since they were built.
+MIN_ADJACENCY_REBUILD = 1024
+
+
+def intern_value(value):
+    """Intern ``value`` if it's a string, or the strings in it if it's a
+       dictionary (which is copied)."""
+    if isinstance(value, str):
+        return intern(value)
+    elif isinstance(value, dict):
+        return dict((intern_value(key), intern_value(one_value),) for
+                    key, one_value in value.iteritems())
+    return value
+
+
+class NodeView(object):
+    """Read-only mapping over the properties of one node of a
+       ``CompactGraph``, read from the columns without copying them. The
+       node's class is found under the key ``class``, as with NetworkX."""
+    __slots__ = ('graph', 'node',)
+
+    def __init__(self, graph, node):
+        self.graph = graph
+        self.node = node
+
+    def __getitem__(self, key):
+        if key == 'class':
+            return self.graph.node_class(self.node)
+        value = self.graph.property_value(self.node, key)
+        if value is MISSING:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        return (key == 'class' or
+                self.graph.property_value(self.node, key) is not MISSING)
+
+    def iteritems(self):
+        yield 'class', self.graph.node_class(self.node)
+        for key in self.graph.properties:
+            value = self.graph.property_value(self.node, key)
+            if value is not MISSING:
+                yield key, value
+
+    def items(self):
+        return list(self.iteritems())
+
+    def __iter__(self):
+        for key, _ in self.iteritems():
+            yield key
+
+    def keys(self):
+        return list(self)
+
+    def __len__(self):
+        return sum(1 for _ in self.iteritems())
+
+    def copy(self):
+        """Return the node's properties as a new dictionary."""
+        return dict(self.iteritems())
+
+    def __eq__(self, other):
+        if isinstance(other, NodeView):
+            other = other.copy()
+        return self.copy() == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return repr(self.copy())
+
+
+class ClassMembers(object):
+    """The nodes of one class, supporting ``in``, ``len`` and iteration
+       without building a set."""
+    __slots__ = ('graph', 'label_id',)
+
+    def __init__(self, graph, label_id):
+        self.graph = graph
+        self.label_id = label_id
+
+    def __contains__(self, node):
+        return (0 <= node < len(self.graph.node_classes) and
+                self.graph.node_classes[node] == self.label_id)
+
+    def __iter__(self):
+        return iter(self.graph.class_members.get(self.label_id, ()))
+
+    def __len__(self):
+        return len(self.graph.class_members.get(self.label_id, ()))
+
+
+class CompactGraph(GraphStatistics):
+    """Array-backed directed multigraph. Nodes and edges can only be added,
+       not removed."""
+    def __init__(self):
+        self.labels = []
+        self.label_ids = {}
+        self.node_classes = array('l')
+        self.class_members = {}
+        self.properties = {}
+        self.edge_sources = array('l')
+        self.edge_targets = array('l')
+        self.edge_labels = array('l')
+        self.edge_counts = {}
+        # For each direction, the ``(offsets, neighbors, edge_indexes,
+        # labels)`` arrays, covering the first ``adjacency_size`` edges;
+        # later ones are in ``overflow``.
+        self.adjacency = {True: empty_adjacency(), False: empty_adjacency()}
+        self.adjacency_size = 0
+        self.overflow = {True: {}, False: {}}
+        self.overflow_size = 0
+        # Property columns used to vectorize WHERE clauses
+        self.columns = ColumnStore()
+
+    def label_id(self, label):
+        """Return the integer standing for ``label`` (a node class or edge
+           label), assigning the next one if it's new."""
+        try:
+            return self.label_ids[label]
+        except KeyError:
+            if isinstance(label, str):
+                label = intern(label)
+            self.label_ids[label] = len(self.labels)
+            self.labels.append(label)
+            return self.label_ids[label]
+
+    def number_of_nodes(self):
+        return len(self.node_classes)
+
+    def number_of_edges(self):
+        return len(self.edge_sources)
+
+    def add_node(self, node_class, document):
+        """Add a node with the properties in ``document`` and return its
+           id."""
+        node = len(self.node_classes)
+        label_id = self.label_id(node_class)
+        self.node_classes.append(label_id)
+        self.class_members.setdefault(label_id, array('l')).append(node)
+        self.columns.invalidate(node_class)
+        for key, value in document.iteritems():
+            if key == 'class':
+                continue
+            column = self.properties.get(key, None)
+            if column is None:
+                column = self.properties[intern_value(key)] = []
+            if len(column) < node:
+                column.extend([MISSING] * (node - len(column)))
+            column.append(intern_value(value))
+        return node
+
+    def add_edge(self, source, target, edge_label=None):
+        """Add an edge and return its id."""
+        edge_index = len(self.edge_sources)
+        self.edge_sources.append(source)
+        self.edge_targets.append(target)
+        self.edge_labels.append(self.label_id(edge_label))
+        signature = (self.node_class(source), edge_label,
+                     self.node_class(target),)
+        self.edge_counts[signature] = self.edge_counts.get(signature, 0) + 1
+        return ~edge_index
+
+    def is_node(self, element):
+        return (isinstance(element, (int, long,)) and
+                0 <= element < len(self.node_classes))
+
+    def is_edge(self, element):
+        return (isinstance(element, (int, long,)) and
+                0 <= ~element < len(self.edge_sources))
+
+    def node_class(self, node):
+        return self.labels[self.node_classes[node]]
+
+    def property_value(self, node, key):
+        """The value of ``key`` for ``node``, or ``MISSING``."""
+        column = self.properties.get(key, None)
+        if column is None or node >= len(column):
+            return MISSING
+        return column[node]
+
+    def node(self, node):
+        return NodeView(self, node)
+
+    def edge(self, edge_id):
+        """Return the attribute dictionary of the edge (its label and id),
+           or ``None``."""
+        if not self.is_edge(edge_id):
+            return None
+        return {'edge_label': self.labels[self.edge_labels[~edge_id]],
+                '_id': edge_id}
+
+    def nodes_of_class(self, node_class):
+        if node_class not in self.label_ids:
+            return ClassMembers(self, None)
+        return ClassMembers(self, self.label_ids[node_class])
+
+    def node_count(self, node_class=None):
+        """The number of nodes of ``node_class``, or of all nodes if it's
+           ``None``."""
+        if node_class is None:
+            return len(self.node_classes)
+        return len(self.nodes_of_class(node_class))
+
+    def edge_indexes(self, node, edge_label=None, outgoing=True,
+                     any_label=False):
+        """Generator over ``(neighbor, edge_index)`` for the edges leaving
+           (or entering) ``node``, for the edges labeled ``edge_label`` or,
+           if ``any_label``, all of them."""
+        self._update_adjacency()
+        if not any_label and edge_label not in self.label_ids:
+            return
+        offsets, neighbors, edge_indexes, labels = self.adjacency[outgoing]
+        if node + 1 < len(offsets):
+            start, end = offsets[node], offsets[node + 1]
+            if not any_label:
+                label_id = self.label_ids[edge_label]
+                start = bisect.bisect_left(labels, label_id, start, end)
+                end = bisect.bisect_right(labels, label_id, start, end)
+            for position in xrange(start, end):
+                yield neighbors[position], edge_indexes[position]
+        for neighbor, edge_index in self.overflow[outgoing].get(node, ()):
+            if any_label or self.labels[self.edge_labels[edge_index]] == (
+                    edge_label):
+                yield neighbor, edge_index
+
+    def _update_adjacency(self):
+        """Bring the CSR arrays (or the overflow) up to date with the edges
+           added since they were last built."""
+        edge_count = len(self.edge_sources)
+        if self.adjacency_size + self.overflow_size == edge_count:
+            return
+        if (edge_count - self.adjacency_size >
+                max(MIN_ADJACENCY_REBUILD, self.adjacency_size // 4)):
+            self._build_adjacency()
+            return
+        for edge_index in xrange(self.adjacency_size + self.overflow_size,
+                                 edge_count):
+            source = self.edge_sources[edge_index]
+            target = self.edge_targets[edge_index]
+            self.overflow[True].setdefault(source, []).append(
+                (target, edge_index,))
+            self.overflow[False].setdefault(target, []).append(
+                (source, edge_index,))
+        self.overflow_size = edge_count - self.adjacency_size
+
+    def _build_adjacency(self):
+        """Build the CSR arrays for both directions with two counting sorts,
+           by edge label and then by node, so each node's edges are grouped
+           by label and stay in the order they were added."""
+        node_count = len(self.node_classes)
+        edge_count = len(self.edge_sources)
+        edge_labels = self.edge_labels
+        # The edge indexes in order of label
+        starts = array('l', [0]) * (len(self.labels) + 1)
+        for label_id in edge_labels:
+            starts[label_id + 1] += 1
+        for label_id in xrange(len(self.labels)):
+            starts[label_id + 1] += starts[label_id]
+        by_label = array('l', [0]) * edge_count
+        for edge_index in xrange(edge_count):
+            label_id = edge_labels[edge_index]
+            by_label[starts[label_id]] = edge_index
+            starts[label_id] += 1
+        for outgoing in (True, False,):
+            if outgoing:
+                ends, other_ends = self.edge_sources, self.edge_targets
+            else:
+                ends, other_ends = self.edge_targets, self.edge_sources
+            offsets = array('l', [0]) * (node_count + 1)
+            for end in ends:
+                offsets[end + 1] += 1
+            for node in xrange(node_count):
+                offsets[node + 1] += offsets[node]
+            filled = offsets[:-1]
+            neighbors = array('l', [0]) * edge_count
+            edge_indexes = array('l', [0]) * edge_count
+            labels = array('l', [0]) * edge_count
+            for edge_index in by_label:
+                end = ends[edge_index]
+                position = filled[end]
+                filled[end] += 1
+                neighbors[position] = other_ends[edge_index]
+                edge_indexes[position] = edge_index
+                labels[position] = edge_labels[edge_index]
+            self.adjacency[outgoing] = (offsets, neighbors, edge_indexes,
+                                        labels,)
+        self.adjacency_size = edge_count
+        self.overflow = {True: {}, False: {}}
+        self.overflow_size = 0
+
+
+def empty_adjacency():
+    """The CSR arrays of a graph with no edges."""
+    return (array('l', [0]), array('l'), array('l'), array('l'),)
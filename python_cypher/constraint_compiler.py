@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+This script compiles the constraint tree of a WHERE clause into a single
+Python closure over an assignment, so that checking a row is a handful of
+function calls rather than a walk over ``Or``, ``And``, ``Not`` and
+``Constraint`` objects.
+"""
+
+import operator
+from cypher_parser import *
+
+OPERATORS = {
+    '=': operator.eq,
+    '>': operator.gt,
+    '<': operator.lt,
+    '>=': operator.ge,
+    '<=': operator.le}
+
+
+def flatten_operands(constraint, kind):
+    """Return the operands of a nest of ``And`` (or ``Or``) nodes as one
+       flat list."""
+    if isinstance(constraint, And) and kind is And:
+        return (flatten_operands(constraint.left_conjunct, kind) +
+                flatten_operands(constraint.right_conjunct, kind))
+    elif isinstance(constraint, Or) and kind is Or:
+        return (flatten_operands(constraint.left_disjunct, kind) +
+                flatten_operands(constraint.right_disjunct, kind))
+    return [constraint]
+
+
+def constraint_cost(constraint):
+    """Rough relative cost of evaluating ``constraint``: the number of keys
+       that have to be looked up."""
+    if isinstance(constraint, And):
+        return sum(constraint_cost(operand) for operand in
+                   flatten_operands(constraint, And))
+    elif isinstance(constraint, Or):
+        return sum(constraint_cost(operand) for operand in
+                   flatten_operands(constraint, Or))
+    elif isinstance(constraint, Not):
+        return constraint_cost(constraint.argument)
+    cost = len(constraint.keypath)
+    if isinstance(constraint.value, Reference):  # Comparing two keypaths
+        cost += len(constraint.value.keypath)
+    return cost
+
+
+def _conjunct_order(constraint):
+    """Cheapest first; among equally cheap conjuncts, equalities come first
+       since they're the most likely to be false and end the evaluation."""
+    is_equality = (isinstance(constraint, Constraint) and
+                   constraint.function_string == '=')
+    return (constraint_cost(constraint), 0 if is_equality else 1,)
+
+
+def compile_constraint(constraint, keypath_getter):
+    """Return a function from an assignment to ``True`` or ``False``.
+       ``keypath_getter`` is called once per keypath in the constraint, and
+       must return a function from an assignment to the value found at that
+       keypath."""
+    if isinstance(constraint, Constraint):
+        function = OPERATORS[constraint.function_string]
+        get_value = keypath_getter(constraint.keypath)
+        if isinstance(constraint.value, Reference):
+            get_other_value = keypath_getter(constraint.value.keypath)
+
+            def _compare_keypaths(assignment):
+                return function(get_value(assignment),
+                                get_other_value(assignment))
+            return _compare_keypaths
+        value = constraint.value
+
+        def _compare(assignment):
+            return function(get_value(assignment), value)
+        return _compare
+    elif isinstance(constraint, Not):
+        test = compile_constraint(constraint.argument, keypath_getter)
+
+        def _not(assignment):
+            return not test(assignment)
+        return _not
+    elif isinstance(constraint, And):
+        operands = sorted(flatten_operands(constraint, And),
+                          key=_conjunct_order)
+        return _compile_all([compile_constraint(operand, keypath_getter)
+                             for operand in operands])
+    elif isinstance(constraint, Or):
+        operands = sorted(flatten_operands(constraint, Or),
+                          key=constraint_cost)
+        return _compile_any([compile_constraint(operand, keypath_getter)
+                             for operand in operands])
+    raise Exception("Unhandled case in compile_constraint.")
+
+
+def _compile_all(tests):
+    if len(tests) == 2:
+        first, second = tests
+        return lambda assignment: first(assignment) and second(assignment)
+
+    def _all(assignment):
+        for test in tests:
+            if not test(assignment):
+                return False
+        return True
+    return _all
+
+
+def _compile_any(tests):
+    if len(tests) == 2:
+        first, second = tests
+        return lambda assignment: first(assignment) or second(assignment)
+
+    def _any(assignment):
+        for test in tests:
+            if test(assignment):
+                return True
+        return False
+    return _any
@@ -1,11 +1,17 @@
 # -*- coding: utf-8 -*-
 
+import copy
+import os
+import sys
 from cypher_tokenizer import *
 from ply import yacc
 
 next_anonymous_variable = 0
 
-start = 'full_query'
+start = 'statement'
+
+# Functions that can be used as ``name(...)`` in a RETURN clause
+AGGREGATE_FUNCTIONS = ('count', 'sum', 'avg', 'min', 'max', 'collect',)
 
 
 def constraint_function(function_string):
@@ -63,10 +69,14 @@ class ClassIs(AtomicFact):
 
 class EdgeCondition(AtomicFact):
     """Represents the constraint that an edge must have a specific
-       label, or that it must be run in a specific direction."""
-    def __init__(self, edge_label=None, direction=None, designation=None):
+       label, or that it must be run in a specific direction. ``hops`` is
+       ``(min_hops, max_hops)`` for a variable-length relationship such as
+       ``[:LABEL*1..3]``, and ``None`` for a single edge."""
+    def __init__(self, edge_label=None, direction=None, designation=None,
+                 hops=None):
         self.edge_label = edge_label
         self.designation = designation
+        self.hops = hops
 
 
 class EdgeExists(AtomicFact):
@@ -79,6 +89,26 @@ class EdgeExists(AtomicFact):
         self.designation = designation
 
 
+class PathExists(AtomicFact):
+    """The constraint that ``node_2`` can be reached from ``node_1`` in
+       between ``min_hops`` and ``max_hops`` (unbounded if ``None``) hops
+       along edges with the label ``edge_label`` (any if ``None``), in
+       either direction unless ``directed``. If ``shortest``, the pattern
+       was wrapped in ``shortestPath`` and the ``designation``, if any, is
+       bound to a shortest such path (a list of nodes)."""
+    def __init__(self, node_1, node_2, edge_label=None, min_hops=1,
+                 max_hops=None, directed=True, shortest=False,
+                 designation=None):
+        self.node_1 = node_1
+        self.node_2 = node_2
+        self.edge_label = edge_label
+        self.min_hops = min_hops
+        self.max_hops = max_hops
+        self.directed = directed
+        self.shortest = shortest
+        self.designation = designation
+
+
 class Node(object):
     """A node specification -- a set of conditions and a designation."""
     def __init__(self, node_class=None, designation=None,
@@ -121,6 +151,23 @@ class ReturnVariables(object):
         self.variable_list = [variable]
 
 
+class Aggregate(object):
+    """An aggregate function in a RETURN clause, such as ``count(*)`` or
+       ``sum(m.bar)``. The ``argument`` is a designation, a keypath, or
+       ``None`` for ``*``."""
+    def __init__(self, function_name, argument=None):
+        self.function_name = function_name
+        self.argument = argument
+
+    def __eq__(self, other):
+        return (isinstance(other, Aggregate) and
+                self.function_name == other.function_name and
+                self.argument == other.argument)
+
+    def __ne__(self, other):
+        return not self == other
+
+
 class CreateClause(object):
     """Class representing a CREATE... RETURN query, including cases
        where the RETURN isn't present."""
@@ -144,6 +191,7 @@ class Constraint(object):
     def __init__(self, keypath, value, function_string):
         self.keypath = keypath
         self.value = value
+        self.function_string = function_string
         self.function = constraint_function(function_string)
 
 
@@ -154,12 +202,61 @@ class Or(object):
         self.right_disjunct = right_disjunct
 
 
+class And(object):
+    '''A conjunction'''
+    def __init__(self, left_conjunct, right_conjunct):
+        self.left_conjunct = left_conjunct
+        self.right_conjunct = right_conjunct
+
+
 class Not(object):
     '''Negation'''
     def __init__(self, argument):
         self.argument = argument
 
 
+class Parameter(object):
+    """A ``$name`` placeholder in a query, filled in from the ``params``
+       passed to ``query`` by ``bind_parameters``."""
+    def __init__(self, name):
+        self.name = name
+
+
+class Reference(object):
+    """A keypath used as a value in a node's document, such as ``r.name``
+       in ``UNWIND $rows AS r CREATE (n:CLASS {name: r.name})``. It's
+       replaced by the value found in each row when the nodes are created.
+       The other side of a WHERE comparison between two keypaths, as in
+       ``a.foo = b.bar``, is also a ``Reference``, which keeps it apart
+       from a list given as a parameter."""
+    def __init__(self, keypath):
+        self.keypath = keypath
+
+
+class Unwind(object):
+    """UNWIND clause: the ``rows`` (a list, usually bound from a parameter)
+       are bound to ``designation`` one at a time."""
+    def __init__(self, rows, designation):
+        self.rows = rows
+        self.designation = designation
+
+
+class Paging(object):
+    """SKIP and LIMIT: the first ``skip`` rows are dropped, and at most
+       ``limit`` (if it isn't ``None``) of the rest are returned."""
+    def __init__(self, skip=0, limit=None):
+        self.skip = skip
+        self.limit = limit
+
+
+class OrderBy(object):
+    """ORDER BY: ``items`` is a list of ``(expression, descending)``
+       pairs, where each expression is a designation, a keypath or an
+       ``Aggregate``."""
+    def __init__(self, items):
+        self.items = items
+
+
 class WhereClause(object):
     '''WHERE clause'''
     def __init__(self, constraint):
@@ -176,9 +273,61 @@ class MatchWhere(object):
 
 
 class FullQuery(object):
-    '''Full query is just a list, basically.'''
+    '''Full query is just a list, basically. ``mode`` is 'EXPLAIN' or
+       'PROFILE' if the query was prefixed with one of them.'''
     def __init__(self, *args):
         self.clause_list = args
+        self.mode = None
+
+
+def _walk_parameters(obj, params, visited, names):
+    """Return ``obj`` with every ``Parameter`` replaced by its value in
+       ``params`` (or left alone if ``params`` is ``None``), updating the AST
+       objects, lists and dictionaries inside it in place. The names of the
+       parameters found are added to ``names``."""
+    if isinstance(obj, Parameter):
+        names.add(obj.name)
+        if params is None:
+            return obj
+        if obj.name not in params:
+            raise Exception(
+                "No value given for parameter ${}.".format(obj.name))
+        return params[obj.name]
+    if id(obj) in visited:
+        return obj
+    if isinstance(obj, list):
+        visited.add(id(obj))
+        for index, item in enumerate(obj):
+            obj[index] = _walk_parameters(item, params, visited, names)
+    elif isinstance(obj, tuple):
+        visited.add(id(obj))
+        obj = tuple(_walk_parameters(item, params, visited, names)
+                    for item in obj)
+    elif isinstance(obj, dict):
+        visited.add(id(obj))
+        for key, value in obj.items():
+            obj[key] = _walk_parameters(value, params, visited, names)
+    elif hasattr(obj, '__dict__') and not callable(obj):
+        visited.add(id(obj))
+        for attribute, value in vars(obj).items():
+            setattr(obj, attribute,
+                    _walk_parameters(value, params, visited, names))
+    return obj
+
+
+def query_parameters(query_objects):
+    """Return the set of parameter names used in a parsed query."""
+    names = set()
+    _walk_parameters(query_objects, None, set(), names)
+    return names
+
+
+def bind_parameters(query_objects, params):
+    """Return a copy of ``query_objects`` (a parsed query, or a tuple of
+       objects taken from one) with its parameters filled in. The original
+       is left untouched so that it can be cached and bound again."""
+    bound = copy.deepcopy(query_objects)
+    return _walk_parameters(bound, params or {}, set(), set())
 
 
 def p_node_clause(p):
@@ -205,10 +354,16 @@ def p_node_clause(p):
 def p_condition(p):
     '''condition_list : KEY COLON STRING
                       | KEY COLON INTEGER
+                      | KEY COLON PARAMETER
+                      | KEY COLON keypath
                       | condition_list COMMA condition_list
                       | LCURLEY condition_list RCURLEY
                       | KEY COLON condition_list'''
-    if len(p) == 4 and p[2] == ':' and isinstance(p[3], str):
+    if len(p) == 4 and p.slice[3].type == 'PARAMETER':
+        p[0] = {p[1]: Parameter(p[3])}
+    elif len(p) == 4 and p[2] == ':' and isinstance(p[3], list):
+        p[0] = {p[1]: Reference(p[3])}
+    elif len(p) == 4 and p[2] == ':' and isinstance(p[3], str):
         p[0] = {p[1]: p[3].replace('"', '')}
     elif len(p) == 4 and p[2] == ':' and isinstance(p[3], int):
         p[0] = {p[1]: p[3]}
@@ -225,15 +380,25 @@ def p_constraint(p):
     '''constraint : keypath EQUALS STRING
                   | keypath EQUALS INTEGER
                   | keypath EQUALS keypath
+                  | keypath EQUALS PARAMETER
                   | keypath NOT_EQUAL INTEGER
+                  | keypath NOT_EQUAL PARAMETER
                   | keypath GREATERTHAN INTEGER
+                  | keypath GREATERTHAN PARAMETER
                   | keypath GREATERTHAN_OR_EQUAL INTEGER
+                  | keypath GREATERTHAN_OR_EQUAL PARAMETER
                   | keypath LESSTHAN INTEGER
+                  | keypath LESSTHAN PARAMETER
                   | keypath LESSTHAN_OR_EQUAL INTEGER
+                  | keypath LESSTHAN_OR_EQUAL PARAMETER
                   | constraint OR constraint
                   | constraint AND constraint
                   | NOT constraint
                   | LPAREN constraint RPAREN'''
+    if len(p) == 4 and p.slice[3].type == 'PARAMETER':
+        p[3] = Parameter(p[3])
+    elif len(p) == 4 and p.slice[3].type == 'keypath':
+        p[3] = Reference(p[3])
     if p[2] == '=':
         p[0] = Constraint(p[1], p[3], '=')
     elif p[2] == '>':
@@ -242,14 +407,14 @@ def p_constraint(p):
         p[0] = Not(Constraint(p[1], p[3], '='))
     elif p[2] == '<':
         p[0] = Constraint(p[1], p[3], '<')
-    elif p[2] == '<':
-        p[0] = Constraint(p[1], p[3], '<=')
+    elif p[2] == '>=':
+        p[0] = Constraint(p[1], p[3], '>=')
     elif p[2] == '<=':
-        p[0] = Or(Constraint(p[1], p[3], '>'), Constraint(p[1], p[3], '='))
+        p[0] = Constraint(p[1], p[3], '<=')
     elif p[2] == 'OR':
         p[0] = Or(p[1], p[3])
     elif p[2] == 'AND':
-        p[0] = Not(Or(Not(p[1]), Not(p[3])))
+        p[0] = And(p[1], p[3])
     elif p[1] == 'NOT':
         p[0] = Not(p[2])
     elif p[1] == '(':
@@ -260,7 +425,7 @@ def p_constraint(p):
 
 def p_where_clause(p):
     '''where_clause : WHERE constraint'''
-    if isinstance(p[2], (Constraint, Or, Not,)):
+    if isinstance(p[2], (Constraint, Or, And, Not,)):
         p[0] = WhereClause(p[2])
     else:
         raise Exception("Unhandled case in p_where_clause.")
@@ -281,20 +446,55 @@ def p_keypath(p):
 
 def p_edge_condition(p):
     '''edge_condition : LBRACKET COLON NAME RBRACKET
-                      | LBRACKET KEY COLON NAME RBRACKET'''
+                      | LBRACKET KEY COLON NAME RBRACKET
+                      | LBRACKET hops RBRACKET
+                      | LBRACKET COLON NAME hops RBRACKET
+                      | LBRACKET KEY COLON NAME hops RBRACKET'''
     if p[2] == t_COLON:
         p[0] = EdgeCondition(edge_label=p[3])
+        if len(p) == 6:
+            p[0].hops = p[4]
+    elif len(p) == 4:
+        p[0] = EdgeCondition(hops=p[2])
     elif p[3] == t_COLON and len(p) == 6:
         p[0] = EdgeCondition(edge_label=p[4], designation=p[2])
         pass
+    elif p[3] == t_COLON and len(p) == 7:
+        raise ParsingException(
+            "Variable-length relationships can't have a designation.")
     else:
         raise Exception("Unhandled case in p_edge_condition")
 
 
+def p_hops(p):
+    '''hops : STAR
+            | STAR INTEGER
+            | STAR INTEGER DOT DOT
+            | STAR DOT DOT INTEGER
+            | STAR INTEGER DOT DOT INTEGER'''
+    if len(p) == 2:
+        p[0] = (1, None,)
+    elif len(p) == 3:
+        p[0] = (p[2], p[2],)
+    elif len(p) == 5 and p.slice[2].type == 'DOT':
+        p[0] = (1, p[4],)
+    elif len(p) == 5:
+        p[0] = (p[2], None,)
+    else:
+        p[0] = (p[2], p[5],)
+    if p[0][1] is not None and p[0][1] < p[0][0]:
+        raise ParsingException(
+            "The most hops can't be fewer than the fewest.")
+
+
 def p_labeled_edge(p):
     '''labeled_edge : DASH edge_condition DASH GREATERTHAN
-                    | LESSTHAN DASH edge_condition DASH'''
-    if p[1] == t_DASH:
+                    | LESSTHAN DASH edge_condition DASH
+                    | DASH edge_condition DASH'''
+    if p[1] == t_DASH and len(p) == 4:
+        p[0] = p[2]
+        p[0].direction = None
+    elif p[1] == t_DASH:
         p[0] = p[2]
         p[0].direction = 'left_right'
     elif p[1] == t_LESSTHAN:
@@ -304,13 +504,51 @@ def p_labeled_edge(p):
         raise Exception("Unhandled case in p_labeled_edge.")
 
 
+def path_fact(node_1, node_2, edge_condition):
+    """The ``PathExists`` fact for a variable-length relationship (or an
+       undirected one, which is taken to be one hop either way) from
+       ``node_1`` to ``node_2``."""
+    if edge_condition.hops is None and edge_condition.designation is not None:
+        raise ParsingException(
+            "Undirected relationships can't have a designation.")
+    min_hops, max_hops = edge_condition.hops or (1, 1,)
+    return PathExists(node_1, node_2, edge_label=edge_condition.edge_label,
+                      min_hops=min_hops, max_hops=max_hops,
+                      directed=edge_condition.direction is not None)
+
+
+def p_shortest_path(p):
+    '''shortest_path : KEY LPAREN literals RPAREN
+                     | KEY EQUALS KEY LPAREN literals RPAREN'''
+    function_name, literals = p[len(p) - 4], p[len(p) - 2]
+    if function_name != 'shortestPath':
+        raise ParsingException(
+            "Unknown path function {}.".format(function_name))
+    facts = [fact for node in literals.literal_list for
+             fact in node.connecting_edges]
+    if (len(literals.literal_list) != 2 or len(facts) != 1 or
+            not isinstance(facts[0], PathExists)):
+        raise ParsingException(
+            "shortestPath takes two nodes joined by a variable-length "
+            "relationship.")
+    if facts[0].min_hops > 1:
+        raise ParsingException("A shortest path starts at 0 or 1 hops.")
+    facts[0].shortest = True
+    if len(p) == 7:
+        facts[0].designation = p[1]
+    p[0] = literals
+
+
 def p_literals(p):
     '''literals : node_clause
+                | shortest_path
                 | literals COMMA literals
                 | literals RIGHT_ARROW literals
                 | literals LEFT_ARROW literals
                 | literals labeled_edge literals'''
-    if len(p) == 2:
+    if len(p) == 2 and isinstance(p[1], Literals):
+        p[0] = p[1]
+    elif len(p) == 2:
         p[0] = Literals(literal_list=[p[1]])
     elif len(p) == 4 and p[2] == t_COMMA:
         p[0] = Literals(p[1].literal_list + p[3].literal_list)
@@ -327,6 +565,17 @@ def p_literals(p):
                                p[1].literal_list[-1].designation)
         p[0].literal_list[-1].connecting_edges.append(edge_fact)
         p[0].literal_list += p[3].literal_list
+    elif isinstance(p[2], EdgeCondition) and (
+            p[2].hops is not None or p[2].direction is None):
+        p[0] = p[1]
+        if p[2].direction == 'right_left':
+            edge_fact = path_fact(p[3].literal_list[0].designation,
+                                  p[1].literal_list[-1].designation, p[2])
+        else:
+            edge_fact = path_fact(p[1].literal_list[-1].designation,
+                                  p[3].literal_list[0].designation, p[2])
+        p[0].literal_list[-1].connecting_edges.append(edge_fact)
+        p[0].literal_list += p[3].literal_list
     elif isinstance(p[2], EdgeCondition) and p[2].direction == 'left_right':
         p[0] = p[1]
         edge_fact = EdgeExists(p[1].literal_list[-1].designation,
@@ -360,13 +609,81 @@ def p_match_where(p):
 
 def p_create(p):
     '''create_clause : CREATE literals'''
+    if any(isinstance(fact, PathExists) for node in p[2].literal_list for
+           fact in node.connecting_edges):
+        raise ParsingException(
+            "CREATE only takes single, directed relationships.")
     p[0] = CreateClause(p[2])
 
 
+def p_unwind(p):
+    '''unwind_clause : UNWIND PARAMETER AS KEY'''
+    p[0] = Unwind(Parameter(p[2]), p[4])
+
+
+def p_order_clause(p):
+    '''order_clause : ORDER BY order_item
+                    | order_clause COMMA order_item'''
+    if isinstance(p[1], OrderBy):
+        p[1].items.append(p[3])
+        p[0] = p[1]
+    else:
+        p[0] = OrderBy([p[3]])
+
+
+def p_order_item(p):
+    '''order_item : sort_expression
+                  | sort_expression ASC
+                  | sort_expression DESC'''
+    p[0] = (p[1], len(p) == 3 and p[2] == 'DESC',)
+
+
+def p_sort_expression(p):
+    '''sort_expression : KEY
+                       | keypath
+                       | aggregate'''
+    p[0] = p[1]
+
+
+def p_paging(p):
+    '''paging : SKIP count
+              | LIMIT count
+              | SKIP count LIMIT count'''
+    if len(p) == 5:
+        p[0] = Paging(skip=p[2], limit=p[4])
+    elif p[1] == 'SKIP':
+        p[0] = Paging(skip=p[2])
+    else:
+        p[0] = Paging(limit=p[2])
+
+
+def p_count(p):
+    '''count : INTEGER
+             | PARAMETER'''
+    if isinstance(p[1], int):
+        p[0] = p[1]
+    else:
+        p[0] = Parameter(p[1])
+
+
+def p_statement(p):
+    '''statement : full_query
+                 | EXPLAIN full_query
+                 | PROFILE full_query'''
+    p[0] = p[len(p) - 1]
+    if len(p) == 3:
+        p[0].mode = p[1]
+
+
 def p_full_query(p):
     '''full_query : match_where return_variables
+                  | match_where return_variables paging
+                  | match_where return_variables order_clause
+                  | match_where return_variables order_clause paging
                   | create_clause
-                  | create_clause return_variables'''
+                  | create_clause return_variables
+                  | unwind_clause create_clause
+                  | unwind_clause create_clause return_variables'''
     p[0] = FullQuery(*p[1:])
     if isinstance(p[1], CreateClause):
         p[1].is_head = True
@@ -375,18 +692,67 @@ def p_full_query(p):
 def p_return_variables(p):
     '''return_variables : RETURN KEY
                         | RETURN keypath
+                        | RETURN aggregate
                         | return_variables COMMA KEY
-                        | return_variables COMMA keypath'''
-    if len(p) == 3 and isinstance(p[2], (str, list)):
+                        | return_variables COMMA keypath
+                        | return_variables COMMA aggregate'''
+    if len(p) == 3 and isinstance(p[2], (str, list, Aggregate,)):
         p[0] = ReturnVariables(p[2])
     elif len(p) == 4:
         p[1].variable_list.append(p[3])
         p[0] = p[1]
 
 
+def p_aggregate(p):
+    '''aggregate : function_name LPAREN STAR RPAREN
+                 | function_name LPAREN KEY RPAREN
+                 | function_name LPAREN keypath RPAREN'''
+    function_name = p[1].lower()
+    if function_name not in AGGREGATE_FUNCTIONS:
+        raise ParsingException(
+            "Unknown aggregate function {}.".format(p[1]))
+    if p[3] == '*':
+        if function_name != 'count':
+            raise ParsingException(
+                "Only count can be applied to *, not {}.".format(p[1]))
+        p[0] = Aggregate(function_name)
+    else:
+        p[0] = Aggregate(function_name, argument=p[3])
+
+
+def p_function_name(p):
+    '''function_name : KEY
+                     | NAME'''
+    p[0] = p[1]
+
+
 def p_error(p):
     import pdb; pdb.set_trace()
     raise ParsingException("Generic error while parsing.")
 
 
-cypher_parser = yacc.yacc()
+_cypher_parser = None
+
+
+def get_parser():
+    """Build the parser the first time it's needed, rather than on import.
+       The LALR tables are read from the prebuilt ``parsetab`` module and
+       nothing is written to disk; if the tables are stale they're rebuilt
+       in memory (run ``write_parse_tables`` to refresh them)."""
+    global _cypher_parser
+    if _cypher_parser is None:
+        _cypher_parser = yacc.yacc(module=sys.modules[__name__],
+                                   debug=False, write_tables=False)
+    return _cypher_parser
+
+
+def write_parse_tables():
+    """Regenerate ``parsetab.py`` (and ``lextab.py``) next to this file.
+       This needs to be run whenever the grammar or the tokens change."""
+    write_lex_table()
+    yacc.yacc(module=sys.modules[__name__], debug=False, write_tables=True,
+              outputdir=os.path.dirname(os.path.abspath(__file__)))
+
+
+if __name__ == '__main__':
+    write_parse_tables()
@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 
+import os
+import sys
 import ply.lex as lex
 # Test
 
@@ -22,6 +24,16 @@ tokens = (
     'WHERE',
     'CREATE',
     'RETURN',
+    'UNWIND',
+    'AS',
+    'SKIP',
+    'LIMIT',
+    'ORDER',
+    'BY',
+    'ASC',
+    'DESC',
+    'EXPLAIN',
+    'PROFILE',
     'DOT',
     'NAME',
     'WHITESPACE',
@@ -31,9 +43,11 @@ tokens = (
     'OR',
     'NOT',
     'COMMA',
+    'STAR',
     'QUOTE',
     'INTEGER',
     'STRING',
+    'PARAMETER',
     'KEY',)
 
 
@@ -56,6 +70,7 @@ t_QUOTE = r'"'
 t_LCURLEY = r'{'
 t_RCURLEY = r'}'
 t_COMMA = r','
+t_STAR = r'\*'
 
 t_ignore = r' '
 
@@ -74,6 +89,12 @@ def t_AND(t):
     return t
 
 
+# Before ``t_OR``, which would otherwise match the start of it
+def t_ORDER(t):
+    r'ORDER\b'
+    return t
+
+
 def t_OR(t):
     r'OR'
     return t
@@ -99,6 +120,51 @@ def t_RETURN(t):
     return t
 
 
+def t_UNWIND(t):
+    r'UNWIND\b'
+    return t
+
+
+def t_AS(t):
+    r'AS\b'
+    return t
+
+
+def t_SKIP(t):
+    r'SKIP\b'
+    return t
+
+
+def t_LIMIT(t):
+    r'LIMIT\b'
+    return t
+
+
+def t_BY(t):
+    r'BY\b'
+    return t
+
+
+def t_ASC(t):
+    r'ASC\b'
+    return t
+
+
+def t_DESC(t):
+    r'DESC\b'
+    return t
+
+
+def t_EXPLAIN(t):
+    r'EXPLAIN\b'
+    return t
+
+
+def t_PROFILE(t):
+    r'PROFILE\b'
+    return t
+
+
 def t_DOT(t):
     r'\.'
     return t
@@ -130,4 +196,35 @@ def t_STRING(t):
     t.value = t.value.replace('"', '')
     return t
 
-cypher_tokenizer = lex.lex()
+
+def t_PARAMETER(t):
+    r'\$[A-Za-z]+[0-9]*'
+    t.value = t.value[1:]
+    return t
+
+_cypher_tokenizer = None
+
+
+def get_tokenizer():
+    """Build the lexer the first time it's needed, rather than on import.
+       The master regular expression is read from the prebuilt ``lextab``
+       module without re-validating the token rules. If the table is stale
+       (its tokens aren't the current ones), the lexer is built and
+       validated in memory instead; run ``write_lex_table`` to refresh
+       it."""
+    global _cypher_tokenizer
+    if _cypher_tokenizer is None:
+        import lextab
+        if lextab._lextokens == set(tokens):
+            _cypher_tokenizer = lex.lex(module=sys.modules[__name__],
+                                        optimize=1, lextab=lextab)
+        else:
+            _cypher_tokenizer = lex.lex(module=sys.modules[__name__])
+    return _cypher_tokenizer
+
+
+def write_lex_table():
+    """Regenerate ``lextab.py`` next to this file. This needs to be run
+       whenever the token rules change."""
+    lex.lex(module=sys.modules[__name__]).writetab(
+        'lextab', outputdir=os.path.dirname(os.path.abspath(__file__)))
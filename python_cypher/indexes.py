@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+"""
+This script contains the indexes that ``CypherToNetworkx`` keeps alongside
+each NetworkX graph, so that lookups don't have to walk the whole graph.
+"""
+
+import bisect
+import itertools
+import operator
+import weakref
+from result_cache import graph_version
+from vectorized import ColumnStore
+
+# Keyed weakly by the graph itself, so that copies, subgraphs and unpickled
+# graphs never share (stale) indexes with the graph they came from.
+_GRAPH_INDEXES = weakref.WeakKeyDictionary()
+
+
+def graph_indexes(graph_object):
+    """Return the ``GraphIndexes`` for ``graph_object``, building them the
+       first time the graph is seen, and again whenever the graph has a
+       different number of nodes than they do (as it will after nodes are
+       added to the graph directly)."""
+    indexes = _GRAPH_INDEXES.get(graph_object, None)
+    if indexes is None:
+        indexes = rebuild_graph_indexes(graph_object)
+    elif indexes.node_total != len(graph_object.node):
+        indexes = _resync_graph_indexes(graph_object)
+    return indexes
+
+
+def indexed_edge(graph_object, edge_id):
+    """Return the attribute dictionary of the edge ``edge_id``, or ``None``.
+       Counting the edges of a NetworkX graph takes a pass over it, so it's
+       only when an edge is missing from the index that the indexes are
+       checked against the graph, and rebuilt if it has other edges."""
+    indexes = graph_indexes(graph_object)
+    edge = indexes.get_edge(edge_id)
+    if edge is None and indexes.edge_total != edge_count(graph_object):
+        edge = _resync_graph_indexes(graph_object).get_edge(edge_id)
+    return edge
+
+
+def refresh_graph_indexes(graph_object, edges=False):
+    """Rebuild the indexes for ``graph_object`` if nodes, or (with
+       ``edges``) edges, have been added to it directly, as ``graph_indexes``
+       and ``indexed_edge`` would on their way. Checking the edges takes a
+       pass over them."""
+    indexes = graph_indexes(graph_object)
+    if edges and indexes.edge_total != edge_count(graph_object):
+        _resync_graph_indexes(graph_object)
+
+
+def _resync_graph_indexes(graph_object):
+    """Rebuild the indexes for a graph that's been changed behind their
+       back, and advance its ``GraphVersion``, since the change could
+       affect any cached result."""
+    graph_version(graph_object).bump(everything=True)
+    return rebuild_graph_indexes(graph_object)
+
+
+def edge_count(graph_object):
+    """The number of edges in the ``MultiDiGraph`` ``graph_object``, as
+       ``number_of_edges`` would count them but several times faster."""
+    return sum(itertools.imap(len, itertools.chain.from_iterable(
+        neighbors.itervalues() for
+        neighbors in graph_object.succ.itervalues())))
+
+
+def rebuild_graph_indexes(graph_object):
+    """Build the indexes for ``graph_object`` from scratch. This is needed
+       if the graph has been modified other than through the parser. Any
+       property indexes that have been created are kept (and refilled)."""
+    indexes = _GRAPH_INDEXES.get(graph_object, None)
+    if indexes is None:
+        indexes = GraphIndexes()
+        _GRAPH_INDEXES[graph_object] = indexes
+    indexes.rebuild(graph_object)
+    return indexes
+
+
+def keypath_value(document, keypath):
+    """Follow ``keypath`` (a list of keys) into a node's attribute
+       dictionary, returning ``None`` if any key is missing."""
+    value = document
+    for key in keypath:
+        try:
+            value = value[key]
+        except (KeyError, TypeError,):
+            return None
+    return value
+
+
+class HashIndex(object):
+    """Property index for equality lookups: maps each value found at the
+       keypath to the set of nodes having it."""
+    kind = 'hash'
+    operators = ('=',)
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.buckets = {}
+
+    def add(self, value, node):
+        try:
+            self.buckets.setdefault(value, set()).add(node)
+        except TypeError:
+            pass  # Unhashable values can't equal a literal in a query
+
+    def add_many(self, entries):
+        """Add each ``(value, node)`` pair in ``entries``."""
+        for value, node in entries:
+            self.add(value, node)
+
+    def lookup(self, operator, value):
+        return set(self.buckets.get(value, ()))
+
+
+class SortedIndex(object):
+    """Property index for equality and range lookups. Values are kept in a
+       sorted list alongside their nodes and searched with ``bisect``.
+       Entries added in bulk wait in ``pending`` until the next lookup."""
+    kind = 'sorted'
+    operators = ('=', '>', '>=', '<', '<=',)
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.values = []
+        self.nodes = []
+        self.pending = []
+
+    def add(self, value, node):
+        if self.pending:  # Keep the order in which entries were added
+            self.pending.append((value, node,))
+            return
+        position = bisect.bisect_right(self.values, value)
+        self.values.insert(position, value)
+        self.nodes.insert(position, node)
+
+    def add_many(self, entries):
+        """Add each ``(value, node)`` pair in ``entries``. They're merged
+           into the sorted lists at the next lookup, with one sort for
+           however many batches were added in the meantime."""
+        self.pending.extend(entries)
+
+    def _merge_pending(self):
+        # The sort is stable, so this gives the same order as calling
+        # ``add`` for each entry.
+        entries = zip(self.values, self.nodes) + self.pending
+        entries.sort(key=operator.itemgetter(0))
+        self.values = [value for value, _ in entries]
+        self.nodes = [node for _, node in entries]
+        self.pending = []
+
+    def lookup(self, operator, value):
+        if self.pending:
+            self._merge_pending()
+        if operator == '=':
+            start = bisect.bisect_left(self.values, value)
+            end = bisect.bisect_right(self.values, value)
+        elif operator == '>':
+            start, end = bisect.bisect_right(self.values, value), None
+        elif operator == '>=':
+            start, end = bisect.bisect_left(self.values, value), None
+        elif operator == '<':
+            start, end = 0, bisect.bisect_left(self.values, value)
+        elif operator == '<=':
+            start, end = 0, bisect.bisect_right(self.values, value)
+        else:
+            raise Exception("Unhandled operator in SortedIndex.lookup.")
+        return set(self.nodes[start:end])
+
+    def ordered_nodes(self, descending=False):
+        """Iterator over the indexed nodes in order of their values."""
+        if self.pending:
+            self._merge_pending()
+        if descending:
+            return reversed(self.nodes)
+        return iter(self.nodes)
+
+
+PROPERTY_INDEX_KINDS = {
+    'hash': HashIndex,
+    'sorted': SortedIndex}
+
+
+class GraphStatistics(object):
+    """Planner statistics computed from ``edge_counts``, which counts the
+       edges for each ``(source_class, edge_label, target_class)``. Child
+       classes supply ``node_count``."""
+    def edge_count(self, source_class=None, edge_label=None,
+                   target_class=None):
+        """The number of edges matching the signature, where ``None``
+           matches anything."""
+        return sum(
+            count for (one_source, one_label, one_target), count in
+            self.edge_counts.iteritems() if
+            source_class in (None, one_source) and
+            edge_label in (None, one_label) and
+            target_class in (None, one_target))
+
+    def average_degree(self, source_class=None, edge_label=None,
+                       target_class=None, outgoing=True):
+        """Average number of matching edges leaving each node of
+           ``source_class`` (or, if not ``outgoing``, entering each node of
+           ``target_class``)."""
+        node_count = self.node_count(
+            source_class if outgoing else target_class)
+        if node_count == 0:
+            return 0.0
+        return float(self.edge_count(
+            source_class, edge_label, target_class)) / node_count
+
+
+class GraphIndexes(GraphStatistics):
+    """The indexes for one ``MultiDiGraph``. ``edge_index`` maps each edge's
+       ``_id`` to a tuple ``(source, target, key, data)``, and
+       ``label_index`` maps each node class to the set of its nodes.
+       ``property_indexes`` holds the opt-in ``HashIndex`` and
+       ``SortedIndex`` objects, keyed by ``(node_class, keypath)``, and
+       ``columns`` the property columns used to vectorize WHERE clauses.
+       ``node_total`` and ``edge_total`` count the nodes and edges indexed,
+       to tell when the graph has been changed behind the indexes' back.
+
+       The indexes double as the statistics used by the query planner:
+       ``edge_counts`` counts the edges for each ``(source_class,
+       edge_label, target_class)``, and the label index gives the number of
+       nodes of each class."""
+    def __init__(self, graph_object=None):
+        self.edge_index = {}
+        self.label_index = {}
+        self.property_indexes = {}
+        self.edge_counts = {}
+        self.node_total = 0
+        self.edge_total = 0
+        self.columns = ColumnStore()
+        if graph_object is not None:
+            self.rebuild(graph_object)
+
+    def rebuild(self, graph_object):
+        self.edge_index = {}
+        self.label_index = {}
+        self.edge_counts = {}
+        self.node_total = 0
+        self.edge_total = 0
+        self.columns.clear()
+        for property_index in self.property_indexes.values():
+            property_index.clear()
+        for node, data in graph_object.nodes_iter(data=True):
+            self.add_node(node, data)
+        for source, target, key, data in graph_object.edges_iter(
+                keys=True, data=True):
+            self.add_edge(
+                source, target, key, data,
+                source_class=graph_object.node[source].get('class', None),
+                target_class=graph_object.node[target].get('class', None))
+
+    def add_node(self, node, data, class_key='class'):
+        node_class = data.get(class_key, None)
+        self.label_index.setdefault(node_class, set()).add(node)
+        self.node_total += 1
+        self.columns.invalidate(node_class)
+        for (index_class, keypath), property_index in (
+                self.property_indexes.iteritems()):
+            if index_class == node_class:
+                property_index.add(keypath_value(data, keypath), node)
+
+    def add_nodes(self, nodes, class_key='class'):
+        """Bulk version of ``add_node`` for a list of ``(node, data)``
+           pairs: each label set and property index is updated once."""
+        nodes_by_class = {}
+        for node, data in nodes:
+            nodes_by_class.setdefault(
+                data.get(class_key, None), []).append((node, data,))
+        self.node_total += len(nodes)
+        for node_class, class_nodes in nodes_by_class.iteritems():
+            self.label_index.setdefault(node_class, set()).update(
+                node for node, _ in class_nodes)
+            self.columns.invalidate(node_class)
+            for (index_class, keypath), property_index in (
+                    self.property_indexes.iteritems()):
+                if index_class == node_class:
+                    property_index.add_many(
+                        (keypath_value(data, keypath), node) for
+                        node, data in class_nodes)
+
+    def create_property_index(self, graph_object, node_class, keypath,
+                              kind='hash'):
+        """Create (or replace) a property index over the nodes of
+           ``node_class`` and fill it from ``graph_object``."""
+        if kind not in PROPERTY_INDEX_KINDS:
+            raise Exception("Unknown index kind {}.".format(kind))
+        property_index = PROPERTY_INDEX_KINDS[kind]()
+        for node in self.nodes_of_class(node_class):
+            property_index.add(
+                keypath_value(graph_object.node[node], keypath), node)
+        self.property_indexes[(node_class, tuple(keypath))] = property_index
+        return property_index
+
+    def indexed_nodes(self, node_class, keypath, operator, value):
+        """Return the set of nodes of ``node_class`` whose value at
+           ``keypath`` satisfies ``operator`` against ``value``, or ``None``
+           if no index can answer the question."""
+        property_index = self.property_indexes.get(
+            (node_class, tuple(keypath)), None)
+        if property_index is None or operator not in property_index.operators:
+            return None
+        return property_index.lookup(operator, value)
+
+    def ordered_nodes(self, node_class, keypath, descending=False):
+        """Iterator over the nodes of ``node_class`` in order of their
+           values at ``keypath``, or ``None`` if there's no sorted index on
+           it."""
+        property_index = self.property_indexes.get(
+            (node_class, tuple(keypath)), None)
+        if not isinstance(property_index, SortedIndex):
+            return None
+        return property_index.ordered_nodes(descending=descending)
+
+    def add_edge(self, source, target, key, data, source_class=None,
+                 target_class=None, label_key='edge_label'):
+        edge_id = data.get('_id', None)
+        if edge_id is not None:
+            self.edge_index[edge_id] = (source, target, key, data)
+        signature = (source_class, data.get(label_key, None), target_class,)
+        self.edge_counts[signature] = self.edge_counts.get(signature, 0) + 1
+        self.edge_total += 1
+
+    def get_edge(self, edge_id):
+        """Return the attribute dictionary of the edge, or ``None``."""
+        entry = self.edge_index.get(edge_id, None)
+        if entry is None:
+            return None
+        return entry[3]
+
+    def nodes_of_class(self, node_class):
+        """Return the set of nodes whose class is ``node_class``."""
+        return self.label_index.get(node_class, set())
+
+    def node_count(self, node_class=None):
+        """The number of nodes of ``node_class``, or of all nodes if it's
+           ``None``."""
+        if node_class is None:
+            return sum(len(nodes) for nodes in self.label_index.itervalues())
+        return len(self.nodes_of_class(node_class))
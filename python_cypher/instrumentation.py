@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+"""
+This script contains the hooks for watching queries as they run. Observers
+(``QueryObserver`` children) are registered with a parser's
+``add_observer``; while there are any, each call to ``query`` is run by a
+copy of the parser whose class also inherits ``InstrumentedParser``, which
+tells the observers when the query is parsed, when its plan is chosen and
+when each row is returned, and counts what the query does in a
+``QueryMetrics``. With no observers, ``query`` runs as usual and nothing is
+counted.
+
+``LatencyAggregator`` is an observer that keeps the recent latencies of
+each kind of query, as told apart by ``query_fingerprint``.
+"""
+
+import collections
+import time
+
+import ply.lex as lex
+
+from cypher_tokenizer import get_tokenizer
+from matcher import PatternMatcher, PAUSE
+from query_cache import QueryCache
+from query_plan import build_plan
+
+# The phases of a query whose times are kept in ``QueryMetrics``
+PHASES = ('parse', 'plan', 'execute',)
+
+
+class QueryObserver(object):
+    """Base class for observers. Each method is called at one point of a
+       query, with the query string first; they do nothing unless
+       overridden. ``row_emitted`` is only called for observers that
+       override it."""
+    def parse_started(self, query_string):
+        pass
+
+    def parse_finished(self, query_string, cache_hit):
+        """The query has been parsed, or found in the ``query_cache`` if
+           ``cache_hit``."""
+        pass
+
+    def plan_chosen(self, query_string, plan):
+        """A MATCH query is about to run with ``plan``, a ``Plan`` like
+           the one EXPLAIN gives."""
+        pass
+
+    def row_emitted(self, query_string, row):
+        pass
+
+    def query_finished(self, query_string, metrics):
+        """The query's rows have all been read (or the caller stopped
+           reading them); ``metrics`` is its ``QueryMetrics``."""
+        pass
+
+
+def overrides(observer, name):
+    """True if ``observer`` has its own version of the method ``name``."""
+    return (getattr(type(observer), name).im_func is not
+            QueryObserver.__dict__[name])
+
+
+class QueryMetrics(object):
+    """What one query did: the assignments the matcher found, the
+       candidates it tried for each designation, the edge lookups
+       (``_edges_connecting_nodes`` and ``_get_edge_from_id`` calls), the
+       expansions along edges (``_expand`` and ``_neighbors`` calls), the
+       rows returned and the time spent in each of ``PHASES``, in seconds.
+       The time the caller takes between rows isn't counted. Neither are
+       the candidates and assignments of a PROFILE query (which has a
+       matcher of its own) or the work done by the forked processes of a
+       query with ``workers``."""
+    def __init__(self, query_string):
+        self.query_string = query_string
+        self.cache_hit = None
+        self.assignments = 0
+        self.candidates = 0
+        self.edge_lookups = 0
+        self.expansions = 0
+        self.rows = 0
+        self.phase_times = dict((phase, 0.0) for phase in PHASES)
+
+    @property
+    def total_time(self):
+        return sum(self.phase_times.itervalues())
+
+    def as_dict(self):
+        return {'query': self.query_string,
+                'cache_hit': self.cache_hit,
+                'assignments': self.assignments,
+                'candidates': self.candidates,
+                'edge_lookups': self.edge_lookups,
+                'expansions': self.expansions,
+                'rows': self.rows,
+                'phase_times': dict(self.phase_times),
+                'total_time': self.total_time}
+
+
+class InstrumentedMatcher(PatternMatcher):
+    """A ``PatternMatcher`` that counts its candidates and assignments in
+       the ``metrics`` of its (``InstrumentedParser``) parser."""
+    def __init__(self, parser, *args, **kwargs):
+        self.metrics = parser.metrics
+        PatternMatcher.__init__(self, parser, *args, **kwargs)
+
+    def matches(self, pause_every=None):
+        metrics = self.metrics
+        for assignment in PatternMatcher.matches(
+                self, pause_every=pause_every):
+            if assignment is not PAUSE:
+                metrics.assignments += 1
+            yield assignment
+
+    def _candidates(self, depth, assignment):
+        metrics = self.metrics
+        for candidate in PatternMatcher._candidates(self, depth, assignment):
+            metrics.candidates += 1
+            yield candidate
+
+
+def _counted(name, counter):
+    def _method(self, *args, **kwargs):
+        metrics = self.metrics
+        setattr(metrics, counter, getattr(metrics, counter) + 1)
+        return getattr(super(InstrumentedParser, self), name)(
+            *args, **kwargs)
+    _method.__name__ = name
+    return _method
+
+
+class InstrumentedParser(object):
+    """Mixed into a parser's class by ``instrumented_parser`` to count its
+       edge lookups, time its parsing and planning, and tell its observers
+       (``observing``) about them. The time taken by the observers, and by
+       building the plans they're given, is kept in ``observer_time``."""
+    matcher_class = InstrumentedMatcher
+
+    _edges_connecting_nodes = _counted('_edges_connecting_nodes',
+                                       'edge_lookups')
+    _get_edge_from_id = _counted('_get_edge_from_id', 'edge_lookups')
+    _expand = _counted('_expand', 'expansions')
+    _neighbors = _counted('_neighbors', 'expansions')
+
+    def _notify(self, name, *args):
+        start = time.time()
+        for observer in self.observing:
+            getattr(observer, name)(*args)
+        self.observer_time += time.time() - start
+
+    def parse_cached(self, query_string, params=None):
+        metrics = self.metrics
+        self._notify('parse_started', query_string)
+        start = time.time()
+        metrics.cache_hit = query_string in self.query_cache.entries
+        try:
+            return super(InstrumentedParser, self).parse_cached(
+                query_string, params)
+        finally:
+            metrics.phase_times['parse'] += time.time() - start
+            self._notify('parse_finished', query_string, metrics.cache_hit)
+
+    def _query_matcher(self, graph_object, parsed_query, atomic_facts):
+        start = time.time()
+        matcher, presorted = super(InstrumentedParser, self)._query_matcher(
+            graph_object, parsed_query, atomic_facts)
+        self.metrics.phase_times['plan'] += time.time() - start
+        if any(overrides(observer, 'plan_chosen') for
+               observer in self.observing):
+            start = time.time()
+            plan = build_plan(matcher, parsed_query, presorted)
+            self.observer_time += time.time() - start
+            self._notify('plan_chosen', self.metrics.query_string, plan)
+        return matcher, presorted
+
+
+_instrumented_classes = {}
+
+
+def instrumented_parser(parser, metrics):
+    """A copy of ``parser`` (sharing its caches) whose class also inherits
+       ``InstrumentedParser``, counting in ``metrics``. The copy has no
+       observers of its own, so its ``query`` runs as usual."""
+    parser_class = type(parser)
+    instrumented_class = _instrumented_classes.get(parser_class, None)
+    if instrumented_class is None:
+        instrumented_class = _instrumented_classes[parser_class] = type(
+            'Instrumented' + parser_class.__name__,
+            (InstrumentedParser, parser_class,), {})
+    instrumented = instrumented_class.__new__(instrumented_class)
+    instrumented.__dict__.update(parser.__dict__)
+    instrumented.observing = list(parser.observers)
+    instrumented.observers = []
+    instrumented.metrics = metrics
+    instrumented.observer_time = 0.0
+    return instrumented
+
+
+def observed_rows(parser, graph_object, query_string, **kwargs):
+    """Generator over the rows of ``parser.query(graph_object,
+       query_string, **kwargs)``, run by an instrumented copy of ``parser``
+       that reports to its observers."""
+    metrics = QueryMetrics(query_string)
+    instrumented = instrumented_parser(parser, metrics)
+    row_observers = [observer for observer in instrumented.observing if
+                     overrides(observer, 'row_emitted')]
+    rows = instrumented.query(graph_object, query_string, **kwargs)
+    elapsed = 0.0
+    try:
+        while True:
+            start = time.time()
+            try:
+                row = next(rows)
+            except StopIteration:
+                break
+            finally:
+                elapsed += time.time() - start
+            metrics.rows += 1
+            for observer in row_observers:
+                observer.row_emitted(query_string, row)
+            yield row
+    finally:
+        parser.last_profile = instrumented.last_profile
+        phase_times = metrics.phase_times
+        phase_times['execute'] = max(
+            elapsed - instrumented.observer_time - phase_times['parse'] -
+            phase_times['plan'], 0.0)
+        instrumented._notify('query_finished', query_string, metrics)
+
+
+# Tokens whose values are left out of a query's fingerprint
+LITERAL_TOKENS = frozenset(['INTEGER', 'STRING'])
+# ...unless they follow one of these, as the hops of a path do
+KEEP_LITERALS_AFTER = frozenset(['STAR', 'DOT'])
+
+
+def query_fingerprint(query_string):
+    """The query with its literal values replaced by ``?`` and any run of
+       spaces between tokens by a single one, so that queries differing only
+       in their constants (or parameters) share a fingerprint."""
+    lexer = get_tokenizer().clone()
+    lexer.input(query_string)
+    parts = []
+    previous, end = None, 0
+    try:
+        for token in iter(lexer.token, None):
+            if token.lexpos > end and parts:
+                parts.append(' ')
+            if (token.type in LITERAL_TOKENS and
+                    previous not in KEEP_LITERALS_AFTER):
+                parts.append('?')
+            else:
+                parts.append(query_string[token.lexpos:lexer.lexpos])
+            previous, end = token.type, lexer.lexpos
+    except lex.LexError:
+        return ' '.join(query_string.split())
+    return ''.join(parts)
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of the sorted list ``values``."""
+    rank = max(int(round(fraction * len(values) + 0.5)) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+class LatencyAggregator(QueryObserver):
+    """Keeps the total times of the last ``window`` runs of each query
+       fingerprint, for the ``max_fingerprints`` fingerprints seen most
+       recently, and gives their percentiles::
+
+           aggregator = LatencyAggregator()
+           parser.add_observer(aggregator)
+           ...
+           aggregator.snapshot()  # {fingerprint: {'p50': ..., ...}}
+       """
+    def __init__(self, window=1000, max_fingerprints=128):
+        self.window = window
+        self.latencies = QueryCache(max_size=max_fingerprints)
+        self.fingerprints = QueryCache(max_size=max_fingerprints)
+
+    def fingerprint(self, query_string):
+        fingerprint = self.fingerprints.get(query_string)
+        if fingerprint is None:
+            fingerprint = query_fingerprint(query_string)
+            self.fingerprints.put(query_string, fingerprint)
+        return fingerprint
+
+    def query_finished(self, query_string, metrics):
+        fingerprint = self.fingerprint(query_string)
+        latencies = self.latencies.get(fingerprint)
+        if latencies is None:
+            latencies = collections.deque(maxlen=self.window)
+            self.latencies.put(fingerprint, latencies)
+        latencies.append(metrics.total_time)
+
+    def percentiles(self, fingerprint):
+        """``{'count': ..., 'p50': ..., 'p95': ..., 'p99': ...}`` for the
+           runs of ``fingerprint`` in the window, or ``None`` if there are
+           none."""
+        latencies = self.latencies.entries.get(fingerprint, None)
+        if not latencies:
+            return None
+        latencies = sorted(latencies)
+        return {'count': len(latencies),
+                'p50': percentile(latencies, 0.5),
+                'p95': percentile(latencies, 0.95),
+                'p99': percentile(latencies, 0.99)}
+
+    def snapshot(self):
+        return dict((fingerprint, self.percentiles(fingerprint)) for
+                    fingerprint in list(self.latencies.entries))
@@ -0,0 +1,10 @@
+# lextab.py. This file automatically created by PLY (version 3.11). Don't edit!
+_tabversion   = '3.10'
+_lextokens    = set(('AND', 'AS', 'ASC', 'BY', 'COLON', 'COMMA', 'CREATE', 'DASH', 'DESC', 'DOT', 'EQUALS', 'EXPLAIN', 'GREATERTHAN', 'GREATERTHAN_OR_EQUAL', 'INTEGER', 'KEY', 'LBRACKET', 'LCURLEY', 'LEFT_ARROW', 'LESSTHAN', 'LESSTHAN_OR_EQUAL', 'LIMIT', 'LPAREN', 'MATCH', 'NAME', 'NOT', 'NOT_EQUAL', 'OR', 'ORDER', 'PARAMETER', 'PROFILE', 'QUOTE', 'RBRACKET', 'RCURLEY', 'RETURN', 'RIGHT_ARROW', 'RPAREN', 'SKIP', 'STAR', 'STRING', 'UNWIND', 'WHERE', 'WHITESPACE'))
+_lexreflags   = 64
+_lexliterals  = ''
+_lexstateinfo = {'INITIAL': 'inclusive'}
+_lexstatere   = {'INITIAL': [('(?P<t_MATCH>MATCH)|(?P<t_AND>AND)|(?P<t_ORDER>ORDER\\b)|(?P<t_OR>OR)|(?P<t_NOT>NOT)|(?P<t_WHERE>WHERE)|(?P<t_CREATE>CREATE)|(?P<t_RETURN>RETURN)|(?P<t_UNWIND>UNWIND\\b)|(?P<t_AS>AS\\b)|(?P<t_SKIP>SKIP\\b)|(?P<t_LIMIT>LIMIT\\b)|(?P<t_BY>BY\\b)|(?P<t_ASC>ASC\\b)|(?P<t_DESC>DESC\\b)|(?P<t_EXPLAIN>EXPLAIN\\b)|(?P<t_PROFILE>PROFILE\\b)|(?P<t_DOT>\\.)|(?P<t_NAME>[A-Z]+[a-z0-9]*)|(?P<t_KEY>[A-Za-z]+[0-9]*)|(?P<t_INTEGER>[0-9]+)|(?P<t_FLOAT>[+-]?[0-9]*\\.[0-9]+)|(?P<t_STRING>"[A-Za-z0-9]+")|(?P<t_PARAMETER>\\$[A-Za-z]+[0-9]*)|(?P<t_WHITESPACE>[ ]+)|(?P<t_RIGHT_ARROW>-->)|(?P<t_LEFT_ARROW><--)|(?P<t_RBRACKET>\\])|(?P<t_LBRACKET>\\[)|(?P<t_LPAREN>\\()|(?P<t_NOT_EQUAL>!=)|(?P<t_STAR>\\*)|(?P<t_GREATERTHAN_OR_EQUAL>>=)|(?P<t_LESSTHAN_OR_EQUAL><=)|(?P<t_RPAREN>\\))|(?P<t_RCURLEY>})|(?P<t_LESSTHAN><)|(?P<t_COLON>:)|(?P<t_COMMA>,)|(?P<t_GREATERTHAN>>)|(?P<t_QUOTE>")|(?P<t_EQUALS>=)|(?P<t_DASH>-)|(?P<t_LCURLEY>{)', [None, ('t_MATCH', 'MATCH'), ('t_AND', 'AND'), ('t_ORDER', 'ORDER'), ('t_OR', 'OR'), ('t_NOT', 'NOT'), ('t_WHERE', 'WHERE'), ('t_CREATE', 'CREATE'), ('t_RETURN', 'RETURN'), ('t_UNWIND', 'UNWIND'), ('t_AS', 'AS'), ('t_SKIP', 'SKIP'), ('t_LIMIT', 'LIMIT'), ('t_BY', 'BY'), ('t_ASC', 'ASC'), ('t_DESC', 'DESC'), ('t_EXPLAIN', 'EXPLAIN'), ('t_PROFILE', 'PROFILE'), ('t_DOT', 'DOT'), ('t_NAME', 'NAME'), ('t_KEY', 'KEY'), ('t_INTEGER', 'INTEGER'), ('t_FLOAT', 'FLOAT'), ('t_STRING', 'STRING'), ('t_PARAMETER', 'PARAMETER'), (None, 'WHITESPACE'), (None, 'RIGHT_ARROW'), (None, 'LEFT_ARROW'), (None, 'RBRACKET'), (None, 'LBRACKET'), (None, 'LPAREN'), (None, 'NOT_EQUAL'), (None, 'STAR'), (None, 'GREATERTHAN_OR_EQUAL'), (None, 'LESSTHAN_OR_EQUAL'), (None, 'RPAREN'), (None, 'RCURLEY'), (None, 'LESSTHAN'), (None, 'COLON'), (None, 'COMMA'), (None, 'GREATERTHAN'), (None, 'QUOTE'), (None, 'EQUALS'), (None, 'DASH'), (None, 'LCURLEY')])]}
+_lexstateignore = {'INITIAL': ' '}
+_lexstateerrorf = {'INITIAL': 't_error'}
+_lexstateeoff = {}
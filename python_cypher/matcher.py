@@ -0,0 +1,486 @@
+# -*- coding: utf-8 -*-
+"""
+This script contains the ``PatternMatcher``, which enumerates the assignments
+of designations to nodes that satisfy the pattern of a MATCH clause.
+"""
+
+from cypher_parser import *
+from constraint_compiler import flatten_operands
+from planner import (plan_binding_order, condition_selectivity,
+                     EQUALITY_SELECTIVITY)
+from traversal import PathSearch
+
+# Yielded by ``PatternMatcher.matches`` when it's asked to pause
+PAUSE = object()
+
+
+def where_conjuncts(constraint):
+    """Split a WHERE constraint into the list of its top-level conjuncts."""
+    return flatten_operands(constraint, And)
+
+
+def constraint_designations(constraint):
+    """Return the set of designations a WHERE constraint refers to."""
+    if isinstance(constraint, Or):
+        return (constraint_designations(constraint.left_disjunct) |
+                constraint_designations(constraint.right_disjunct))
+    elif isinstance(constraint, And):
+        return (constraint_designations(constraint.left_conjunct) |
+                constraint_designations(constraint.right_conjunct))
+    elif isinstance(constraint, Not):
+        return constraint_designations(constraint.argument)
+    designations = set([constraint.keypath[0]])
+    if isinstance(constraint.value, Reference):  # Comparing two keypaths
+        designations.add(constraint.value.keypath[0])
+    return designations
+
+
+class WhereConjunct(object):
+    """One top-level conjunct of a WHERE clause, tagged with the
+       designations it refers to so it can be checked as soon as they're all
+       bound. ``test`` is the conjunct compiled into a function of the
+       assignment. ``filtered`` is set if the conjunct has already been
+       applied to the domain of its only designation, so it needn't be
+       checked again."""
+    def __init__(self, constraint, test):
+        self.constraint = constraint
+        self.test = test
+        self.designations = constraint_designations(constraint)
+        self.filtered = False
+
+
+def document_conditions(document, keypath=None):
+    """Flatten an attribute document into ``(keypath, value)`` pairs, one
+       for each leaf."""
+    keypath = keypath or []
+    conditions = []
+    for key, value in document.iteritems():
+        if isinstance(value, dict):
+            conditions += document_conditions(value, keypath + [key])
+        else:
+            conditions.append((keypath + [key], value,))
+    return conditions
+
+
+def document_equals(node, document, ignored_key='class'):
+    """True if ``node`` equals ``document`` once ``ignored_key`` is left out
+       of ``node``. Nothing is copied: the sizes are compared, then each key
+       of ``document`` is looked up in ``node`` (nested maps are compared
+       with ``==``, which doesn't copy either)."""
+    if ignored_key in document:
+        return False
+    size = len(node)
+    if ignored_key in node:
+        size -= 1
+    if size != len(document):
+        return False
+    for key, value in document.iteritems():
+        if key not in node or node[key] != value:
+            return False
+    return True
+
+
+class PatternMatcher(object):
+    """Backtracking matcher over the atomic facts of a query. Designations
+       are bound one at a time, and every ``NodeHasDocument`` and
+       ``EdgeExists`` fact is checked as soon as all of the designations it
+       mentions are bound. A failed check prunes the whole branch, so the
+       work done is proportional to the partial matches that survive rather
+       than to |V|^k.
+
+       The backend (a ``CypherParserBaseClass`` child) supplies the domains
+       and the node and edge lookups. Each designation only ranges over the
+       nodes of its declared class, so ``ClassIs`` facts never need to be
+       checked during the search. Where the backend has a property index
+       for an inline attribute or a top-level WHERE constraint, the domain
+       is narrowed further to the nodes the index returns.
+
+       The WHERE clause is split into its conjuncts, and each one is
+       evaluated as soon as the designations it mentions are bound, so a
+       selective predicate prunes the search early. A disjunction over
+       several designations waits until all of them are bound.
+
+       The binding order comes from ``plan_binding_order``: it starts at
+       the most selective designation and grows along ``EdgeExists`` facts,
+       using the backend's statistics when it has any. A designation joined
+       by an edge to one that's already bound isn't drawn from its domain
+       at all: it's expanded from the bound node's neighbours through the
+       backend's ``_expand``, so an edge hop costs the node's degree rather
+       than |V|.
+
+       A ``PathExists`` fact (a variable-length relationship) is followed
+       in the same way, with a breadth-first search from the bound end
+       (see ``PathSearch``); if both ends are bound it's checked with a
+       bidirectional search.
+
+       If a ``limit`` is given, only that many assignments will be read, so
+       WHERE conjuncts aren't evaluated over whole classes in advance: the
+       search may well stop long before it has seen most of the nodes.
+       ``first`` forces the designation to bind first, as when its
+       candidates have to be tried in a given order.
+
+       ``anchors`` maps some designations to the only nodes they may be
+       bound to, as when looking for the matches that involve a few new
+       nodes. Those of the nodes that are of the right class make up the
+       designation's domain, and WHERE conjuncts aren't evaluated over
+       whole classes either, so the search stays near the anchors."""
+    def __init__(self, parser, graph_object, atomic_facts, limit=None,
+                 first=None, anchors=None):
+        self.parser = parser
+        self.graph_object = graph_object
+        self.limit = limit
+        self.first = first
+        self.anchors = anchors
+        self.node_classes = {}
+        self.index_conditions = {}
+        self.where_conjuncts = []
+        for fact in atomic_facts:
+            if isinstance(fact, ClassIs):
+                classes = self.node_classes.setdefault(fact.designation, set())
+                if fact.class_name is not None:
+                    classes.add(fact.class_name)
+            elif (isinstance(fact, MatchWhere) and
+                    fact.where_clause is not None):
+                self.where_conjuncts += [
+                    WhereConjunct(constraint, parser.compile_constraint(
+                        constraint, graph_object)) for constraint in
+                    where_conjuncts(fact.where_clause.constraint)]
+        self._collect_index_conditions(atomic_facts)
+        self.path_searches = {
+            fact: PathSearch(parser, graph_object, fact) for
+            fact in atomic_facts if isinstance(fact, PathExists)}
+        self.indexed_designations = set()
+        # ``(designation, kind, condition)`` for each condition answered by
+        # a property index (``kind`` 'index', the condition a ``(keypath,
+        # operator, value)`` triple) or over columns (a WHERE conjunct)
+        self.index_uses = []
+        domains = {designation: self._domain(designation) for designation in
+                   self.node_classes}
+        self.designations = self._plan(domains, atomic_facts)
+        self.domains = [domains[designation] for designation in
+                        self.designations]
+        self.drivers = self._choose_drivers(atomic_facts)
+        self.checks = self._schedule(atomic_facts)
+        self.pause_every = None
+        self.explored = 0
+
+    def _choose_drivers(self, atomic_facts):
+        """For each position in the binding order, the ``EdgeExists`` or
+           ``PathExists`` fact (if any) to expand along from an already
+           bound designation. Single edges are preferred to paths, and
+           labeled edges to unlabeled ones, since they are more
+           selective."""
+        position = {designation: index for index, designation in
+                    enumerate(self.designations)}
+        drivers = [None for _ in self.designations]
+        for fact in atomic_facts:
+            if (not isinstance(fact, (EdgeExists, PathExists,)) or
+                    fact.node_1 == fact.node_2):
+                continue
+            depth = max(position[fact.node_1], position[fact.node_2])
+            current = drivers[depth]
+            if current is None or (
+                    isinstance(current, PathExists) and
+                    isinstance(fact, EdgeExists)) or (
+                    type(current) is type(fact) and
+                    current.edge_label is None and
+                    fact.edge_label is not None):
+                drivers[depth] = fact
+        return drivers
+
+    def _node_class(self, designation):
+        classes = self.node_classes[designation]
+        if len(classes) == 1:
+            return list(classes)[0]
+        return None
+
+    def _plan(self, domains, atomic_facts):
+        """Choose the binding order. Each designation's estimated number of
+           candidates is the size of its domain, scaled down by a guess at
+           the selectivity of any conditions on it that no index answered."""
+        statistics = self.parser._statistics(self.graph_object)
+        estimates = {}
+        survival = {}
+        for designation, domain in domains.iteritems():
+            selectivity = 1.0
+            if designation not in self.indexed_designations:
+                for fact in atomic_facts:
+                    if (isinstance(fact, NodeHasDocument) and
+                            fact.designation == designation and
+                            fact.document):
+                        selectivity *= EQUALITY_SELECTIVITY
+                for conjunct in self.where_conjuncts:
+                    if conjunct.designations == set([designation]):
+                        selectivity *= condition_selectivity(
+                            conjunct.constraint)
+            if domain is None:
+                domain_size = (
+                    statistics.node_count() if statistics is not None else
+                    len(self.parser._get_domain(self.graph_object)))
+            else:
+                domain_size = len(domain)
+            estimates[designation] = domain_size * selectivity
+            if statistics is not None:
+                class_size = statistics.node_count(
+                    self._node_class(designation))
+                survival[designation] = (
+                    estimates[designation] / max(class_size, 1))
+
+        def _fanout(fact, designation):
+            if statistics is None or isinstance(fact, PathExists):
+                return None
+            degree = statistics.average_degree(
+                self._node_class(fact.node_1), fact.edge_label,
+                self._node_class(fact.node_2),
+                outgoing=(designation == fact.node_2))
+            return degree * survival[designation]
+
+        edge_facts = [fact for fact in atomic_facts if
+                      isinstance(fact, (EdgeExists, PathExists,))]
+        return plan_binding_order(
+            sorted(domains.keys()), estimates, edge_facts, _fanout,
+            first=self.first)
+
+    def _collect_index_conditions(self, atomic_facts):
+        """Record, for each designation, the ``(keypath, operator, value)``
+           conditions that every match must satisfy and that a property
+           index might be able to answer."""
+        for fact in atomic_facts:
+            if isinstance(fact, NodeHasDocument) and fact.document:
+                for keypath, value in document_conditions(fact.document):
+                    self.index_conditions.setdefault(
+                        fact.designation, []).append((keypath, '=', value,))
+        for conjunct in self.where_conjuncts:
+            constraint = conjunct.constraint
+            if (isinstance(constraint, Constraint) and
+                    len(constraint.keypath) > 1 and
+                    constraint.keypath[0] in self.node_classes and
+                    not isinstance(constraint.value, Reference)):
+                self.index_conditions.setdefault(
+                    constraint.keypath[0], []).append(
+                        (constraint.keypath[1:],
+                         constraint.function_string,
+                         constraint.value,))
+
+    def _schedule(self, atomic_facts):
+        """For each position in the binding order, return the list of facts
+           that become checkable once that position has been bound. Node
+           facts come before edge facts because they are cheaper, and WHERE
+           conjuncts come last because they may refer to edges bound by
+           the edge facts."""
+        if len(self.designations) == 0:
+            return []
+        position = {designation: index for index, designation in
+                    enumerate(self.designations)}
+        node_checks = [[] for _ in self.designations]
+        edge_checks = [[] for _ in self.designations]
+        where_checks = [[] for _ in self.designations]
+        for fact in atomic_facts:
+            if isinstance(fact, NodeHasDocument):
+                node_checks[position[fact.designation]].append(fact)
+            elif isinstance(fact, (EdgeExists, PathExists,)):
+                edge_position = max(position[fact.node_1],
+                                    position[fact.node_2])
+                if self.drivers[edge_position] is not fact:
+                    edge_checks[edge_position].append(fact)
+                if fact.designation is not None:
+                    position[fact.designation] = edge_position
+        last_position = len(self.designations) - 1
+        for conjunct in self.where_conjuncts:
+            if conjunct.filtered:
+                continue
+            where_checks[max(position.get(designation, last_position) for
+                             designation in conjunct.designations)].append(
+                                 conjunct)
+        return [node_facts + edge_facts + where_facts for
+                node_facts, edge_facts, where_facts in
+                zip(node_checks, edge_checks, where_checks)]
+
+    def matches(self, pause_every=None):
+        """Generator over every assignment (a dictionary from designations
+           to node and edge ids) that satisfies all of the atomic facts. If
+           ``pause_every`` is given, ``PAUSE`` is also yielded each time
+           that many candidates have been tried, so that a caller can give
+           other work a turn."""
+        if len(self.designations) == 0:
+            return
+        self.pause_every = pause_every
+        self.explored = 0
+        for assignment in self._extend(0, {}):
+            yield assignment
+
+    def anchor_candidates(self):
+        """The candidates for the first designation in the binding order,
+           as a list in the order they would be tried."""
+        domain = self.domains[0]
+        if domain is None:
+            domain = self.parser._get_domain(self.graph_object)
+        return list(domain)
+
+    def restrict_anchor(self, candidates):
+        """Only try ``candidates`` (some of those returned by
+           ``anchor_candidates``, in any iterable) for the first
+           designation."""
+        self.domains[0] = candidates
+
+    def _domain(self, designation):
+        """The candidate nodes for ``designation``: the nodes of its
+           declared class, intersected with whatever the property indexes
+           return and with the nodes that the backend finds satisfy its
+           WHERE conjuncts, if it can evaluate them over the whole class.
+           This is a set, or whatever container the backend returns for the
+           class if it supports ``in``. ``None`` stands for every node in
+           the graph. An anchored designation's domain is just those of its
+           anchors that are of its class."""
+        classes = self.node_classes[designation]
+        if self.anchors is not None and designation in self.anchors:
+            return set(node for node in self.anchors[designation] if all(
+                self.parser._node_class(self.parser._get_node(
+                    self.graph_object, node)) == node_class for
+                node_class in classes))
+        if len(classes) == 0:
+            return None
+        elif len(classes) > 1:
+            return set()  # A node can't belong to two classes
+        node_class = list(classes)[0]
+        domain = None
+        for keypath, operator, value in self.index_conditions.get(
+                designation, []):
+            candidates = self.parser._indexed_candidates(
+                self.graph_object, node_class, keypath, operator, value)
+            if candidates is None:
+                continue
+            self.indexed_designations.add(designation)
+            self.index_uses.append(
+                (designation, 'index', (keypath, operator, value,),))
+            domain = candidates if domain is None else domain & candidates
+        for conjunct in self.where_conjuncts:
+            if (self.limit is not None or self.anchors is not None or
+                    conjunct.designations != set([designation])):
+                continue
+            candidates = self.parser._filter_candidates(
+                self.graph_object, node_class, designation,
+                conjunct.constraint)
+            if candidates is None:
+                continue
+            conjunct.filtered = True
+            self.indexed_designations.add(designation)
+            self.index_uses.append(
+                (designation, 'columns', conjunct.constraint,))
+            domain = candidates if domain is None else domain & candidates
+        if domain is None:
+            domain = self.parser._get_domain(
+                self.graph_object, node_class=node_class)
+        if (isinstance(domain, (list, tuple,)) or
+                not hasattr(domain, '__contains__')):
+            domain = set(domain)
+        return domain
+
+    def _candidates(self, depth, assignment):
+        """Generator over ``(node, edge_id)`` pairs for the designation at
+           ``depth``: an expansion along its driving edge if it has one
+           (``edge_id`` being the edge to bind, or the path for a
+           ``shortestPath``), else a scan of its domain."""
+        driver = self.drivers[depth]
+        domain = self.domains[depth]
+        if driver is None:
+            if domain is None:
+                domain = self.parser._get_domain(self.graph_object)
+            for element in domain:
+                yield element, None
+            return
+        if driver.node_2 == self.designations[depth]:
+            bound_node, outgoing = assignment[driver.node_1], True
+        else:
+            bound_node, outgoing = assignment[driver.node_2], False
+        if isinstance(driver, PathExists):
+            for neighbor, path in self.path_searches[driver].reached_from(
+                    bound_node, outgoing, domain=domain):
+                yield neighbor, path
+            return
+        for neighbor, edge_id in self.parser._expand(
+                self.graph_object, bound_node, edge_label=driver.edge_label,
+                outgoing=outgoing):
+            if domain is None or neighbor in domain:
+                yield neighbor, edge_id
+
+    def _extend(self, depth, assignment):
+        designation = self.designations[depth]
+        driver = self.drivers[depth]
+        edge_designation = getattr(driver, 'designation', None)
+        last = depth == len(self.designations) - 1
+        pause_every = self.pause_every
+        for element, edge_id in self._candidates(depth, assignment):
+            if pause_every is not None:
+                self.explored += 1
+                if self.explored >= pause_every:
+                    self.explored = 0
+                    yield PAUSE
+            assignment[designation] = element
+            bound_edges = []
+            if edge_designation is not None:
+                assignment[edge_designation] = edge_id
+                bound_edges.append(edge_designation)
+            if self._check_all(self.checks[depth], assignment, bound_edges):
+                if last:
+                    yield dict(assignment)
+                else:
+                    for extended in self._extend(depth + 1, assignment):
+                        yield extended
+            for one_edge_designation in bound_edges:
+                del assignment[one_edge_designation]
+        assignment.pop(designation, None)
+
+    def _check_all(self, facts, assignment, bound_edges):
+        for fact in facts:
+            if isinstance(fact, NodeHasDocument):
+                satisfied = self._check_document(fact, assignment)
+            elif isinstance(fact, EdgeExists):
+                satisfied = self._check_edge(fact, assignment, bound_edges)
+            elif isinstance(fact, PathExists):
+                satisfied = self._check_path(fact, assignment, bound_edges)
+            else:
+                satisfied = fact.test(assignment)
+            if not satisfied:
+                return False
+        return True
+
+    def _check_document(self, fact, assignment):
+        if not fact.document:
+            return True
+        node = self.parser._get_node(
+            self.graph_object, assignment[fact.designation])
+        return document_equals(node, fact.document)
+
+    def _check_edge(self, fact, assignment, bound_edges):
+        """True if some edge with the right label runs from ``node_1`` to
+           ``node_2``. The edge's designation, if any, is bound as a side
+           effect (and recorded in ``bound_edges`` for backtracking)."""
+        matched_edge_id = None
+        for one_edge_id in self.parser._edges_connecting_nodes(
+                self.graph_object, assignment[fact.node_1],
+                assignment[fact.node_2]):
+            one_edge = self.parser._get_edge_from_id(
+                self.graph_object, one_edge_id)
+            if (fact.edge_label is None or
+                    self.parser._edge_class(one_edge) == fact.edge_label):
+                matched_edge_id = one_edge_id
+        if matched_edge_id is None:
+            return False
+        if fact.designation is not None:
+            assignment[fact.designation] = matched_edge_id
+            bound_edges.append(fact.designation)
+        return True
+
+    def _check_path(self, fact, assignment, bound_edges):
+        """True if ``node_2`` can be reached from ``node_1`` as the
+           ``PathExists`` fact says. For ``shortestPath``, its designation
+           (if any) is bound to the path found."""
+        path = self.path_searches[fact].path(
+            assignment[fact.node_1], assignment[fact.node_2])
+        if path is None:
+            return False
+        if fact.designation is not None:
+            assignment[fact.designation] = path
+            bound_edges.append(fact.designation)
+        return True
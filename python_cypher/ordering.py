@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+This script contains what ORDER BY needs: ``OrderKey``, which compares rows
+on several values in ascending or descending order, and ``Ordering``, which
+collects items and hands them back sorted. When only the first ``count``
+items are wanted (ORDER BY with LIMIT), ``Ordering`` keeps them in a heap
+of that size, so it takes O(n log k) time and O(k) memory rather than
+sorting everything.
+
+Values compare as they do in Python 2, so ``None`` comes first in ascending
+order, just as it does in a sorted property index.
+"""
+
+import heapq
+
+
+class OrderKey(object):
+    """The values of the ORDER BY items for one row, compared item by
+       item, with the items flagged in ``descending`` reversed."""
+    __slots__ = ('values', 'descending',)
+
+    def __init__(self, values, descending):
+        self.values = values
+        self.descending = descending
+
+    def __cmp__(self, other):
+        for value, other_value, descending in zip(
+                self.values, other.values, self.descending):
+            result = cmp(value, other_value)
+            if result != 0:
+                return -result if descending else result
+        return 0
+
+
+class _Entry(object):
+    """Heap entry that sorts before another if it ranks *after* it, so that
+       the root of the heap is the worst of the items kept. Ties go to the
+       item added first."""
+    __slots__ = ('key', 'sequence', 'item',)
+
+    def __init__(self, key, sequence, item):
+        self.key = key
+        self.sequence = sequence
+        self.item = item
+
+    def __lt__(self, other):
+        return (cmp(self.key, other.key) or
+                cmp(self.sequence, other.sequence)) > 0
+
+
+class Ordering(object):
+    """Collects ``(key, item)`` pairs with ``add``; ``items`` returns the
+       items sorted by key (stably), or only the first ``count`` of them if
+       ``count`` isn't ``None``."""
+    def __init__(self, count=None):
+        self.count = count
+        self.entries = []
+        self.sequence = 0
+
+    def add(self, key, item):
+        entry = _Entry(key, self.sequence, item)
+        self.sequence += 1
+        if self.count is None:
+            self.entries.append(entry)
+        elif len(self.entries) < self.count:
+            heapq.heappush(self.entries, entry)
+        elif self.count > 0 and self.entries[0] < entry:
+            heapq.heapreplace(self.entries, entry)
+
+    def items(self):
+        entries = sorted(self.entries, reverse=True)
+        return [entry.item for entry in entries]
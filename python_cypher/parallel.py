@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+This script runs a MATCH query in several processes at once. The candidates
+for the first designation in the binding order (the anchor) are split into
+contiguous parts, and each part is matched by a worker from a
+``multiprocessing`` pool.
+
+The workers are forked after the query has been planned, so they share the
+parent's graph and plan (copy-on-write) instead of having them pickled to
+them; only the rows are sent back. This needs ``os.fork``, and the graph
+mustn't be modified while the query runs.
+"""
+
+import multiprocessing
+
+# Number of parts the anchor's candidates are split into for each worker, so
+# that a slow part doesn't leave the other workers idle
+PARTS_PER_WORKER = 4
+
+# What the forked workers need to know about the running query
+_PARALLEL_QUERY = None
+
+
+def _match_part(index):
+    """Run in a worker: return the rows for the ``index``-th part of the
+       anchor's candidates."""
+    parser, graph_object, parsed_query, matcher, parts = _PARALLEL_QUERY
+    matcher.restrict_anchor(parts[index])
+    return [row for assignment in matcher.matches() for row in
+            parser.assignment_rows(graph_object, parsed_query, assignment)]
+
+
+def split(candidates, part_count):
+    """Split the list ``candidates`` into at most ``part_count`` contiguous
+       parts of nearly equal size."""
+    part_count = max(1, min(part_count, len(candidates)))
+    size, remainder = divmod(len(candidates), part_count)
+    parts = []
+    start = 0
+    for index in xrange(part_count):
+        end = start + size + (1 if index < remainder else 0)
+        parts.append(candidates[start:end])
+        start = end
+    return parts
+
+
+def parallel_rows(parser, graph_object, parsed_query, atomic_facts, workers,
+                  ordered=False):
+    """Generator over the rows of a MATCH query, computed by ``workers``
+       processes. Rows from a part are yielded as soon as it's finished,
+       unless ``ordered`` is set, in which case the parts are yielded in
+       order, giving the same rows in the same order as ``parser.query``
+       without workers."""
+    global _PARALLEL_QUERY
+    matcher = parser.matcher_class(parser, graph_object, atomic_facts)
+    if len(matcher.designations) == 0:
+        return
+    parts = split(matcher.anchor_candidates(), workers * PARTS_PER_WORKER)
+    _PARALLEL_QUERY = (parser, graph_object, parsed_query, matcher, parts,)
+    try:
+        pool = multiprocessing.Pool(workers)
+    finally:
+        _PARALLEL_QUERY = None
+    try:
+        if ordered:
+            results = pool.imap(_match_part, xrange(len(parts)))
+        else:
+            results = pool.imap_unordered(_match_part, xrange(len(parts)))
+        for rows in results:
+            for row in rows:
+                yield row
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
@@ -1,13 +1,14 @@
 
 # parsetab.py
 # This file is automatically generated. Do not edit.
-_tabversion = '3.8'
+# pylint: disable=W,C,R
+_tabversion = '3.10'
 
 _lr_method = 'LALR'
 
-_lr_signature = '5E0C4B0BBE2A68D7DACF60D089032C06'
+_lr_signature = 'statementAND AS ASC BY COLON COMMA CREATE DASH DESC DOT EQUALS EXPLAIN GREATERTHAN GREATERTHAN_OR_EQUAL INTEGER KEY LBRACKET LCURLEY LEFT_ARROW LESSTHAN LESSTHAN_OR_EQUAL LIMIT LPAREN MATCH NAME NOT NOT_EQUAL OR ORDER PARAMETER PROFILE QUOTE RBRACKET RCURLEY RETURN RIGHT_ARROW RPAREN SKIP STAR STRING UNWIND WHERE WHITESPACEnode_clause : LPAREN KEY RPAREN\n                   | LPAREN COLON NAME RPAREN\n                   | LPAREN KEY COLON NAME RPAREN\n                   | LPAREN KEY COLON NAME condition_list RPARENcondition_list : KEY COLON STRING\n                      | KEY COLON INTEGER\n                      | KEY COLON PARAMETER\n                      | KEY COLON keypath\n                      | condition_list COMMA condition_list\n                      | LCURLEY condition_list RCURLEY\n                      | KEY COLON condition_listconstraint : keypath EQUALS STRING\n                  | keypath EQUALS INTEGER\n                  | keypath EQUALS keypath\n                  | keypath EQUALS PARAMETER\n                  | keypath NOT_EQUAL INTEGER\n                  | keypath NOT_EQUAL PARAMETER\n                  | keypath GREATERTHAN INTEGER\n                  | keypath GREATERTHAN PARAMETER\n                  | keypath GREATERTHAN_OR_EQUAL INTEGER\n                  | keypath GREATERTHAN_OR_EQUAL PARAMETER\n                  | keypath LESSTHAN INTEGER\n                  | keypath LESSTHAN PARAMETER\n                  | keypath LESSTHAN_OR_EQUAL INTEGER\n                  | keypath LESSTHAN_OR_EQUAL PARAMETER\n                  | constraint OR constraint\n                  | constraint AND constraint\n                  | NOT constraint\n                  | LPAREN constraint RPARENwhere_clause : WHERE constraintkeypath : KEY DOT KEY\n               | keypath DOT KEYedge_condition : LBRACKET COLON NAME RBRACKET\n                      | LBRACKET KEY COLON NAME RBRACKET\n                      | LBRACKET hops RBRACKET\n                      | LBRACKET COLON NAME hops RBRACKET\n                      | LBRACKET KEY COLON NAME hops RBRACKEThops : STAR\n            | STAR INTEGER\n            | STAR INTEGER DOT DOT\n            | STAR DOT DOT INTEGER\n            | STAR INTEGER DOT DOT INTEGERlabeled_edge : DASH edge_condition DASH GREATERTHAN\n                    | LESSTHAN DASH edge_condition DASH\n                    | DASH edge_condition DASHshortest_path : KEY LPAREN literals RPAREN\n                     | KEY EQUALS KEY LPAREN literals RPARENliterals : node_clause\n                | shortest_path\n                | literals COMMA literals\n                | literals RIGHT_ARROW literals\n                | literals LEFT_ARROW literals\n                | literals labeled_edge literalsmatch_where : MATCH literals\n                   | MATCH literals where_clausecreate_clause : CREATE literalsunwind_clause : UNWIND PARAMETER AS KEYorder_clause : ORDER BY order_item\n                    | order_clause COMMA order_itemorder_item : sort_expression\n                  | sort_expression ASC\n                  | sort_expression DESCsort_expression : KEY\n                       | keypath\n                       | aggregatepaging : SKIP count\n              | LIMIT count\n              | SKIP count LIMIT countcount : INTEGER\n             | PARAMETERstatement : full_query\n                 | EXPLAIN full_query\n                 | PROFILE full_queryfull_query : match_where return_variables\n                  | match_where return_variables paging\n                  | match_where return_variables order_clause\n                  | match_where return_variables order_clause paging\n                  | create_clause\n                  | create_clause return_variables\n                  | unwind_clause create_clause\n                  | unwind_clause create_clause return_variablesreturn_variables : RETURN KEY\n                        | RETURN keypath\n                        | RETURN aggregate\n                        | return_variables COMMA KEY\n                        | return_variables COMMA keypath\n                        | return_variables COMMA aggregateaggregate : function_name LPAREN STAR RPAREN\n                 | function_name LPAREN KEY RPAREN\n                 | function_name LPAREN keypath RPARENfunction_name : KEY\n                     | NAME'
     
-_lr_action_items = {'RETURN':([1,4,8,10,12,24,30,34,35,36,38,40,51,56,63,66,67,68,69,72,],[6,6,-28,-21,-26,-27,-23,-22,-24,-25,-1,-14,-2,-12,-3,-11,-10,-13,-9,-4,]),'LBRACKET':([17,33,],[31,31,]),'LESSTHAN':([8,10,12,30,34,35,36,38,51,63,72,],[18,-21,18,18,18,18,18,-1,-2,-3,-4,]),'LEFT_ARROW':([8,10,12,30,34,35,36,38,51,63,72,],[20,-21,20,20,20,20,20,-1,-2,-3,-4,]),'DOT':([13,14,28,29,41,44,45,46,],[26,27,26,27,26,27,-15,-16,]),'RPAREN':([23,37,52,55,56,62,66,67,68,69,77,78,79,80,],[38,51,63,68,-12,72,-11,-10,-13,-9,-6,-8,-5,-7,]),'RCURLEY':([75,77,78,79,80,],[80,-6,-8,-5,-7,]),'CREATE':([0,],[2,]),'COMMA':([7,8,10,11,12,13,14,28,29,30,34,35,36,38,45,46,51,62,63,72,75,77,78,79,80,],[15,19,-21,15,19,-32,-33,-34,-35,19,19,19,19,-1,-15,-16,-2,73,-3,-4,73,73,73,-5,-7,]),'RIGHT_ARROW':([8,10,12,30,34,35,36,38,51,63,72,],[16,-21,16,16,16,16,16,-1,-2,-3,-4,]),'COLON':([9,23,31,48,64,],[22,39,47,59,74,]),'$end':([3,4,7,8,10,11,13,14,28,29,30,34,35,36,38,45,46,51,63,72,],[0,-30,-29,-28,-21,-31,-32,-33,-34,-35,-23,-22,-24,-25,-1,-15,-16,-2,-3,-4,]),'STRING':([57,74,],[69,79,]),'EQUALS':([44,45,46,],[57,-15,-16,]),'DASH':([8,10,12,18,30,32,34,35,36,38,50,51,63,70,72,76,],[17,-21,17,33,17,49,17,17,17,-1,61,-2,-3,-17,-4,-18,]),'GREATERTHAN':([49,],[60,]),'LPAREN':([2,5,16,19,20,21,25,42,43,53,54,60,61,],[9,9,9,9,9,9,42,42,42,42,42,-19,-20,]),'WHERE':([10,12,30,34,35,36,38,51,63,72,],[-21,25,-23,-22,-24,-25,-1,-2,-3,-4,]),'MATCH':([0,],[5,]),'AND':([40,55,56,66,67,68,69,],[53,53,53,53,53,-13,-9,]),'NAME':([22,39,47,59,],[37,52,58,71,]),'KEY':([6,9,15,25,26,27,31,42,43,52,53,54,65,73,74,],[13,23,28,41,45,46,48,41,41,64,41,41,64,64,64,]),'NOT':([25,42,43,53,54,],[43,43,43,43,43,]),'RBRACKET':([58,71,],[70,76,]),'LCURLEY':([52,65,73,74,],[65,65,65,65,]),'OR':([40,55,56,66,67,68,69,],[54,54,54,54,54,-13,-9,]),}
+_lr_action_items = {'UNWIND':([0,1,3,],[5,5,5,]),'RETURN':([2,7,17,18,20,22,23,47,63,67,68,69,73,75,80,81,98,100,104,127,130,131,132,133,134,135,136,137,138,139,140,141,142,143,144,145,146,152,153,],[12,12,12,-56,-48,-49,-54,-55,-51,-50,-52,-53,-1,-30,-31,-32,-46,-2,-28,-3,-27,-26,-29,-16,-17,-12,-13,-15,-14,-24,-25,-22,-23,-18,-19,-20,-21,-47,-4,]),'EXPLAIN':([0,],[3,]),'LESSTHAN_OR_EQUAL':([79,80,81,],[108,-31,-32,]),'LBRACKET':([38,66,],[64,64,]),'LESSTHAN':([18,20,22,23,63,67,68,69,70,73,79,80,81,98,100,125,127,152,153,],[39,-48,-49,39,39,39,39,39,39,-1,109,-31,-32,-46,-2,39,-3,-47,-4,]),'LIMIT':([13,25,26,27,32,52,53,54,58,59,60,80,81,86,87,88,89,90,91,112,113,114,116,117,],[30,-82,-84,-83,30,85,-70,-69,-85,-87,-86,-31,-32,-60,-65,-63,-59,-64,-58,-89,-88,-90,-61,-62,]),'LEFT_ARROW':([18,20,22,23,63,67,68,69,70,73,98,100,125,127,152,153,],[41,-48,-49,41,41,41,41,41,41,-1,-46,-2,41,-3,-47,-4,]),'STAR':([51,64,121,151,],[83,92,92,92,]),'PARAMETER':([5,29,30,85,106,107,108,109,110,111,156,],[15,53,53,53,134,137,140,142,144,146,168,]),'ORDER':([13,25,26,27,58,59,60,80,81,112,113,114,],[34,-82,-84,-83,-85,-87,-86,-31,-32,-89,-88,-90,]),'DOT':([25,27,58,60,77,79,80,81,82,84,88,90,92,118,119,138,147,166,169,],[49,50,49,50,49,50,-31,-32,49,50,49,50,119,147,148,50,157,49,50,]),'NOT_EQUAL':([79,80,81,],[106,-31,-32,]),'RPAREN':([20,22,46,63,67,68,69,70,72,73,80,81,82,83,84,98,100,101,104,105,125,126,127,130,131,132,133,134,135,136,137,138,139,140,141,142,143,144,145,146,152,153,162,163,164,165,167,168,169,],[-48,-49,73,-51,-50,-52,-53,98,100,-1,-31,-32,112,113,114,-46,-2,127,-28,132,152,153,-3,-27,-26,-29,-16,-17,-12,-13,-15,-14,-24,-25,-22,-23,-18,-19,-20,-21,-47,-4,-9,-10,-11,-5,-6,-7,-8,]),'RCURLEY':([80,81,155,162,163,164,165,167,168,169,],[-31,-32,163,-9,-10,-11,-5,-6,-7,-8,]),'CREATE':([0,1,3,8,62,],[9,9,9,9,-57,]),'BY':([34,],[61,]),'ASC':([80,81,86,87,88,90,112,113,114,],[-31,-32,116,-65,-63,-64,-89,-88,-90,]),'COMMA':([13,16,18,20,22,23,25,26,27,32,36,58,59,60,63,67,68,69,70,73,80,81,86,87,88,89,90,91,98,100,112,113,114,116,117,125,126,127,152,153,155,162,163,164,165,167,168,169,],[33,33,40,-48,-49,40,-82,-84,-83,57,33,-85,-87,-86,40,40,40,40,40,-1,-31,-32,-60,-65,-63,-59,-64,-58,-46,-2,-89,-88,-90,-61,-62,40,154,-3,-47,-4,154,154,-10,154,-5,-6,-7,-8,]),'RIGHT_ARROW':([18,20,22,23,63,67,68,69,70,73,98,100,125,127,152,153,],[37,-48,-49,37,37,37,37,37,37,-1,-46,-2,37,-3,-47,-4,]),'COLON':([21,46,64,95,129,166,],[45,74,94,122,156,156,]),'$end':([4,6,7,11,13,14,16,17,18,20,22,25,26,27,31,32,36,52,53,54,55,56,58,59,60,63,67,68,69,73,80,81,86,87,88,89,90,91,98,100,112,113,114,115,116,117,127,152,153,],[-71,0,-78,-73,-74,-72,-79,-80,-56,-48,-49,-82,-84,-83,-75,-76,-81,-66,-70,-69,-67,-77,-85,-87,-86,-51,-50,-52,-53,-1,-31,-32,-60,-65,-63,-59,-64,-58,-46,-2,-89,-88,-90,-68,-61,-62,-3,-47,-4,]),'AND':([75,80,81,104,105,130,131,132,133,134,135,136,137,138,139,140,141,142,143,144,145,146,],[102,-31,-32,102,102,102,102,-29,-16,-17,-12,-13,-15,-14,-24,-25,-22,-23,-18,-19,-20,-21,]),'STRING':([107,156,],[135,165,]),'SKIP':([13,25,26,27,32,58,59,60,80,81,86,87,88,89,90,91,112,113,114,116,117,],[29,-82,-84,-83,29,-85,-87,-86,-31,-32,-60,-65,-63,-59,-64,-58,-89,-88,-90,-61,-62,]),'EQUALS':([19,79,80,81,],[44,107,-31,-32,]),'DASH':([18,20,22,23,39,63,65,67,68,69,70,73,97,98,100,120,125,127,150,152,153,159,161,171,],[38,-48,-49,38,66,38,96,38,38,38,38,-1,124,-46,-2,-35,38,-3,-33,-47,-4,-36,-34,-37,]),'GREATERTHAN_OR_EQUAL':([79,80,81,],[111,-31,-32,]),'AS':([15,],[35,]),'GREATERTHAN':([79,80,81,96,],[110,-31,-32,123,]),'LPAREN':([9,10,19,24,25,28,37,40,41,42,43,48,58,71,76,78,88,96,99,102,103,123,124,],[21,21,43,-92,-91,51,21,21,21,21,21,78,-91,99,78,78,-91,-45,21,78,78,-43,-44,]),'INTEGER':([29,30,85,92,106,107,108,109,110,111,148,156,157,],[54,54,54,118,133,136,139,141,143,145,158,167,170,]),'WHERE':([20,22,23,63,67,68,69,73,98,100,127,152,153,],[-48,-49,48,-51,-50,-52,-53,-1,-46,-2,-3,-47,-4,]),'MATCH':([0,1,3,],[10,10,10,]),'DESC':([80,81,86,87,88,90,112,113,114,],[-31,-32,117,-65,-63,-64,-89,-88,-90,]),'PROFILE':([0,],[1,]),'NAME':([12,33,45,57,61,74,94,122,],[24,24,72,24,24,101,121,151,]),'KEY':([9,10,12,21,33,35,37,40,41,42,43,44,48,49,50,51,57,61,64,76,78,96,99,101,102,103,107,123,124,128,154,156,],[19,19,25,46,58,62,19,19,19,19,19,71,77,80,81,82,88,88,95,77,77,-45,19,129,77,77,77,-43,-44,129,129,166,]),'NOT':([48,76,78,102,103,],[76,76,76,76,76,]),'RBRACKET':([92,93,118,121,149,151,157,158,160,170,],[-38,120,-39,150,159,161,-40,-41,171,-42,]),'LCURLEY':([101,128,154,156,],[128,128,128,128,]),'OR':([75,80,81,104,105,130,131,132,133,134,135,136,137,138,139,140,141,142,143,144,145,146,],[103,-31,-32,103,103,103,103,-29,-16,-17,-12,-13,-15,-14,-24,-25,-22,-23,-18,-19,-20,-21,]),}
 
 _lr_action = {}
 for _k, _v in _lr_action_items.items():
@@ -16,7 +17,7 @@ for _k, _v in _lr_action_items.items():
       _lr_action[_x][_k] = _y
 del _lr_action_items
 
-_lr_goto_items = {'match_where':([0,],[1,]),'constraint':([25,42,43,53,54,],[40,55,56,66,67,]),'literals':([2,5,16,19,20,21,],[8,12,30,34,35,36,]),'where_clause':([12,],[24,]),'edge_condition':([17,33,],[32,50,]),'full_query':([0,],[3,]),'return_variables':([1,4,],[7,11,]),'condition_list':([52,65,73,74,],[62,75,77,78,]),'node_clause':([2,5,16,19,20,21,],[10,10,10,10,10,10,]),'create_clause':([0,],[4,]),'labeled_edge':([8,12,30,34,35,36,],[21,21,21,21,21,21,]),'keypath':([6,15,25,42,43,53,54,],[14,29,44,44,44,44,44,]),}
+_lr_goto_items = {'where_clause':([23,],[47,]),'node_clause':([9,10,37,40,41,42,43,99,],[20,20,20,20,20,20,20,20,]),'order_item':([57,61,],[89,91,]),'create_clause':([0,1,3,8,],[7,7,7,17,]),'condition_list':([101,128,154,156,],[126,155,162,164,]),'return_variables':([2,7,17,],[13,16,36,]),'hops':([64,121,151,],[93,149,160,]),'order_clause':([13,],[32,]),'statement':([0,],[6,]),'edge_condition':([38,66,],[65,97,]),'labeled_edge':([18,23,63,67,68,69,70,125,],[42,42,42,42,42,42,42,42,]),'unwind_clause':([0,1,3,],[8,8,8,]),'function_name':([12,33,57,61,],[28,28,28,28,]),'count':([29,30,85,],[52,55,115,]),'sort_expression':([57,61,],[86,86,]),'full_query':([0,1,3,],[4,11,14,]),'aggregate':([12,33,57,61,],[26,59,87,87,]),'literals':([9,10,37,40,41,42,43,99,],[18,23,63,67,68,69,70,125,]),'keypath':([12,33,48,51,57,61,76,78,102,103,107,156,],[27,60,79,84,90,90,79,79,79,79,138,169,]),'match_where':([0,1,3,],[2,2,2,]),'constraint':([48,76,78,102,103,],[75,104,105,130,131,]),'paging':([13,32,],[31,56,]),'shortest_path':([9,10,37,40,41,42,43,99,],[22,22,22,22,22,22,22,22,]),}
 
 _lr_goto = {}
 for _k, _v in _lr_goto_items.items():
@@ -25,40 +26,97 @@ for _k, _v in _lr_goto_items.items():
        _lr_goto[_x][_k] = _y
 del _lr_goto_items
 _lr_productions = [
-  ("S' -> full_query","S'",1,None,None,None),
-  ('node_clause -> LPAREN KEY RPAREN','node_clause',3,'p_node_clause','cypher_parser.py',181),
-  ('node_clause -> LPAREN COLON NAME RPAREN','node_clause',4,'p_node_clause','cypher_parser.py',182),
-  ('node_clause -> LPAREN KEY COLON NAME RPAREN','node_clause',5,'p_node_clause','cypher_parser.py',183),
-  ('node_clause -> LPAREN KEY COLON NAME condition_list RPAREN','node_clause',6,'p_node_clause','cypher_parser.py',184),
-  ('condition_list -> KEY COLON STRING','condition_list',3,'p_condition','cypher_parser.py',202),
-  ('condition_list -> condition_list COMMA condition_list','condition_list',3,'p_condition','cypher_parser.py',203),
-  ('condition_list -> LCURLEY condition_list RCURLEY','condition_list',3,'p_condition','cypher_parser.py',204),
-  ('condition_list -> KEY COLON condition_list','condition_list',3,'p_condition','cypher_parser.py',205),
-  ('constraint -> keypath EQUALS STRING','constraint',3,'p_constraint','cypher_parser.py',218),
-  ('constraint -> constraint OR constraint','constraint',3,'p_constraint','cypher_parser.py',219),
-  ('constraint -> constraint AND constraint','constraint',3,'p_constraint','cypher_parser.py',220),
-  ('constraint -> NOT constraint','constraint',2,'p_constraint','cypher_parser.py',221),
-  ('constraint -> LPAREN constraint RPAREN','constraint',3,'p_constraint','cypher_parser.py',222),
-  ('where_clause -> WHERE constraint','where_clause',2,'p_where_clause','cypher_parser.py',240),
-  ('keypath -> KEY DOT KEY','keypath',3,'p_keypath','cypher_parser.py',248),
-  ('keypath -> keypath DOT KEY','keypath',3,'p_keypath','cypher_parser.py',249),
-  ('edge_condition -> LBRACKET COLON NAME RBRACKET','edge_condition',4,'p_edge_condition','cypher_parser.py',261),
-  ('edge_condition -> LBRACKET KEY COLON NAME RBRACKET','edge_condition',5,'p_edge_condition','cypher_parser.py',262),
-  ('labeled_edge -> DASH edge_condition DASH GREATERTHAN','labeled_edge',4,'p_labeled_edge','cypher_parser.py',273),
-  ('labeled_edge -> LESSTHAN DASH edge_condition DASH','labeled_edge',4,'p_labeled_edge','cypher_parser.py',274),
-  ('literals -> node_clause','literals',1,'p_literals','cypher_parser.py',286),
-  ('literals -> literals COMMA literals','literals',3,'p_literals','cypher_parser.py',287),
-  ('literals -> literals RIGHT_ARROW literals','literals',3,'p_literals','cypher_parser.py',288),
-  ('literals -> literals LEFT_ARROW literals','literals',3,'p_literals','cypher_parser.py',289),
-  ('literals -> literals labeled_edge literals','literals',3,'p_literals','cypher_parser.py',290),
-  ('match_where -> MATCH literals','match_where',2,'p_match_where','cypher_parser.py',329),
-  ('match_where -> MATCH literals where_clause','match_where',3,'p_match_where','cypher_parser.py',330),
-  ('create_clause -> CREATE literals','create_clause',2,'p_create','cypher_parser.py',340),
-  ('full_query -> match_where return_variables','full_query',2,'p_full_query','cypher_parser.py',345),
-  ('full_query -> create_clause','full_query',1,'p_full_query','cypher_parser.py',346),
-  ('full_query -> create_clause return_variables','full_query',2,'p_full_query','cypher_parser.py',347),
-  ('return_variables -> RETURN KEY','return_variables',2,'p_return_variables','cypher_parser.py',354),
-  ('return_variables -> RETURN keypath','return_variables',2,'p_return_variables','cypher_parser.py',355),
-  ('return_variables -> return_variables COMMA KEY','return_variables',3,'p_return_variables','cypher_parser.py',356),
-  ('return_variables -> return_variables COMMA keypath','return_variables',3,'p_return_variables','cypher_parser.py',357),
+  ("S' -> statement","S'",1,None,None,None),
+  ('node_clause -> LPAREN KEY RPAREN','node_clause',3,'p_node_clause','cypher_parser.py',331),
+  ('node_clause -> LPAREN COLON NAME RPAREN','node_clause',4,'p_node_clause','cypher_parser.py',332),
+  ('node_clause -> LPAREN KEY COLON NAME RPAREN','node_clause',5,'p_node_clause','cypher_parser.py',333),
+  ('node_clause -> LPAREN KEY COLON NAME condition_list RPAREN','node_clause',6,'p_node_clause','cypher_parser.py',334),
+  ('condition_list -> KEY COLON STRING','condition_list',3,'p_condition','cypher_parser.py',352),
+  ('condition_list -> KEY COLON INTEGER','condition_list',3,'p_condition','cypher_parser.py',353),
+  ('condition_list -> KEY COLON PARAMETER','condition_list',3,'p_condition','cypher_parser.py',354),
+  ('condition_list -> KEY COLON keypath','condition_list',3,'p_condition','cypher_parser.py',355),
+  ('condition_list -> condition_list COMMA condition_list','condition_list',3,'p_condition','cypher_parser.py',356),
+  ('condition_list -> LCURLEY condition_list RCURLEY','condition_list',3,'p_condition','cypher_parser.py',357),
+  ('condition_list -> KEY COLON condition_list','condition_list',3,'p_condition','cypher_parser.py',358),
+  ('constraint -> keypath EQUALS STRING','constraint',3,'p_constraint','cypher_parser.py',377),
+  ('constraint -> keypath EQUALS INTEGER','constraint',3,'p_constraint','cypher_parser.py',378),
+  ('constraint -> keypath EQUALS keypath','constraint',3,'p_constraint','cypher_parser.py',379),
+  ('constraint -> keypath EQUALS PARAMETER','constraint',3,'p_constraint','cypher_parser.py',380),
+  ('constraint -> keypath NOT_EQUAL INTEGER','constraint',3,'p_constraint','cypher_parser.py',381),
+  ('constraint -> keypath NOT_EQUAL PARAMETER','constraint',3,'p_constraint','cypher_parser.py',382),
+  ('constraint -> keypath GREATERTHAN INTEGER','constraint',3,'p_constraint','cypher_parser.py',383),
+  ('constraint -> keypath GREATERTHAN PARAMETER','constraint',3,'p_constraint','cypher_parser.py',384),
+  ('constraint -> keypath GREATERTHAN_OR_EQUAL INTEGER','constraint',3,'p_constraint','cypher_parser.py',385),
+  ('constraint -> keypath GREATERTHAN_OR_EQUAL PARAMETER','constraint',3,'p_constraint','cypher_parser.py',386),
+  ('constraint -> keypath LESSTHAN INTEGER','constraint',3,'p_constraint','cypher_parser.py',387),
+  ('constraint -> keypath LESSTHAN PARAMETER','constraint',3,'p_constraint','cypher_parser.py',388),
+  ('constraint -> keypath LESSTHAN_OR_EQUAL INTEGER','constraint',3,'p_constraint','cypher_parser.py',389),
+  ('constraint -> keypath LESSTHAN_OR_EQUAL PARAMETER','constraint',3,'p_constraint','cypher_parser.py',390),
+  ('constraint -> constraint OR constraint','constraint',3,'p_constraint','cypher_parser.py',391),
+  ('constraint -> constraint AND constraint','constraint',3,'p_constraint','cypher_parser.py',392),
+  ('constraint -> NOT constraint','constraint',2,'p_constraint','cypher_parser.py',393),
+  ('constraint -> LPAREN constraint RPAREN','constraint',3,'p_constraint','cypher_parser.py',394),
+  ('where_clause -> WHERE constraint','where_clause',2,'p_where_clause','cypher_parser.py',422),
+  ('keypath -> KEY DOT KEY','keypath',3,'p_keypath','cypher_parser.py',430),
+  ('keypath -> keypath DOT KEY','keypath',3,'p_keypath','cypher_parser.py',431),
+  ('edge_condition -> LBRACKET COLON NAME RBRACKET','edge_condition',4,'p_edge_condition','cypher_parser.py',443),
+  ('edge_condition -> LBRACKET KEY COLON NAME RBRACKET','edge_condition',5,'p_edge_condition','cypher_parser.py',444),
+  ('edge_condition -> LBRACKET hops RBRACKET','edge_condition',3,'p_edge_condition','cypher_parser.py',445),
+  ('edge_condition -> LBRACKET COLON NAME hops RBRACKET','edge_condition',5,'p_edge_condition','cypher_parser.py',446),
+  ('edge_condition -> LBRACKET KEY COLON NAME hops RBRACKET','edge_condition',6,'p_edge_condition','cypher_parser.py',447),
+  ('hops -> STAR','hops',1,'p_hops','cypher_parser.py',465),
+  ('hops -> STAR INTEGER','hops',2,'p_hops','cypher_parser.py',466),
+  ('hops -> STAR INTEGER DOT DOT','hops',4,'p_hops','cypher_parser.py',467),
+  ('hops -> STAR DOT DOT INTEGER','hops',4,'p_hops','cypher_parser.py',468),
+  ('hops -> STAR INTEGER DOT DOT INTEGER','hops',5,'p_hops','cypher_parser.py',469),
+  ('labeled_edge -> DASH edge_condition DASH GREATERTHAN','labeled_edge',4,'p_labeled_edge','cypher_parser.py',486),
+  ('labeled_edge -> LESSTHAN DASH edge_condition DASH','labeled_edge',4,'p_labeled_edge','cypher_parser.py',487),
+  ('labeled_edge -> DASH edge_condition DASH','labeled_edge',3,'p_labeled_edge','cypher_parser.py',488),
+  ('shortest_path -> KEY LPAREN literals RPAREN','shortest_path',4,'p_shortest_path','cypher_parser.py',516),
+  ('shortest_path -> KEY EQUALS KEY LPAREN literals RPAREN','shortest_path',6,'p_shortest_path','cypher_parser.py',517),
+  ('literals -> node_clause','literals',1,'p_literals','cypher_parser.py',538),
+  ('literals -> shortest_path','literals',1,'p_literals','cypher_parser.py',539),
+  ('literals -> literals COMMA literals','literals',3,'p_literals','cypher_parser.py',540),
+  ('literals -> literals RIGHT_ARROW literals','literals',3,'p_literals','cypher_parser.py',541),
+  ('literals -> literals LEFT_ARROW literals','literals',3,'p_literals','cypher_parser.py',542),
+  ('literals -> literals labeled_edge literals','literals',3,'p_literals','cypher_parser.py',543),
+  ('match_where -> MATCH literals','match_where',2,'p_match_where','cypher_parser.py',595),
+  ('match_where -> MATCH literals where_clause','match_where',3,'p_match_where','cypher_parser.py',596),
+  ('create_clause -> CREATE literals','create_clause',2,'p_create','cypher_parser.py',606),
+  ('unwind_clause -> UNWIND PARAMETER AS KEY','unwind_clause',4,'p_unwind','cypher_parser.py',615),
+  ('order_clause -> ORDER BY order_item','order_clause',3,'p_order_clause','cypher_parser.py',620),
+  ('order_clause -> order_clause COMMA order_item','order_clause',3,'p_order_clause','cypher_parser.py',621),
+  ('order_item -> sort_expression','order_item',1,'p_order_item','cypher_parser.py',630),
+  ('order_item -> sort_expression ASC','order_item',2,'p_order_item','cypher_parser.py',631),
+  ('order_item -> sort_expression DESC','order_item',2,'p_order_item','cypher_parser.py',632),
+  ('sort_expression -> KEY','sort_expression',1,'p_sort_expression','cypher_parser.py',637),
+  ('sort_expression -> keypath','sort_expression',1,'p_sort_expression','cypher_parser.py',638),
+  ('sort_expression -> aggregate','sort_expression',1,'p_sort_expression','cypher_parser.py',639),
+  ('paging -> SKIP count','paging',2,'p_paging','cypher_parser.py',644),
+  ('paging -> LIMIT count','paging',2,'p_paging','cypher_parser.py',645),
+  ('paging -> SKIP count LIMIT count','paging',4,'p_paging','cypher_parser.py',646),
+  ('count -> INTEGER','count',1,'p_count','cypher_parser.py',656),
+  ('count -> PARAMETER','count',1,'p_count','cypher_parser.py',657),
+  ('statement -> full_query','statement',1,'p_statement','cypher_parser.py',665),
+  ('statement -> EXPLAIN full_query','statement',2,'p_statement','cypher_parser.py',666),
+  ('statement -> PROFILE full_query','statement',2,'p_statement','cypher_parser.py',667),
+  ('full_query -> match_where return_variables','full_query',2,'p_full_query','cypher_parser.py',674),
+  ('full_query -> match_where return_variables paging','full_query',3,'p_full_query','cypher_parser.py',675),
+  ('full_query -> match_where return_variables order_clause','full_query',3,'p_full_query','cypher_parser.py',676),
+  ('full_query -> match_where return_variables order_clause paging','full_query',4,'p_full_query','cypher_parser.py',677),
+  ('full_query -> create_clause','full_query',1,'p_full_query','cypher_parser.py',678),
+  ('full_query -> create_clause return_variables','full_query',2,'p_full_query','cypher_parser.py',679),
+  ('full_query -> unwind_clause create_clause','full_query',2,'p_full_query','cypher_parser.py',680),
+  ('full_query -> unwind_clause create_clause return_variables','full_query',3,'p_full_query','cypher_parser.py',681),
+  ('return_variables -> RETURN KEY','return_variables',2,'p_return_variables','cypher_parser.py',688),
+  ('return_variables -> RETURN keypath','return_variables',2,'p_return_variables','cypher_parser.py',689),
+  ('return_variables -> RETURN aggregate','return_variables',2,'p_return_variables','cypher_parser.py',690),
+  ('return_variables -> return_variables COMMA KEY','return_variables',3,'p_return_variables','cypher_parser.py',691),
+  ('return_variables -> return_variables COMMA keypath','return_variables',3,'p_return_variables','cypher_parser.py',692),
+  ('return_variables -> return_variables COMMA aggregate','return_variables',3,'p_return_variables','cypher_parser.py',693),
+  ('aggregate -> function_name LPAREN STAR RPAREN','aggregate',4,'p_aggregate','cypher_parser.py',702),
+  ('aggregate -> function_name LPAREN KEY RPAREN','aggregate',4,'p_aggregate','cypher_parser.py',703),
+  ('aggregate -> function_name LPAREN keypath RPAREN','aggregate',4,'p_aggregate','cypher_parser.py',704),
+  ('function_name -> KEY','function_name',1,'p_function_name','cypher_parser.py',719),
+  ('function_name -> NAME','function_name',1,'p_function_name','cypher_parser.py',720),
 ]
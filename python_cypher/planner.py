@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+This script contains the planner that chooses the order in which the
+``PatternMatcher`` binds designations. The order is driven by cheap
+statistics about the graph (class sizes, average degrees per edge label and
+the sizes of index lookups), so it doesn't depend on how the variables in a
+query happen to be named.
+"""
+
+from cypher_parser import *
+
+# Guesses at the fraction of nodes that satisfy a condition which no index
+# could answer.
+EQUALITY_SELECTIVITY = 0.1
+RANGE_SELECTIVITY = 0.33
+OTHER_SELECTIVITY = 0.5
+
+
+def condition_selectivity(constraint):
+    """Guess the fraction of nodes that satisfy a WHERE constraint."""
+    if isinstance(constraint, Constraint):
+        if constraint.function_string == '=':
+            return EQUALITY_SELECTIVITY
+        return RANGE_SELECTIVITY
+    return OTHER_SELECTIVITY
+
+
+def plan_binding_order(designations, estimates, edge_facts, fanout,
+                       first=None):
+    """Return the designations in the order they should be bound.
+
+       ``estimates`` maps each designation to its estimated number of
+       candidates. ``fanout(fact, designation)`` estimates how many
+       candidates for ``designation`` each binding of the other end of the
+       ``EdgeExists`` fact leads to, or returns ``None`` if it can't tell.
+
+       The plan is greedy: it starts with the most selective designation,
+       then repeatedly picks the one that adds the fewest rows -- its fan-out
+       along an edge from something already bound, or else its number of
+       candidates -- preferring connected designations and then names to
+       break ties. If ``first`` is given, it's bound first whatever it
+       costs."""
+    order = []
+    bound = set()
+    remaining = set(designations)
+    if first is not None:
+        order.append(first)
+        bound.add(first)
+        remaining.remove(first)
+    while remaining:
+        best_key, best_designation = None, None
+        for designation in remaining:
+            cost = estimates[designation]
+            connected = False
+            for fact in edge_facts:
+                if fact.node_1 == fact.node_2:
+                    continue
+                if ((fact.node_1 == designation and fact.node_2 in bound) or
+                        (fact.node_2 == designation and
+                         fact.node_1 in bound)):
+                    connected = True
+                    edge_cost = fanout(fact, designation)
+                    if edge_cost is not None:
+                        cost = min(cost, edge_cost)
+            key = (cost, 0 if connected else 1, designation,)
+            if best_key is None or key < best_key:
+                best_key, best_designation = key, designation
+        order.append(best_designation)
+        bound.add(best_designation)
+        remaining.remove(best_designation)
+    return order
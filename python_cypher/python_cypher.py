@@ -4,17 +4,37 @@ This script contains the ``CypherParserBaseClass``, which provides the basic
 functionality to parse Cypher queries and run them against graphs.
 """
 
-import itertools
-import networkx as nx
+import binascii
+import contextlib
 import copy
-import hashlib
-import random
+import gc
+import itertools
+import os
 import time
 from cypher_tokenizer import *
 from cypher_parser import *
+from matcher import PatternMatcher, PAUSE, document_equals
+from indexes import (graph_indexes, rebuild_graph_indexes, indexed_edge,
+                     refresh_graph_indexes, keypath_value,)
+from query_cache import QueryCache
+from constraint_compiler import compile_constraint
+from compact_graph import CompactGraph, NodeView, MISSING
+from parallel import parallel_rows
+from aggregation import Aggregation
+from ordering import Ordering, OrderKey
+from query_plan import build_plan, profiling_parser
+from instrumentation import observed_rows
+from standing_query import StandingQuery
+from result_cache import (graph_version, query_dependencies, normalize_query,
+                          freeze)
+import vectorized
 
-PRINT_TOKENS = True
+PRINT_TOKENS = False
 PRINT_MATCHING_ASSIGNMENTS = False
+# Number of nodes or edges handed to NetworkX at a time by bulk creation
+CREATE_BATCH_SIZE = 10000
+# Number of candidates ``aquery`` tries before handing back control
+PAUSE_EVERY = 1000
 
 
 def designations_from_atomic_facts(atomic_facts):
@@ -34,40 +54,110 @@ def designations_from_atomic_facts(atomic_facts):
 class CypherParserBaseClass(object):
     """The base class that specific parsers will inherit from. Certain methods
        must be defined in the child class. See the docs."""
-    def __init__(self):
-        self.tokenizer = cypher_tokenizer
-        self.parser = cypher_parser
-
-    def yield_var_to_element(self, parsed_query, graph_object):
-        all_designations = set()
-        # Track down atomic_facts from outer scope.
-        atomic_facts = extract_atomic_facts(parsed_query)
-        for fact in atomic_facts:
-            if hasattr(fact, 'designation') and fact.designation is not None:
-                all_designations.add(fact.designation)
-            elif hasattr(fact, 'literals'):
-                for literal in fact.literals.literal_list:
-                    if (hasattr(literal, 'designation') and
-                            literal.designation is not None):
-                        all_designations.add(literal.designation)
-        all_designations = sorted(list(all_designations))
-
-        domain = self._get_domain(graph_object)
-        for domain_assignment in itertools.product(
-                *[domain] * len(all_designations)):
-            var_to_element = {all_designations[index]: element for index,
-                              element in enumerate(domain_assignment)}
+    # The class whose instances run MATCH queries
+    matcher_class = PatternMatcher
+
+    def __init__(self, query_cache_size=128, result_cache=None):
+        self.query_cache = QueryCache(max_size=query_cache_size)
+        # An optional ``ResultCache`` for the rows of MATCH queries
+        self.result_cache = result_cache
+        self.last_profile = None
+        self.observers = []
+        self.standing_queries = []
+
+    def add_observer(self, observer):
+        """Have ``observer`` (a ``QueryObserver``) told about every query
+           from now on."""
+        self.observers.append(observer)
+
+    def remove_observer(self, observer):
+        self.observers.remove(observer)
+
+    def watch(self, graph_object, query_string, callback, params=None):
+        """Register a standing MATCH query on ``graph_object``: from now
+           on, whenever nodes or edges created through this parser make new
+           matches, ``callback`` is called with the list of their rows. The
+           new matches are found by searching around the new elements
+           only. Returns the ``StandingQuery``, which ``unwatch`` takes."""
+        standing_query = StandingQuery(self, graph_object, query_string,
+                                       callback, params=params)
+        self.standing_queries.append(standing_query)
+        return standing_query
+
+    def unwatch(self, standing_query):
+        self.standing_queries.remove(standing_query)
+
+    def _mutated(self, graph_object, node_classes=(), edge_labels=(),
+                 everything=False):
+        """Called by the backends whenever they change ``graph_object``,
+           with the classes of the nodes and the labels of the edges they
+           wrote to (or ``everything``), to advance its ``GraphVersion``.
+           Any future SET or DELETE must call it as well, since it's what
+           keeps cached results from going stale."""
+        graph_version(graph_object).bump(
+            node_classes=node_classes, edge_labels=edge_labels,
+            everything=everything)
+
+    def _created(self, graph_object, nodes=(), edges=()):
+        """Called by the backends after creating ``nodes`` (a list of ids)
+           or ``edges`` (a list of ``(edge id, source, target, edge label)``
+           tuples) while there are standing queries, to update those on
+           ``graph_object``."""
+        for standing_query in list(self.standing_queries):
+            if standing_query.graph_object is graph_object:
+                standing_query.update(nodes=nodes, edges=edges)
+
+    @property
+    def tokenizer(self):
+        return get_tokenizer()
+
+    @property
+    def parser(self):
+        return get_parser()
+
+    def yield_var_to_element(self, parsed_query, graph_object,
+                             atomic_facts=None, pause_every=None,
+                             limit=None):
+        """Generator over the assignments of designations to elements of
+           the graph that satisfy the MATCH pattern of the query. The work
+           is done by a backtracking ``PatternMatcher``. With
+           ``pause_every``, ``PAUSE`` is yielded as well (see
+           ``PatternMatcher.matches``). ``limit`` says that no more than
+           that many assignments will be read."""
+        if atomic_facts is None:
+            atomic_facts = extract_atomic_facts(parsed_query)
+        matcher = self.matcher_class(self, graph_object, atomic_facts,
+                                     limit=limit)
+        for var_to_element in matcher.matches(pause_every=pause_every):
             yield var_to_element
 
     def parse(self, query):
         """Calls yacc to parse the query string into an AST."""
-        self.tokenizer.input(query)
-        tok = self.tokenizer.token()
-        while tok:
-            if PRINT_TOKENS:
-                print tok
+        if PRINT_TOKENS:  # Debugging only; lexes the query a second time
+            self.tokenizer.input(query)
             tok = self.tokenizer.token()
-        return self.parser.parse(query)
+            while tok:
+                print tok
+                tok = self.tokenizer.token()
+        return self.parser.parse(query, lexer=self.tokenizer)
+
+    def parse_cached(self, query_string, params=None):
+        """Return ``(parsed_query, atomic_facts)`` for ``query_string``,
+           only lexing and parsing it if it isn't already in the
+           ``query_cache``. Any ``$name`` parameters are filled in from
+           ``params`` on a copy, leaving the cached AST untouched."""
+        entry = self.query_cache.get(query_string)
+        if entry is None:
+            parsed_query = self.parse(query_string)
+            atomic_facts = extract_atomic_facts(parsed_query)
+            entry = (parsed_query, atomic_facts,
+                     query_parameters(parsed_query),)
+            self.query_cache.put(query_string, entry)
+        parsed_query, atomic_facts, parameter_names = entry
+        if len(parameter_names) > 0:
+            parsed_query, atomic_facts = bind_parameters(
+                (parsed_query, atomic_facts,), params)
+        return parsed_query, atomic_facts
 
     def eval_constraint(self, constraint, assignment, graph_object):
         """This is the basis case for the recursive check
@@ -79,138 +169,461 @@ class CypherParserBaseClass(object):
                 graph_object,
                 assignment[constraint.keypath[0]]),
             constraint.keypath[1:])
-        return constraint.function(value, constraint.value)
+        other_value = constraint.value
+        if isinstance(other_value, Reference):
+            other_value = self._attribute_value_from_node_keypath(
+                self._get_node(
+                    graph_object,
+                    assignment[other_value.keypath[0]]),
+                other_value.keypath[1:])
+        return constraint.function(value, other_value)
 
     def eval_boolean(self, clause, assignment, graph_object):
         """Recursive function to evaluate WHERE clauses. ``Or``
-           and ``Not`` classes inherit from ``Constraint``."""
+           and ``Not`` classes inherit from ``Constraint``. Queries don't
+           use this; they evaluate closures from ``compile_constraint``."""
         if isinstance(clause, Or):
             return (self.eval_boolean(clause.left_disjunct,
                                       assignment, graph_object) or
                     self.eval_boolean(clause.right_disjunct,
                                       assignment, graph_object))
+        elif isinstance(clause, And):
+            return (self.eval_boolean(clause.left_conjunct,
+                                      assignment, graph_object) and
+                    self.eval_boolean(clause.right_conjunct,
+                                      assignment, graph_object))
         elif isinstance(clause, Not):
             return not self.eval_boolean(clause.argument,
                                          assignment, graph_object)
         elif isinstance(clause, Constraint):
             return self.eval_constraint(clause, assignment, graph_object)
 
-    def query(self, graph_object, query_string):
+    def compile_constraint(self, constraint, graph_object):
+        """Compile a WHERE constraint tree into one function from an
+           assignment to ``True`` or ``False``, using this backend's
+           keypath getters."""
+        return compile_constraint(
+            constraint,
+            lambda keypath: self._keypath_getter(graph_object, keypath))
+
+    def _keypath_getter(self, graph_object, keypath):
+        """Return a function from an assignment to the value at ``keypath``
+           (a designation followed by attribute keys). Child classes may
+           override this with something faster."""
+        designation, attributes = keypath[0], keypath[1:]
+
+        def _get(assignment):
+            return self._attribute_value_from_node_keypath(
+                self._get_node(graph_object, assignment[designation]),
+                attributes)
+        return _get
+
+    def query(self, graph_object, query_string, params=None, workers=None,
+              ordered=False):
         """Top-level function that's called by the parser when a query has
            been transformed to its AST. This function routes the parsed
            query to a small number of high-level functions for handling
-           specific types of queries (e.g. MATCH, CREATE, ...)"""
-        parsed_query = self.parse(query_string)
-
-        def _test_match_where(clause, assignment, graph_object):
-            sentinal = True  # Satisfied unless we fail
-            for literal in clause.literals.literal_list:
-                designation = literal.designation
-                desired_class = literal.node_class
-                desired_document = literal.attribute_conditions
-                node = graph_object.node[assignment[designation]]
-                # Check the class of the node
-                if (desired_class is not None and
-                        node.get('class', None) != desired_class):
-                    sentinal = False
-                node_document = copy.deepcopy(node)
-                # The `node_document` is a temporary copy for comparisons
-                del node_document['class']
-                if sentinal and (len(desired_document) > 0 and
-                                 node_document != desired_document):
-                    sentinal = False
-                # Check all connecting edges from this node (literal)
-                if not not literal.connecting_edges:  # not not -> empty?
-                    edge_sentinal = True
-                    for edge in literal.connecting_edges:
-                        edge_sentinal = False
-                        source_designation = edge.node_1
-                        target_designation = edge.node_2
-                        edge_label = edge.edge_label
-                        source_node = assignment[source_designation]
-                        target_node = assignment[target_designation]
-                        for one_edge_id in self._edges_connecting_nodes(
-                                graph_object, source_node, target_node):
-                            one_edge = self._get_edge_from_id(
-                                graph_object, one_edge_id)
-                            if (edge_label is None or
-                                    self._edge_class(one_edge) == edge_label):
-                                edge_sentinal = True
-                                if getattr(edge, 'designation', None) is not None:
-                                    assignment[edge.designation] = one_edge_id
-                    sentinal = sentinal and edge_sentinal
-            # Check the WHERE claused
-            # Note this isn't in the previous loop, because the WHERE clause
-            # isn't restricted to a specific node
-            if sentinal and clause.where_clause is not None:
-                constraint = clause.where_clause.constraint
-                constraint_eval = self.eval_boolean(
-                    constraint, assignment, graph_object)
-                sentinal = sentinal and constraint_eval
-            return sentinal
+           specific types of queries (e.g. MATCH, CREATE, ...). Values for
+           ``$name`` placeholders in the query are taken from ``params``.
+
+           With ``workers`` greater than one, a MATCH query is split among
+           that many forked processes (see ``parallel_rows``). Rows then
+           arrive as each part finishes, unless ``ordered`` is set, in which
+           case they come in the same order as without ``workers``.
+           Queries with aggregate functions or ORDER BY always run in this
+           process.
+
+           A MATCH query prefixed with EXPLAIN isn't run: the only item
+           yielded is its ``Plan``. One prefixed with PROFILE is run (in
+           this process) and yields its rows as usual; once they're all
+           read, ``last_profile`` holds its ``Plan``, annotated with the
+           rows, database hits and time of each operator.
+
+           If the parser has a ``result_cache``, the rows of a MATCH query
+           are served from it while nothing the query depends on has been
+           written to (see ``result_cache``).
+
+           If any observers have been added, they're told about the query
+           as it runs, and given its ``QueryMetrics`` at the end (see
+           ``instrumentation``)."""
+        if self.observers:
+            for row in observed_rows(self, graph_object, query_string,
+                                     params=params, workers=workers,
+                                     ordered=ordered):
+                yield row
+            return
+        parsed_query, atomic_facts = self.parse_cached(query_string, params)
 
         # Two cases: Starts with CREATE; doesn't start with CREATE.
         # First doesn't require enumeration of the domain; second does.
 
-        if (isinstance(parsed_query.clause_list[0], CreateClause) and
+        if parsed_query.mode is not None and not isinstance(
+                parsed_query.clause_list[0], MatchWhere):
+            raise Exception("EXPLAIN and PROFILE only apply to MATCH.")
+        elif parsed_query.mode == 'EXPLAIN':
+            matcher, presorted = self._query_matcher(
+                graph_object, parsed_query, atomic_facts)
+            yield build_plan(matcher, parsed_query, presorted)
+        elif parsed_query.mode == 'PROFILE':
+            for row in self._profiled_rows(
+                    graph_object, parsed_query, atomic_facts):
+                yield row
+        elif (isinstance(parsed_query.clause_list[0], CreateClause) and
                 parsed_query.clause_list[0].is_head):
             # Run like before the refactor
-            self.head_create_query(graph_object, parsed_query)
+            self.head_create_query(graph_object, parsed_query, atomic_facts)
             yield 'foo'  # Need to return the created nodes, possibly
+        elif isinstance(parsed_query.clause_list[0], Unwind):
+            self.unwind_create_query(graph_object, parsed_query, atomic_facts)
+            yield 'foo'
+        elif self.result_cache is not None:
+            for row in self._cached_rows(
+                    graph_object, query_string, params, parsed_query,
+                    atomic_facts, workers, ordered):
+                yield row
+        else:
+            for row in self._match_rows(graph_object, parsed_query,
+                                        atomic_facts, workers, ordered):
+                yield row
+
+    def _match_rows(self, graph_object, parsed_query, atomic_facts,
+                    workers, ordered):
+        """Generator over the rows of a MATCH query, computed in this
+           process or by ``workers`` forked ones."""
+        if (workers is not None and workers > 1 and hasattr(os, 'fork') and
+                query_aggregates(parsed_query) is None and
+                query_order(parsed_query) is None):
+            skip, stop = query_paging(parsed_query)
+            return itertools.islice(
+                parallel_rows(self, graph_object, parsed_query,
+                              atomic_facts, workers, ordered=ordered),
+                skip, stop)
+        return self._result_rows(graph_object, parsed_query, atomic_facts)
+
+    def _cached_rows(self, graph_object, query_string, params,
+                     parsed_query, atomic_facts, workers, ordered):
+        """Generator over the rows of a MATCH query, read from the
+           ``result_cache`` if they were cached since the classes and edge
+           labels it depends on were last written to. Otherwise the query
+           is run, and its rows cached if they're all read without the
+           graph changing meanwhile. Each row is a copy, so changing it
+           doesn't change the cache. Nodes and edges added to a graph
+           directly are caught by ``_refresh``, which for a NetworkX graph
+           counts its edges if the query matches any."""
+        dependencies = query_dependencies(atomic_facts)
+        self._refresh(graph_object, edges=any(
+            kind == 'edge' for kind, _ in dependencies))
+        versions = graph_version(graph_object)
+        version = versions.version_of(dependencies)
+        key = (versions.uid, normalize_query(query_string), freeze(params),)
+        rows = self.result_cache.get(key, version)
+        if rows is not None:
+            for row in rows:
+                yield list(row)
+            return
+        rows = []
+        for row in self._match_rows(graph_object, parsed_query,
+                                    atomic_facts, workers, ordered):
+            rows.append(list(row))
+            yield row
+        if versions.version_of(dependencies) == version:
+            self.result_cache.put(key, rows, version)
+
+    def _profiled_rows(self, graph_object, parsed_query, atomic_facts):
+        """Generator over the rows of a MATCH query, run by a profiling
+           copy of the parser, which sets ``last_profile`` at the end. Only
+           the time spent producing rows counts, not the time the caller
+           takes between them."""
+        profiled = profiling_parser(self)
+        rows = profiled._result_rows(graph_object, parsed_query,
+                                     atomic_facts)
+        total_time = 0.0
+        while True:
+            start = time.time()
+            try:
+                row = next(rows)
+            except StopIteration:
+                break
+            finally:
+                total_time += time.time() - start
+            yield row
+        profiler = profiled.profiler
+        if profiler.matcher is None:  # Nothing to match (as with LIMIT 0)
+            profiled._query_matcher(graph_object, parsed_query, atomic_facts)
+        self.last_profile = build_plan(
+            profiler.matcher, parsed_query, profiler.presorted,
+            profiler=profiler, total_time=total_time)
+
+    def aquery(self, graph_object, query_string, params=None,
+               pause_every=PAUSE_EVERY):
+        """Cooperative counterpart of ``query`` for event loops. This is a
+           generator over lists of rows: each ``next`` does a bounded
+           amount of work (trying at most ``pause_every`` candidates) and
+           returns the rows found meanwhile, which may be none. A server
+           can advance many queries in turn, one step per turn of its loop,
+           so that a long query doesn't hold up short ones::
+
+               for rows in parser.aquery(graph_object, query_string):
+                   send(rows)
+                   yield  # Back to the event loop
+
+           Queries that create nodes or are prefixed with EXPLAIN or PROFILE
+           are run in a single step, and the rows of an aggregating or
+           sorted query all come in the last one (unless they're read in
+           order from a sorted index)."""
+        parsed_query, atomic_facts = self.parse_cached(query_string, params)
+        if ((isinstance(parsed_query.clause_list[0], CreateClause) and
+                parsed_query.clause_list[0].is_head) or
+                isinstance(parsed_query.clause_list[0], Unwind) or
+                parsed_query.mode is not None):
+            yield list(self.query(graph_object, query_string, params=params))
+            return
+        rows = []
+        for row in self._result_rows(graph_object, parsed_query,
+                                     atomic_facts, pause_every=pause_every):
+            if row is PAUSE:
+                yield rows
+                rows = []
+            else:
+                rows.append(row)
+        yield rows
+
+    def _result_rows(self, graph_object, parsed_query, atomic_facts,
+                     pause_every=None):
+        """Generator over the result rows of a MATCH query, with ``PAUSE``
+           in between if ``pause_every`` is given. Matching stops as soon
+           as the LIMIT has been reached, and skipped assignments aren't
+           projected. With ORDER BY and a LIMIT, only the best ``skip +
+           limit`` assignments are kept; if the rows can be read in order
+           from a sorted index, they're streamed instead."""
+        skip, stop = query_paging(parsed_query)
+        if stop is not None and stop <= skip:
+            return
+        order = query_order(parsed_query)
+        matcher, presorted = self._query_matcher(
+            graph_object, parsed_query, atomic_facts)
+        matches = matcher.matches(pause_every=pause_every)
+        aggregation = self._aggregation(
+            graph_object, parsed_query, atomic_facts)
+        if aggregation is not None:
+            # SKIP, LIMIT and ORDER BY apply to the groups, not the
+            # assignments
+            for assignment in matches:
+                if assignment is PAUSE:
+                    yield assignment
+                else:
+                    aggregation.add(assignment)
+            rows = aggregation.rows()
+            if order is not None:
+                rows = self._order_groups(parsed_query, order, rows, stop)
+            for row in itertools.islice(rows, skip, stop):
+                yield row
+            return
+        if order is None or presorted:
+            found = 0
+            for assignment in matches:
+                if assignment is PAUSE:
+                    yield assignment
+                    continue
+                found += 1
+                if found > skip:
+                    for row in self.assignment_rows(
+                            graph_object, parsed_query, assignment):
+                        yield row
+                if found == stop:
+                    return
+            return
+        getters = [self._value_getter(graph_object, expression,
+                                      atomic_facts)
+                   for expression, _ in order.items]
+        descending = [descending for _, descending in order.items]
+        ordering = Ordering(count=stop)
+        for assignment in matches:
+            if assignment is PAUSE:
+                yield assignment
+                continue
+            ordering.add(OrderKey([get(assignment) for get in getters],
+                                  descending), dict(assignment))
+        for assignment in ordering.items()[skip:]:
+            for row in self.assignment_rows(
+                    graph_object, parsed_query, assignment):
+                yield row
+
+    def _query_matcher(self, graph_object, parsed_query, atomic_facts):
+        """Return ``(matcher, presorted)``: the ``PatternMatcher`` that
+           ``_result_rows`` runs for a MATCH query, and whether it yields
+           the assignments already in ORDER BY order. Matching is only
+           limited when the rows are streamed straight out."""
+        skip, stop = query_paging(parsed_query)
+        order = query_order(parsed_query)
+        if query_aggregates(parsed_query) is not None:
+            limit = None
+        elif order is None:
+            limit = stop
         else:
-            # Importantly, we step through each assignment, and then for
-            # each assignment, we step through each "clause" (need better name)
-            for assignment in self.yield_var_to_element(
-                    parsed_query, graph_object):
-                satisfied = True
-                for clause in parsed_query.clause_list:
-                    if not satisfied:
-                        break
-                    if isinstance(clause, MatchWhere):  # MATCH... WHERE...
-                        satisfied = satisfied and _test_match_where(
-                            clause, assignment, graph_object)
-                    elif isinstance(clause, ReturnVariables):
-                        # We've added any edges to the assignment dictionary
-                        # Now we need to step through the keypath lists that
-                        # are stored in the ReturnVariables object under the
-                        # attribute "variable_list"
-                        return_values = []
-                        for variable_path in clause.variable_list:
-                            # I expect this will choke on edges if we ask for
-                            # their properties to be returned
-                            if not isinstance(variable_path, list):
-                                variable_path = [variable_path]
-                            if self._is_edge(
-                                    graph_object, assignment[variable_path[0]]):
-                                _get_node_or_edge = self._get_edge
-                            elif self._is_node(
-                                    graph_object, assignment[variable_path[0]]):
-                                _get_node_or_edge = self._get_node
-                            else:
-                                raise Exception("Neither a node nor an edge.")
-                            node_or_edge = _get_node_or_edge(
-                                graph_object, assignment[variable_path[0]])
-                            return_value = (
-                                self._attribute_value_from_node_keypath(
-                                    node_or_edge, variable_path[1:]))
-                            return_values.append(return_value)
-                        yield return_values
-                    else:
-                        import pdb; pdb.set_trace()
-                        raise Exception("Unhandled case in query function.")
-
-    def head_create_query(self, graph_object, parsed_query):
+            matcher = self._index_ordered_matcher(
+                graph_object, order, atomic_facts, stop)
+            if matcher is not None:
+                return matcher, True
+            limit = None
+        return (self.matcher_class(self, graph_object, atomic_facts,
+                                   limit=limit), False,)
+
+    def _index_ordered_matcher(self, graph_object, order, atomic_facts,
+                               limit):
+        """A matcher that yields the assignments in the order of a single
+           ORDER BY keypath, read from a sorted index on it, or ``None`` if
+           there's no such index. The keypath's designation is bound first
+           and its candidates tried in index order, so no sorting is needed
+           and matching can stop at the LIMIT."""
+        if len(order.items) != 1:
+            return None
+        expression, descending = order.items[0]
+        if not isinstance(expression, list) or len(expression) < 2:
+            return None
+        designation = expression[0]
+        classes = set(fact.class_name for fact in atomic_facts if
+                      isinstance(fact, ClassIs) and
+                      fact.designation == designation and
+                      fact.class_name is not None)
+        if len(classes) != 1:
+            return None
+        ordered = self._ordered_nodes(graph_object, list(classes)[0],
+                                      expression[1:], descending)
+        if ordered is None:
+            return None
+        matcher = self.matcher_class(self, graph_object, atomic_facts,
+                                     limit=limit, first=designation)
+        domain = matcher.domains[0]
+        matcher.restrict_anchor(node for node in ordered if node in domain)
+        return matcher
+
+    def _order_groups(self, parsed_query, order, rows, count):
+        """The rows of an aggregation sorted by ORDER BY, whose items must
+           each be one of the RETURN items."""
+        return_variables = query_aggregates(parsed_query)
+        positions = []
+        for expression, _ in order.items:
+            try:
+                positions.append(
+                    return_variables.variable_list.index(expression))
+            except ValueError:
+                raise Exception(
+                    "ORDER BY of an aggregation must use RETURN items.")
+        descending = [descending for _, descending in order.items]
+        ordering = Ordering(count=count)
+        for row in rows:
+            ordering.add(OrderKey([row[position] for position in positions],
+                                  descending), row)
+        return ordering.items()
+
+    def assignment_rows(self, graph_object, parsed_query, assignment):
+        """Generator over the rows that the clauses of the query produce for
+           one matching ``assignment``."""
+        for clause in parsed_query.clause_list:
+            if isinstance(clause, MatchWhere):  # MATCH... WHERE...
+                # The pattern and the WHERE clause have already
+                # been checked by the matcher.
+                continue
+            elif isinstance(clause, (Paging, OrderBy,)):
+                continue  # Applied by the caller
+            elif isinstance(clause, ReturnVariables):
+                # We've added any edges to the assignment dictionary
+                # Now we need to step through the keypath lists that
+                # are stored in the ReturnVariables object under the
+                # attribute "variable_list"
+                yield [self._return_value(graph_object, assignment,
+                                          variable_path) for
+                       variable_path in clause.variable_list]
+            else:
+                import pdb; pdb.set_trace()
+                raise Exception("Unhandled case in query function.")
+
+    def _return_value(self, graph_object, assignment, variable_path):
+        """The value of one RETURN item (a designation or a keypath) for
+           ``assignment``."""
+        # I expect this will choke on edges if we ask for
+        # their properties to be returned
+        if not isinstance(variable_path, list):
+            variable_path = [variable_path]
+        if isinstance(assignment[variable_path[0]], list):
+            # A path bound by ``shortestPath``
+            if len(variable_path) > 1:
+                raise Exception("Paths don't have attributes.")
+            return [self._get_node(graph_object, node) for
+                    node in assignment[variable_path[0]]]
+        if self._is_edge(
+                graph_object, assignment[variable_path[0]]):
+            _get_node_or_edge = self._get_edge
+        elif self._is_node(
+                graph_object, assignment[variable_path[0]]):
+            _get_node_or_edge = self._get_node
+        else:
+            raise Exception("Neither a node nor an edge.")
+        node_or_edge = _get_node_or_edge(
+            graph_object, assignment[variable_path[0]])
+        return self._attribute_value_from_node_keypath(
+            node_or_edge, variable_path[1:])
+
+    def _value_getter(self, graph_object, variable_path, atomic_facts):
+        """A function from an assignment to the value of ``variable_path``
+           (a designation or a keypath), using the backend's keypath getters
+           for keypaths into nodes."""
+        if isinstance(variable_path, list) and any(
+                isinstance(fact, ClassIs) and
+                fact.designation == variable_path[0] for
+                fact in atomic_facts):
+            return self._keypath_getter(graph_object, variable_path)
+        return lambda assignment: self._return_value(
+            graph_object, assignment, variable_path)
+
+    def _aggregation(self, graph_object, parsed_query, atomic_facts):
+        """Return an ``Aggregation`` for the RETURN clause of the query, or
+           ``None`` if it has no aggregate functions. Bare designations are
+           grouped on the node or edge they're bound to, keypaths on their
+           values. Keypaths into nodes are read with the backend's keypath
+           getters, and ``count(*)`` doesn't look at the assignment at
+           all."""
+        return_variables = query_aggregates(parsed_query)
+        if return_variables is None:
+            return None
+
+        def _getter(variable_path):
+            return self._value_getter(graph_object, variable_path,
+                                      atomic_facts)
+
+        def _element(designation):
+            return lambda assignment: assignment[designation]
+
+        items = []
+        for variable in return_variables.variable_list:
+            if not isinstance(variable, Aggregate):
+                items.append((None, _getter(variable),
+                              _getter(variable) if isinstance(variable, list)
+                              else _element(variable),))
+            elif variable.argument is None:
+                items.append((variable.function_name,
+                              lambda assignment: True, None,))
+            else:
+                items.append((variable.function_name,
+                              _getter(variable.argument), None,))
+        return Aggregation(items)
+
+    def head_create_query(self, graph_object, parsed_query,
+                          atomic_facts=None):
         """For executing queries of the form CREATE... RETURN."""
-        atomic_facts = extract_atomic_facts(parsed_query)
+        if atomic_facts is None:
+            atomic_facts = extract_atomic_facts(parsed_query)
         designation_to_node = {}
         designation_to_edge = {}
         for create_clause in parsed_query.clause_list:
             if not isinstance(create_clause, CreateClause):
                 continue
             for literal in create_clause.literals.literal_list:
+                # Copied, since the parsed query may be cached and reused
                 designation_to_node[literal.designation] = self._create_node(
                     graph_object, literal.node_class,
-                    **literal.attribute_conditions)
+                    **copy.deepcopy(literal.attribute_conditions))
         for edge_fact in [
                 fact for fact in atomic_facts if
                 isinstance(fact, EdgeExists)]:
@@ -222,10 +635,123 @@ class CypherParserBaseClass(object):
             # Need an attribute for an edge designation
             designation_to_edge['placeholder'] = new_edge_id
 
+    def unwind_create_query(self, graph_object, parsed_query,
+                            atomic_facts=None):
+        """For executing queries of the form UNWIND $rows AS r CREATE...
+           The pattern is created once per row, with references such as
+           ``r.name`` in the documents replaced by the row's values. All
+           the nodes for one node of the pattern are created in a single
+           call to ``_create_nodes``, and likewise for edges."""
+        if atomic_facts is None:
+            atomic_facts = extract_atomic_facts(parsed_query)
+        unwind, create_clause = parsed_query.clause_list[:2]
+        rows = unwind.rows
+        if not isinstance(rows, (list, tuple,)):
+            raise Exception("UNWIND needs a list, not {}.".format(
+                rows.__class__.__name__))
+        designation_to_nodes = {}
+        for literal in create_clause.literals.literal_list:
+            designation_to_nodes[literal.designation] = self._create_nodes(
+                graph_object, literal.node_class,
+                (resolve_references(literal.attribute_conditions,
+                                    {unwind.designation: row})
+                 for row in rows))
+        for edge_fact in [
+                fact for fact in atomic_facts if
+                isinstance(fact, EdgeExists)]:
+            self._create_edges(
+                graph_object,
+                itertools.izip(designation_to_nodes[edge_fact.node_1],
+                               designation_to_nodes[edge_fact.node_2]),
+                edge_label=edge_fact.edge_label)
+
+    def create_many(self, graph_object, node_class, documents):
+        """Create a node of ``node_class`` for each attribute dictionary in
+           ``documents``, in batches, and return the new ids in order. The
+           nodes get copies of the documents, so that changing them later
+           doesn't change the graph."""
+        return self._create_nodes(
+            graph_object, node_class,
+            (copy.deepcopy(document) for document in documents))
+
+    def _create_nodes(self, graph_object, node_class, documents):
+        """Create a node for each of ``documents`` and return their ids.
+           This default calls ``_create_node`` for each one; child classes
+           may override it to insert in batches."""
+        return [self._create_node(graph_object, node_class, **dict(document))
+                for document in documents]
+
+    def _create_edges(self, graph_object, node_pairs, edge_label=None):
+        """Create an edge for each ``(source, target)`` in ``node_pairs``
+           and return their ids. This default calls ``_create_edge`` for
+           each one; child classes may override it to insert in batches."""
+        return [self._create_edge(graph_object, source_node, target_node,
+                                  edge_label=edge_label)
+                for source_node, target_node in node_pairs]
+
     def _get_domain(self, *args, **kwargs):
         raise NotImplementedError(
             "Method _get_domain needs to be defined in child class.")
 
+    def _indexed_candidates(self, *args, **kwargs):
+        """Optional. Child classes with property indexes return the set of
+           nodes satisfying a condition, or ``None`` if no index applies."""
+        return None
+
+    def _filter_candidates(self, *args, **kwargs):
+        """Optional. Child classes that can evaluate a WHERE conjunct on
+           a single designation over a whole node class at once return the
+           set of nodes satisfying it, or ``None`` if they can't."""
+        return None
+
+    def _ordered_nodes(self, *args, **kwargs):
+        """Optional. Child classes with sorted property indexes return the
+           nodes of a class in order of their values at a keypath, or
+           ``None`` if no index applies."""
+        return None
+
+    def _expand(self, graph_object, node, edge_label=None, outgoing=True):
+        """Generator over ``(neighbor, edge_id)`` pairs for the nodes joined
+           to ``node`` by an edge labeled ``edge_label`` (any label if
+           ``None``), leaving ``node`` if ``outgoing`` and entering it
+           otherwise. Each neighbor appears once, with the last matching
+           edge. This default checks every node in the domain; child
+           classes should override it to walk their adjacency directly."""
+        for neighbor in self._get_domain(graph_object):
+            if outgoing:
+                source, target = node, neighbor
+            else:
+                source, target = neighbor, node
+            matched_edge_id = None
+            for one_edge_id in self._edges_connecting_nodes(
+                    graph_object, source, target):
+                one_edge = self._get_edge_from_id(graph_object, one_edge_id)
+                if (edge_label is None or
+                        self._edge_class(one_edge) == edge_label):
+                    matched_edge_id = one_edge_id
+            if matched_edge_id is not None:
+                yield neighbor, matched_edge_id
+
+    def _neighbors(self, graph_object, node, edge_label=None,
+                   outgoing=True):
+        """The nodes that ``_expand`` would return, without their edges.
+           Child classes may override this with something faster, since
+           path searches call it for every node they reach."""
+        return [neighbor for neighbor, _ in self._expand(
+            graph_object, node, edge_label=edge_label, outgoing=outgoing)]
+
+    def _statistics(self, *args, **kwargs):
+        """Optional. Child classes return an object with ``node_count`` and
+           ``average_degree`` methods for the planner, or ``None``."""
+        return None
+
+    def _refresh(self, *args, **kwargs):
+        """Optional. Called with the graph before a cached result is looked
+           up, and ``edges=True`` if the query matches edges, so that child
+           classes can advance its ``GraphVersion`` for changes made to the
+           graph directly."""
+        pass
+
     def _get_node(self, *args, **kwargs):
         raise NotImplementedError(
             "Method _get_domain needs to be defined in child class.")
@@ -284,32 +810,100 @@ class CypherToNetworkx(CypherParserBaseClass):
     """Child class inheriting from ``CypherParserBaseClass`` to hook up
        Cypher functionality to NetworkX.
     """
-    def _get_domain(self, obj):
-        return obj.nodes()
+    def _get_domain(self, obj, node_class=None):
+        if node_class is None:
+            return obj.nodes()
+        return graph_indexes(obj).nodes_of_class(node_class)
 
     def _is_node(self, graph_object, node_name):
         return node_name in graph_object.node
 
+    def rebuild_indexes(self, graph_object):
+        """Rebuild the indexes kept alongside ``graph_object``. Nodes and
+           edges added to the graph directly are picked up by themselves,
+           but call this after changing their attributes, or after removing
+           edges, other than through queries."""
+        rebuild_graph_indexes(graph_object)
+        self._mutated(graph_object, everything=True)
+
+    def create_index(self, graph_object, node_class, keypath, kind='hash'):
+        """Create a property index over the nodes of ``node_class`` in
+           ``graph_object``. The ``keypath`` is a list of keys or a dotted
+           string such as ``'foo.goo'``. A ``'hash'`` index serves equality
+           conditions; a ``'sorted'`` index serves ranges as well."""
+        if isinstance(keypath, basestring):
+            keypath = keypath.split('.')
+        graph_indexes(graph_object).create_property_index(
+            graph_object, node_class, keypath, kind=kind)
+
+    def _indexed_candidates(self, graph_object, node_class, keypath,
+                            operator, value):
+        return graph_indexes(graph_object).indexed_nodes(
+            node_class, keypath, operator, value)
+
+    def _ordered_nodes(self, graph_object, node_class, keypath, descending):
+        return graph_indexes(graph_object).ordered_nodes(
+            node_class, keypath, descending=descending)
+
+    def _filter_candidates(self, graph_object, node_class, designation,
+                           constraint):
+        indexes = graph_indexes(graph_object)
+        if indexes.node_count(node_class) < vectorized.VECTORIZE_MIN_NODES:
+            return None
+        nodes = graph_object.node
+
+        def _load(keypath):
+            members = list(indexes.nodes_of_class(node_class))
+            if len(keypath) == 1:
+                key = keypath[0]
+                return members, [nodes[node].get(key, None) for
+                                 node in members]
+            return members, [keypath_value(nodes[node], keypath) for
+                             node in members]
+        return vectorized.filter_nodes(
+            indexes.columns, node_class, designation, constraint, _load)
+
+    def _statistics(self, graph_object):
+        return graph_indexes(graph_object)
+
+    def _refresh(self, graph_object, edges=False):
+        refresh_graph_indexes(graph_object, edges=edges)
+
     def _is_edge(self, graph_object, edge_name):
-        for source_node_id, connections_dict in graph_object.edge.iteritems():
-            for _, edges_dict in connections_dict.iteritems():
-                for _, edge_dict in edges_dict.iteritems():
-                    if edge_dict.get('_id', None) == edge_name:
-                        return True
-        return False
+        if edge_name in graph_indexes(graph_object).edge_index:
+            return True
+        # Nodes are asked about too, and needn't wait for the edges count
+        return (edge_name not in graph_object.node and
+                indexed_edge(graph_object, edge_name) is not None)
 
     def _get_node(self, graph_object, node_name):
         return graph_object.node[node_name]
 
+    def _keypath_getter(self, graph_object, keypath):
+        nodes = graph_object.node
+        designation, attributes = keypath[0], tuple(keypath[1:])
+        if len(attributes) == 1:
+            key = attributes[0]
+
+            def _get(assignment):
+                return nodes[assignment[designation]].get(key, None)
+            return _get
+
+        def _get_nested(assignment):
+            value = nodes[assignment[designation]]
+            for key in attributes:
+                try:
+                    value = value[key]
+                except (KeyError, TypeError,):
+                    return None
+            return value
+        return _get_nested
+
     def _get_edge(self, graph_object, edge_name):
-        for source_node_id, connections_dict in graph_object.edge.iteritems():
-            for _, edges_dict in connections_dict.iteritems():
-                for _, edge_dict in edges_dict.iteritems():
-                    if edge_dict.get('_id', None) == edge_name:
-                        return edge_dict
+        return indexed_edge(graph_object, edge_name)
 
     def _node_attribute_value(self, node, attribute_list):
-        out = copy.deepcopy(node)
+        out = node
         for attribute in attribute_list:
             try:
                 out = out.get(attribute)
@@ -336,11 +930,7 @@ class CypherToNetworkx(CypherParserBaseClass):
         raise NotImplementedError("Haven't finished _edge_exists.")
 
     def _get_edge_from_id(self, graph_object, edge_id):
-        for source, target_dict in graph_object.edge.iteritems():
-            for target, edge_dict in target_dict.iteritems():
-                for index, one_edge in edge_dict.iteritems():
-                    if one_edge['_id'] == edge_id:
-                        return one_edge
+        return indexed_edge(graph_object, edge_id)
 
     def _edges_connecting_nodes(self, graph_object, source, target):
         try:
@@ -350,6 +940,27 @@ class CypherToNetworkx(CypherParserBaseClass):
         except:
             raise Exception("Error getting edges connecting nodes.")
 
+    def _expand(self, graph_object, node, edge_label=None, outgoing=True):
+        adjacency = graph_object.edge if outgoing else graph_object.pred
+        for neighbor, edges_dict in adjacency[node].iteritems():
+            matched, matched_edge_id = False, None
+            for edge_dict in edges_dict.itervalues():
+                if (edge_label is None or
+                        edge_dict.get('edge_label', None) == edge_label):
+                    matched, matched_edge_id = True, edge_dict.get('_id', None)
+            if matched:
+                yield neighbor, matched_edge_id
+
+    def _neighbors(self, graph_object, node, edge_label=None,
+                   outgoing=True):
+        adjacency = graph_object.edge if outgoing else graph_object.pred
+        if edge_label is None:
+            return adjacency[node]
+        return [neighbor for neighbor, edges_dict in
+                adjacency[node].iteritems() if
+                any(edge_dict.get('edge_label', None) == edge_label for
+                    edge_dict in edges_dict.itervalues())]
+
     def _node_class(self, node, class_key='class'):
         return node.get(class_key, None)
 
@@ -363,28 +974,368 @@ class CypherToNetworkx(CypherParserBaseClass):
     def _create_node(self, graph_object, node_class, **attribute_conditions):
         """Create a node and return it so it can be referred to later."""
         new_id = unique_id()
+        indexes = graph_indexes(graph_object)
         attribute_conditions['class'] = node_class
         graph_object.add_node(new_id, **attribute_conditions)
+        indexes.add_node(new_id, graph_object.node[new_id])
+        self._mutated(graph_object, node_classes=[node_class])
+        if self.standing_queries:
+            self._created(graph_object, nodes=[new_id])
         return new_id
 
     def _create_edge(self, graph_object, source_node,
                      target_node, edge_label=None):
         new_edge_id = unique_id()
+        indexes = graph_indexes(graph_object)
+        # Choose the key ourselves (as NetworkX would) so the new edge can
+        # be found again for the index without searching.
+        keydict = graph_object.edge.get(source_node, {}).get(target_node, {})
+        key = len(keydict)
+        while key in keydict:
+            key += 1
         graph_object.add_edge(
-            source_node, target_node,
+            source_node, target_node, key=key,
             **{'edge_label': edge_label, '_id': new_edge_id})
+        indexes.add_edge(
+            source_node, target_node, key,
+            graph_object.edge[source_node][target_node][key],
+            source_class=graph_object.node[source_node].get('class', None),
+            target_class=graph_object.node[target_node].get('class', None))
+        self._mutated(graph_object, edge_labels=[edge_label])
+        if self.standing_queries:
+            self._created(graph_object, edges=[
+                (new_edge_id, source_node, target_node, edge_label,)])
         return new_edge_id
 
+    def _create_nodes(self, graph_object, node_class, documents):
+        indexes = graph_indexes(graph_object)
+        nodes = graph_object.node
+        new_ids = []
+        with gc_paused():
+            for batch in batches(documents, CREATE_BATCH_SIZE):
+                new_nodes = [(unique_id(), document) for document in batch]
+                # NetworkX copies each document into a new dictionary
+                graph_object.add_nodes_from(new_nodes)
+                for new_id, _ in new_nodes:
+                    nodes[new_id]['class'] = node_class
+                indexes.add_nodes(
+                    [(new_id, nodes[new_id]) for new_id, _ in new_nodes])
+                new_ids.extend(new_id for new_id, _ in new_nodes)
+        self._mutated(graph_object, node_classes=[node_class])
+        if self.standing_queries:
+            self._created(graph_object, nodes=new_ids)
+        return new_ids
+
+    def _create_edges(self, graph_object, node_pairs, edge_label=None):
+        indexes = graph_indexes(graph_object)
+        nodes = graph_object.node
+        edges = graph_object.edge
+        no_edges = {}
+        new_ids = []
+        created = []
+        with gc_paused():
+            for batch in batches(node_pairs, CREATE_BATCH_SIZE):
+                # Keys are chosen as in ``_create_edge``, also avoiding those
+                # given to parallel edges earlier in the batch.
+                batch_keys = {}
+                new_edges = []
+                for source_node, target_node in batch:
+                    keydict = edges.get(source_node, no_edges).get(
+                        target_node, no_edges)
+                    taken = batch_keys.setdefault((source_node, target_node,),
+                                                  set())
+                    key = len(keydict) + len(taken)
+                    while key in keydict or key in taken:
+                        key += 1
+                    taken.add(key)
+                    new_edges.append(
+                        (source_node, target_node, key,
+                         {'edge_label': edge_label, '_id': unique_id()},))
+                graph_object.add_edges_from(new_edges)
+                for source_node, target_node, key, data in new_edges:
+                    indexes.add_edge(
+                        source_node, target_node, key,
+                        edges[source_node][target_node][key],
+                        source_class=nodes[source_node].get('class', None),
+                        target_class=nodes[target_node].get('class', None))
+                    new_ids.append(data['_id'])
+                if self.standing_queries:
+                    created.extend(
+                        (data['_id'], source_node, target_node, edge_label,)
+                        for source_node, target_node, _, data in new_edges)
+        self._mutated(graph_object, edge_labels=[edge_label])
+        if self.standing_queries:
+            self._created(graph_object, edges=created)
+        return new_ids
+
+
+class CypherToCompactGraph(CypherParserBaseClass):
+    """Child class inheriting from ``CypherParserBaseClass`` to run queries
+       against a ``CompactGraph``, which holds a graph in a fraction of the
+       memory NetworkX needs. Nodes and edges are named by integers.
+    """
+    def _get_domain(self, graph_object, node_class=None):
+        if node_class is None:
+            return xrange(graph_object.number_of_nodes())
+        return graph_object.nodes_of_class(node_class)
+
+    def _statistics(self, graph_object):
+        return graph_object
 
-def random_hash():
-    """Return a random hash for naming new nods and edges."""
-    hash_value = hashlib.md5(str(random.random() + time.time())).hexdigest()
-    return hash_value
+    def _filter_candidates(self, graph_object, node_class, designation,
+                           constraint):
+        if (graph_object.node_count(node_class) <
+                vectorized.VECTORIZE_MIN_NODES):
+            return None
+
+        def _load(keypath):
+            members = list(graph_object.nodes_of_class(node_class))
+            if keypath[0] == 'class':
+                return members, [keypath_value(graph_object.node(node),
+                                               keypath) for node in members]
+            column = graph_object.properties.get(keypath[0], [])
+            values = [column[node] if node < len(column) else MISSING for
+                      node in members]
+            return members, [None if value is MISSING else
+                             keypath_value(value, keypath[1:]) for
+                             value in values]
+        return vectorized.filter_nodes(
+            graph_object.columns, node_class, designation, constraint, _load)
+
+    def _is_node(self, graph_object, element):
+        return graph_object.is_node(element)
+
+    def _is_edge(self, graph_object, element):
+        return graph_object.is_edge(element)
+
+    def _get_node(self, graph_object, node):
+        return graph_object.node(node)
+
+    def _get_edge(self, graph_object, edge_id):
+        return graph_object.edge(edge_id)
+
+    def _get_edge_from_id(self, graph_object, edge_id):
+        return graph_object.edge(edge_id)
+
+    def _keypath_getter(self, graph_object, keypath):
+        if len(keypath) < 2 or keypath[1] == 'class':
+            return CypherParserBaseClass._keypath_getter(
+                self, graph_object, keypath)
+        designation, key, attributes = keypath[0], keypath[1], keypath[2:]
+        properties = graph_object.properties
+
+        def _get(assignment):
+            column = properties.get(key, None)
+            node = assignment[designation]
+            if column is None or node >= len(column):
+                return None
+            value = column[node]
+            if value is MISSING:
+                return None
+            for one_key in attributes:
+                try:
+                    value = value[one_key]
+                except (KeyError, TypeError,):
+                    return None
+            return value
+        return _get
+
+    def _node_attribute_value(self, node, attribute_list):
+        out = node
+        for attribute in attribute_list:
+            try:
+                out = out.get(attribute)
+            except:
+                raise Exception(
+                    "Asked for non-existent attribute {} in node {}.".format(
+                        attribute, node))
+        return out
+
+    def _attribute_value_from_node_keypath(self, node, keypath):
+        if not isinstance(keypath, list) or len(keypath) == 0:
+            if isinstance(node, NodeView):
+                return node.copy()  # Results shouldn't point into the graph
+            return node
+        value = node
+        for key in keypath:
+            try:
+                value = value[key]
+            except (KeyError, TypeError,):
+                return None
+        return value
+
+    def _edges_connecting_nodes(self, graph_object, source, target):
+        for edge_index in sorted(
+                edge_index for neighbor, edge_index in
+                graph_object.edge_indexes(source, any_label=True) if
+                neighbor == target):
+            yield ~edge_index
+
+    def _expand(self, graph_object, node, edge_label=None, outgoing=True):
+        last_edges = {}
+        for neighbor, edge_index in graph_object.edge_indexes(
+                node, edge_label=edge_label, outgoing=outgoing,
+                any_label=edge_label is None):
+            if edge_index > last_edges.get(neighbor, -1):
+                last_edges[neighbor] = edge_index
+        for neighbor, edge_index in last_edges.iteritems():
+            yield neighbor, ~edge_index
+
+    def _node_class(self, node, class_key='class'):
+        return node.get(class_key, None)
+
+    def _edge_class(self, edge, class_key='edge_label'):
+        try:
+            out = edge.get(class_key, None)
+        except AttributeError:
+            out = None
+        return out
+
+    def _create_node(self, graph_object, node_class, **attribute_conditions):
+        """Create a node and return it so it can be referred to later."""
+        new_id = graph_object.add_node(node_class, attribute_conditions)
+        self._mutated(graph_object, node_classes=[node_class])
+        if self.standing_queries:
+            self._created(graph_object, nodes=[new_id])
+        return new_id
+
+    def _create_edge(self, graph_object, source_node,
+                     target_node, edge_label=None):
+        new_edge_id = graph_object.add_edge(source_node, target_node,
+                                            edge_label=edge_label)
+        self._mutated(graph_object, edge_labels=[edge_label])
+        if self.standing_queries:
+            self._created(graph_object, edges=[
+                (new_edge_id, source_node, target_node, edge_label,)])
+        return new_edge_id
+
+    def _create_nodes(self, graph_object, node_class, documents):
+        with gc_paused():
+            new_ids = [graph_object.add_node(node_class, document) for
+                       document in documents]
+        self._mutated(graph_object, node_classes=[node_class])
+        if self.standing_queries:
+            self._created(graph_object, nodes=new_ids)
+        return new_ids
+
+    def _create_edges(self, graph_object, node_pairs, edge_label=None):
+        if self.standing_queries:
+            node_pairs = list(node_pairs)
+        with gc_paused():
+            new_ids = [graph_object.add_edge(source_node, target_node,
+                                             edge_label=edge_label) for
+                       source_node, target_node in node_pairs]
+        self._mutated(graph_object, edge_labels=[edge_label])
+        if self.standing_queries:
+            self._created(graph_object, edges=[
+                (new_edge_id, source_node, target_node, edge_label,) for
+                new_edge_id, (source_node, target_node) in
+                zip(new_ids, node_pairs)])
+        return new_ids
+
+
+@contextlib.contextmanager
+def gc_paused():
+    """Turn off the cyclic garbage collector for the duration. A bulk load
+       creates a great many dictionaries, none of them garbage, and each
+       collection would have to traverse all of those made so far."""
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if was_enabled:
+            gc.enable()
+
+
+def batches(iterable, batch_size):
+    """Generator over lists of (at most) ``batch_size`` consecutive items
+       of ``iterable``."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, batch_size))
+        if len(batch) == 0:
+            return
+        yield batch
+
+
+def resolve_references(document, bindings):
+    """Return a copy of ``document`` in which each ``Reference`` is
+       replaced by the value at its keypath in ``bindings`` (a dictionary
+       from designations to rows). Keys whose value is missing from the
+       row are left out, as Cypher doesn't store null properties."""
+    resolved = {}
+    for key, value in document.iteritems():
+        if isinstance(value, Reference):
+            row = bindings[value.keypath[0]]
+            for row_key in value.keypath[1:]:
+                try:
+                    row = row[row_key]
+                except (KeyError, TypeError,):
+                    row = None
+                    break
+            if row is None:
+                continue
+            value = row
+        elif isinstance(value, dict):
+            value = resolve_references(value, bindings)
+        else:
+            value = copy.deepcopy(value)
+        resolved[key] = value
+    return resolved
+
+
+_id_prefix = None
+_id_counter = None
+_id_pid = None
 
 
 def unique_id():
-    """Call ``random_hash`` and prepend ``_id_`` to it."""
-    return '_id_' + random_hash()
+    """Return a new id: ``_id_``, a random prefix chosen once per process,
+       and a counter. Unlike hashes of the time, these can't collide, and
+       they're much cheaper to make."""
+    global _id_prefix, _id_counter, _id_pid
+    if _id_pid != os.getpid():  # First call, or in a forked child
+        _id_prefix = '_id_' + binascii.hexlify(os.urandom(8)) + '_'
+        _id_counter = itertools.count()
+        _id_pid = os.getpid()
+    return _id_prefix + format(next(_id_counter), 'x')
+
+
+def query_aggregates(parsed_query):
+    """Return the ``ReturnVariables`` clause of a parsed query if it has
+       aggregate functions in it, and ``None`` otherwise."""
+    for clause in parsed_query.clause_list:
+        if isinstance(clause, ReturnVariables) and any(
+                isinstance(variable, Aggregate) for
+                variable in clause.variable_list):
+            return clause
+    return None
+
+
+def query_order(parsed_query):
+    """Return the ``OrderBy`` clause of a parsed query, or ``None``."""
+    for clause in parsed_query.clause_list:
+        if isinstance(clause, OrderBy):
+            return clause
+    return None
+
+
+def query_paging(parsed_query):
+    """Return ``(skip, stop)`` for the SKIP and LIMIT of a parsed query:
+       the rows to return are those numbered from ``skip`` up to (but not
+       including) ``stop``, which is ``None`` if there's no LIMIT."""
+    for clause in parsed_query.clause_list:
+        if isinstance(clause, Paging):
+            for count in (clause.skip, clause.limit,):
+                if count is not None and (
+                        not isinstance(count, (int, long,)) or count < 0):
+                    raise Exception(
+                        "SKIP and LIMIT must be non-negative integers.")
+            if clause.limit is None:
+                return clause.skip, None
+            return clause.skip, clause.skip + clause.limit
+    return 0, None
 
 
 def extract_atomic_facts(query):
@@ -411,6 +1362,10 @@ def extract_atomic_facts(query):
             _recurse(subquery.where_clause)
         elif isinstance(subquery, CreateClause):
             _recurse(subquery.literals)
+        elif isinstance(subquery, Unwind):
+            pass  # Binds the rows of a CREATE; no facts to check
+        elif isinstance(subquery, (Paging, OrderBy,)):
+            pass  # Applied to the rows after matching
         elif isinstance(subquery, Literals):
             for literal in subquery.literal_list:
                 _recurse(literal)
@@ -420,10 +1375,15 @@ def extract_atomic_facts(query):
         elif isinstance(subquery, EdgeExists):
             if (not hasattr(subquery, 'designation') or
                     subquery.designation is None):
+                # Prefixed differently from the parser's anonymous nodes,
+                # which are numbered from a separate counter.
                 subquery.designation = (
-                    '_v' + str(_recurse.next_anonymous_variable))
+                    '_e' + str(_recurse.next_anonymous_variable))
                 _recurse.next_anonymous_variable += 1
 
+        elif isinstance(subquery, PathExists):
+            pass  # Only named if it's a shortestPath with a designation
+
         elif isinstance(subquery, Node):
             if (not hasattr(subquery, 'designation') or
                     subquery.designation is None):
@@ -446,6 +1406,7 @@ def extract_atomic_facts(query):
                 # Don't think we'll need a case for edges
                 pass
         elif isinstance(subquery, MatchWhere):
+            _recurse(subquery.literals)
             _recurse.atomic_facts.append(subquery)
         elif isinstance(subquery, CreateClause):
             _recurse(subquery.create_clause)
@@ -461,6 +1422,7 @@ def extract_atomic_facts(query):
 
 
 def main():
+    import networkx as nx
     # sample = ','.join(['MATCH (x:SOMECLASS {bar : "baz"',
     #                    'foo:"goo"})<-[:WHATEVER]-(:ANOTHERCLASS)',
     #                    '(y:LASTCLASS) RETURN x.foo, y'])
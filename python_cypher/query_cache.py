@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+This script contains ``QueryCache``, a bounded least-recently-used cache
+used to avoid lexing and parsing the same query text more than once.
+"""
+
+from collections import OrderedDict
+
+
+class QueryCache(object):
+    """Bounded LRU cache. Lookups are counted so that the hit rate can be
+       checked with ``stats``."""
+    def __init__(self, max_size=128):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return the cached value for ``key`` (marking it as most recently
+           used), or ``None`` if it isn't cached."""
+        try:
+            value = self.entries.pop(key)
+        except KeyError:
+            self.misses += 1
+            return None
+        self.entries[key] = value
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.entries.pop(key, None)
+        self.entries[key] = value
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self.entries),
+                'max_size': self.max_size}
@@ -0,0 +1,475 @@
+# -*- coding: utf-8 -*-
+"""
+This script contains what ``EXPLAIN`` and ``PROFILE`` need. ``build_plan``
+describes how a MATCH query is run as a tree of ``PlanOperator`` objects,
+one for each step: a scan or an expansion for each designation in the
+binding order, a filter for the facts checked once it's bound, and then
+any aggregation, sorting, paging and the projection of the RETURN items.
+
+To profile a query, it's run by a copy of the parser whose class also
+inherits ``ProfilingParser``, so that its node and edge lookups are
+counted, and whose matches come from a ``ProfilingMatcher``, which counts
+the rows in and out of each step and times it. Nothing is counted when a
+query is run normally.
+"""
+
+import time
+
+from cypher_parser import *
+from matcher import PatternMatcher
+
+
+class PlanOperator(object):
+    """One step of an execution plan, fed by the rows of its ``children``.
+       The counters are ``None`` unless the query was profiled: the number
+       of rows in and out, the database hits (calls to the backend's node
+       and edge lookups, and nodes read by scans and expansions) and the
+       time spent in the step itself, in seconds."""
+    def __init__(self, name, details='', children=None):
+        self.name = name
+        self.details = details
+        self.children = children or []
+        self.rows_in = None
+        self.rows_out = None
+        self.db_hits = None
+        self.time = None
+
+    def as_dict(self):
+        return {
+            'operator': self.name,
+            'details': self.details,
+            'rows_in': self.rows_in,
+            'rows_out': self.rows_out,
+            'db_hits': self.db_hits,
+            'time': self.time,
+            'children': [child.as_dict() for child in self.children]}
+
+    def lines(self, depth=0):
+        """The operator and those under it as lines of a printable tree."""
+        line = '  ' * depth + '+' + self.name
+        if self.details:
+            line += ' ' + self.details
+        if self.rows_out is not None:
+            line += ' | rows in: {} out: {} | db hits: {} | {:.3f} ms'.format(
+                '-' if self.rows_in is None else self.rows_in,
+                self.rows_out, self.db_hits, 1000 * (self.time or 0.0))
+        lines = [line]
+        for child in self.children:
+            lines += child.lines(depth + 1)
+        return lines
+
+
+class Plan(object):
+    """The execution plan of a query: the ``root`` ``PlanOperator``, the
+       ``binding_order`` of the designations and the conditions answered by
+       indexes, as strings. ``time`` is the total time taken if the query
+       was profiled."""
+    def __init__(self, root, binding_order, indexes, time=None):
+        self.root = root
+        self.binding_order = binding_order
+        self.indexes = indexes
+        self.time = time
+
+    def as_dict(self):
+        return {'plan': self.root.as_dict(),
+                'binding_order': self.binding_order,
+                'indexes': self.indexes,
+                'time': self.time}
+
+    def __str__(self):
+        lines = self.root.lines()
+        lines.append('Binding order: ' + ', '.join(self.binding_order))
+        if self.indexes:
+            lines.append('Indexes: ' + '; '.join(self.indexes))
+        if self.time is not None:
+            lines.append('Total time: {:.3f} ms'.format(1000 * self.time))
+        return '\n'.join(lines)
+
+
+def describe(item):
+    """A short Cypher-like description of part of a query: an atomic fact,
+       a WHERE constraint, a RETURN item or ORDER BY item, or a ``(keypath,
+       operator, value)`` condition."""
+    if isinstance(item, Aggregate):
+        return '{}({})'.format(item.function_name, '*' if
+                               item.argument is None else
+                               describe(item.argument))
+    elif isinstance(item, list):
+        return '.'.join(item)
+    elif isinstance(item, And):
+        return '({} AND {})'.format(describe(item.left_conjunct),
+                                    describe(item.right_conjunct))
+    elif isinstance(item, Or):
+        return '({} OR {})'.format(describe(item.left_disjunct),
+                                   describe(item.right_disjunct))
+    elif isinstance(item, Not):
+        return 'NOT {}'.format(describe(item.argument))
+    elif isinstance(item, Constraint):
+        value = item.value
+        return '{} {} {}'.format(
+            describe(item.keypath), item.function_string,
+            describe(value.keypath) if isinstance(value, Reference) else
+            repr(value))
+    elif isinstance(item, NodeHasDocument):
+        return '{} {}'.format(item.designation, item.document)
+    elif isinstance(item, EdgeExists):
+        return '({})-[{}{}]->({})'.format(
+            item.node_1, item.designation or '',
+            ':' + item.edge_label if item.edge_label else '', item.node_2)
+    elif isinstance(item, PathExists):
+        hops = '*{}..{}'.format(
+            item.min_hops, '' if item.max_hops is None else item.max_hops)
+        pattern = '({})-[{}{}]-{}({})'.format(
+            item.node_1, ':' + item.edge_label if item.edge_label else '',
+            hops, '>' if item.directed else '', item.node_2)
+        if item.shortest:
+            pattern = 'shortestPath({})'.format(pattern)
+            if item.designation is not None:
+                pattern = '{} = {}'.format(item.designation, pattern)
+        return pattern
+    elif isinstance(item, tuple):
+        keypath, operator, value = item
+        return '{} {} {}'.format(describe(keypath), operator, repr(value))
+    elif hasattr(item, 'constraint'):  # A WhereConjunct
+        return describe(item.constraint)
+    return str(item)
+
+
+class OperatorStats(object):
+    __slots__ = ('rows_in', 'rows_out', 'db_hits', 'time',)
+
+    def __init__(self):
+        self.rows_in = 0
+        self.rows_out = 0
+        self.db_hits = 0
+        self.time = 0.0
+
+
+class Profiler(object):
+    """Counters for the steps of a query, keyed by ``('source',
+       designation)`` for the scan or expansion binding a designation,
+       ``('filter', designation)`` for the checks made once it's bound,
+       ``'aggregation'`` and ``'projection'``. Database hits go to the
+       step that's ``current``."""
+    def __init__(self):
+        self.stats = {}
+        self.current = None
+        self.matcher = None
+        self.presorted = False
+        self.aggregation = None
+
+    def get(self, key):
+        stats = self.stats.get(key, None)
+        if stats is None:
+            stats = self.stats[key] = OperatorStats()
+        return stats
+
+    def enter(self, key):
+        """Make ``key`` the current step and return the previous one."""
+        previous, self.current = self.current, key
+        return previous
+
+    def hit(self, count=1):
+        self.get(self.current).db_hits += count
+
+
+class ProfilingMatcher(PatternMatcher):
+    """A ``PatternMatcher`` that records what each step does in the
+       ``profiler`` of its (``ProfilingParser``) parser."""
+    def __init__(self, parser, *args, **kwargs):
+        self.profiler = parser.profiler
+        PatternMatcher.__init__(self, parser, *args, **kwargs)
+        self._check_keys = {
+            id(checks): ('filter', designation) for checks, designation in
+            zip(self.checks, self.designations)}
+
+    def _domain(self, designation):
+        previous = self.profiler.enter(('source', designation))
+        try:
+            return PatternMatcher._domain(self, designation)
+        finally:
+            self.profiler.enter(previous)
+
+    def _candidates(self, depth, assignment):
+        profiler = self.profiler
+        key = ('source', self.designations[depth])
+        stats = profiler.get(key)
+        stats.rows_in += 1
+        candidates = PatternMatcher._candidates(self, depth, assignment)
+        while True:
+            previous = profiler.enter(key)
+            start = time.time()
+            try:
+                candidate = next(candidates)
+            except StopIteration:
+                return
+            finally:
+                stats.time += time.time() - start
+                profiler.enter(previous)
+            stats.rows_out += 1
+            stats.db_hits += 1
+            yield candidate
+
+    def _check_all(self, facts, assignment, bound_edges):
+        if not facts:
+            return True
+        key = self._check_keys[id(facts)]
+        stats = self.profiler.get(key)
+        previous = self.profiler.enter(key)
+        start = time.time()
+        try:
+            satisfied = PatternMatcher._check_all(
+                self, facts, assignment, bound_edges)
+        finally:
+            stats.time += time.time() - start
+            self.profiler.enter(previous)
+        stats.rows_in += 1
+        if satisfied:
+            stats.rows_out += 1
+        return satisfied
+
+
+def _counted(name):
+    def _method(self, *args, **kwargs):
+        self.profiler.hit()
+        return getattr(super(ProfilingParser, self), name)(*args, **kwargs)
+    _method.__name__ = name
+    return _method
+
+
+class ProfilingParser(object):
+    """Mixed into a parser's class by ``profiling_parser`` to count its
+       node and edge lookups and time its aggregation and projection."""
+    matcher_class = ProfilingMatcher
+
+    _get_domain = _counted('_get_domain')
+    _expand = _counted('_expand')
+    _neighbors = _counted('_neighbors')
+    _get_node = _counted('_get_node')
+    _get_edge = _counted('_get_edge')
+    _get_edge_from_id = _counted('_get_edge_from_id')
+    _edges_connecting_nodes = _counted('_edges_connecting_nodes')
+    _indexed_candidates = _counted('_indexed_candidates')
+    _filter_candidates = _counted('_filter_candidates')
+
+    def _query_matcher(self, graph_object, parsed_query, atomic_facts):
+        matcher, presorted = super(ProfilingParser, self)._query_matcher(
+            graph_object, parsed_query, atomic_facts)
+        self.profiler.matcher, self.profiler.presorted = matcher, presorted
+        return matcher, presorted
+
+    def _keypath_getter(self, graph_object, keypath):
+        get = super(ProfilingParser, self)._keypath_getter(
+            graph_object, keypath)
+        profiler = self.profiler
+
+        def _get(assignment):
+            profiler.hit()
+            return get(assignment)
+        return _get
+
+    def _aggregation(self, graph_object, parsed_query, atomic_facts):
+        aggregation = super(ProfilingParser, self)._aggregation(
+            graph_object, parsed_query, atomic_facts)
+        if aggregation is None:
+            return None
+        profiler = self.profiler
+        profiler.aggregation = aggregation
+        stats = profiler.get('aggregation')
+        add = aggregation.add
+
+        def _add(assignment):
+            previous = profiler.enter('aggregation')
+            start = time.time()
+            try:
+                add(assignment)
+            finally:
+                stats.time += time.time() - start
+                profiler.enter(previous)
+            stats.rows_in += 1
+        aggregation.add = _add
+        return aggregation
+
+    def assignment_rows(self, graph_object, parsed_query, assignment):
+        profiler = self.profiler
+        stats = profiler.get('projection')
+        previous = profiler.enter('projection')
+        start = time.time()
+        try:
+            rows = list(super(ProfilingParser, self).assignment_rows(
+                graph_object, parsed_query, assignment))
+        finally:
+            stats.time += time.time() - start
+            profiler.enter(previous)
+        stats.rows_in += 1
+        stats.rows_out += len(rows)
+        return rows
+
+
+_profiling_classes = {}
+
+
+def profiling_parser(parser):
+    """A copy of ``parser`` (sharing its caches) whose class also inherits
+       ``ProfilingParser``, with a new ``Profiler`` as ``profiler``."""
+    parser_class = type(parser)
+    profiling_class = _profiling_classes.get(parser_class, None)
+    if profiling_class is None:
+        profiling_class = _profiling_classes[parser_class] = type(
+            'Profiling' + parser_class.__name__,
+            (ProfilingParser, parser_class,), {})
+    profiled = profiling_class.__new__(profiling_class)
+    profiled.__dict__.update(parser.__dict__)
+    profiled.profiler = Profiler()
+    return profiled
+
+
+def _source_operator(matcher, depth, presorted, order, index_uses):
+    designation = matcher.designations[depth]
+    driver = matcher.drivers[depth]
+    node_class = matcher._node_class(designation)
+    label = designation + (':' + node_class if node_class else '')
+    if isinstance(driver, PathExists):
+        name = 'ShortestPath' if driver.shortest else 'VarLengthExpand'
+        return PlanOperator(name, '{} -> {}'.format(describe(driver), label))
+    elif isinstance(driver, EdgeExists):
+        return PlanOperator('Expand', '{} -> {}'.format(describe(driver),
+                                                        label))
+    elif depth == 0 and presorted:
+        expression, descending = order.items[0]
+        return PlanOperator('NodeIndexScan', '{} ORDER BY {}{}'.format(
+            label, describe(expression), ' DESC' if descending else ''))
+    elif index_uses:
+        return PlanOperator('NodeIndexSeek', '{} WHERE {}'.format(
+            label, ' AND '.join(index_uses)))
+    elif node_class is None and matcher.domains[depth] is None:
+        return PlanOperator('AllNodesScan', designation)
+    return PlanOperator('NodeByLabelScan', label)
+
+
+def _chain(operator, name, details):
+    return PlanOperator(name, details, children=[operator])
+
+
+def build_plan(matcher, parsed_query, presorted, profiler=None,
+               total_time=None):
+    """The ``Plan`` for running ``parsed_query`` with ``matcher``, which
+       yields its assignments in ORDER BY order if ``presorted``. With a
+       ``profiler``, the operators are annotated with its counters; the
+       time of a sort, which isn't measured on its own, is what's left of
+       ``total_time``."""
+    index_uses = {}
+    index_descriptions = []
+    for designation, kind, condition in matcher.index_uses:
+        if kind == 'index':
+            keypath, operator, value = condition
+            text = describe(([designation] + list(keypath), operator,
+                             value,))
+        else:
+            text = describe(condition)
+        index_uses.setdefault(designation, []).append(text)
+        index_descriptions.append('{} ({})'.format(
+            text, 'property index' if kind == 'index' else 'columns'))
+
+    order = None
+    aggregates = None
+    skip, limit = 0, None
+    return_variables = []
+    for clause in parsed_query.clause_list:
+        if isinstance(clause, OrderBy):
+            order = clause
+        elif isinstance(clause, Paging):
+            skip, limit = clause.skip, clause.limit
+        elif isinstance(clause, ReturnVariables):
+            return_variables = clause.variable_list
+            if any(isinstance(variable, Aggregate) for
+                   variable in return_variables):
+                aggregates = clause
+
+    operator = None
+    measured = []
+    for depth, designation in enumerate(matcher.designations):
+        source = _source_operator(matcher, depth, presorted, order,
+                                  index_uses.get(designation, []))
+        if operator is not None:
+            source.children = [operator]
+        operator = source
+        measured.append((operator, ('source', designation),))
+        checks = [fact for fact in matcher.checks[depth] if not (
+            isinstance(fact, NodeHasDocument) and not fact.document)]
+        if checks:
+            operator = _chain(operator, 'Filter', ' AND '.join(
+                describe(fact) for fact in checks))
+            measured.append((operator, ('filter', designation),))
+    if operator is None:
+        operator = PlanOperator('EmptyResult')
+    if aggregates is not None:
+        operator = _chain(operator, 'EagerAggregation', ', '.join(
+            describe(variable) for variable in return_variables))
+        measured.append((operator, 'aggregation',))
+    sort = None
+    if order is not None and not presorted:
+        sort = operator = _chain(
+            operator, 'Top' if limit is not None else 'Sort',
+            ', '.join(describe(expression) + (' DESC' if descending else '')
+                      for expression, descending in order.items))
+    if skip:
+        operator = _chain(operator, 'Skip', str(skip))
+    if limit is not None:
+        operator = _chain(operator, 'Limit', str(limit))
+    root = _chain(operator, 'ProduceResults', ', '.join(
+        describe(variable) for variable in return_variables))
+    if aggregates is None:
+        measured.append((root, 'projection',))
+    plan = Plan(root, list(matcher.designations), index_descriptions)
+    if profiler is not None:
+        _annotate(plan, measured, sort, skip, limit, profiler, total_time)
+    return plan
+
+
+def _annotate(plan, measured, sort, skip, limit, profiler, total_time):
+    """Fill in the counters of a profiled plan's operators: those measured
+       directly from the ``profiler``, the rest from the rows of the
+       operators under them."""
+    for operator, key in measured:
+        stats = profiler.get(key)
+        operator.rows_in = stats.rows_in
+        operator.rows_out = stats.rows_out
+        operator.db_hits = stats.db_hits
+        operator.time = stats.time
+    operators = []
+    operator = plan.root
+    while operator is not None:
+        operators.append(operator)
+        operator = operator.children[0] if operator.children else None
+    operators.reverse()  # From the leaves up
+    measured_operators = set(operator for operator, _ in measured)
+    for below, operator in zip([None] + operators, operators):
+        if below is not None and operator.rows_in is None:
+            operator.rows_in = below.rows_out
+        if operator.name == 'EagerAggregation':
+            operator.rows_out = len(profiler.aggregation.groups) or (
+                1 if len(profiler.aggregation.key_getters) == 0 else 0)
+        if operator in measured_operators:
+            continue
+        if operator.name == 'ProduceResults':
+            # Projected before paging, as the aggregation rows come out
+            operator.rows_out = operator.rows_in
+            operator.db_hits = operator.time = 0
+        elif operator.name == 'Skip':
+            operator.rows_out = max(operator.rows_in - skip, 0)
+        elif operator.name == 'Limit':
+            operator.rows_out = min(operator.rows_in, limit)
+        elif operator.name == 'Top':
+            operator.rows_out = min(operator.rows_in, skip + limit)
+        elif operator.name in ('Sort', 'EmptyResult',):
+            operator.rows_out = operator.rows_in or 0
+        if operator.db_hits is None:
+            operator.db_hits = 0
+        if operator.time is None:
+            operator.time = 0.0
+    if sort is not None and total_time is not None:
+        sort.time = max(total_time - sum(
+            operator.time for operator in operators if
+            operator is not sort), 0.0)
+    plan.time = total_time
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+This script contains the ``ResultCache``, which keeps the rows of recent
+MATCH queries so that a query repeated against an unchanged graph isn't
+run again, and the ``GraphVersion`` that tells when a graph has changed.
+
+Each graph has a version, which the backends advance whenever they change
+it (see ``CypherParserBaseClass._mutated``), recording which node classes
+and edge labels were written. A cached result is stamped with the latest
+version of the classes and labels its query mentions, so writes elsewhere
+in the graph leave it valid. A query with an unlabeled node (or edge)
+depends on every node class (or edge label).
+"""
+
+import itertools
+import sys
+import weakref
+
+from cypher_parser import *
+from query_cache import QueryCache
+
+# Keyed weakly by the graph itself, like the indexes
+_GRAPH_VERSIONS = weakref.WeakKeyDictionary()
+_uids = itertools.count()
+# The graph last looked up, and its version, since it's usually the next
+_last_version = (lambda: None, None,)
+
+# Default memory budget of a ``ResultCache``, in bytes
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+class GraphVersion(object):
+    """A graph's mutation counter, ``version``, with the version at which
+       each node class (``('class', name)``) and edge label (``('edge',
+       label)``) was last written. ``('class', None)`` and ``('edge',
+       None)`` are advanced by every write to a node or edge, and
+       ``everything`` by changes that could affect anything. ``uid`` tells
+       graphs apart for as long as the process runs."""
+    def __init__(self):
+        self.uid = next(_uids)
+        self.version = 0
+        self.everything = 0
+        self.label_versions = {}
+
+    def bump(self, node_classes=(), edge_labels=(), everything=False):
+        version = self.version = self.version + 1
+        label_versions = self.label_versions
+        if everything:
+            self.everything = version
+        for node_class in node_classes:
+            label_versions['class', node_class] = version
+            label_versions['class', None] = version
+        for edge_label in edge_labels:
+            label_versions['edge', edge_label] = version
+            label_versions['edge', None] = version
+
+    def version_of(self, labels):
+        """The version at which any of ``labels`` was last written."""
+        return max([self.everything] + [self.label_versions.get(label, 0)
+                                        for label in labels])
+
+
+def graph_version(graph_object):
+    """Return the ``GraphVersion`` of ``graph_object``, starting one the
+       first time the graph is seen."""
+    global _last_version
+    graph_reference, version = _last_version
+    if graph_reference() is graph_object:
+        return version
+    version = _GRAPH_VERSIONS.get(graph_object, None)
+    if version is None:
+        version = _GRAPH_VERSIONS[graph_object] = GraphVersion()
+    _last_version = (weakref.ref(graph_object), version,)
+    return version
+
+
+def query_dependencies(atomic_facts):
+    """The node classes and edge labels whose writes can change the result
+       of a MATCH query, as ``GraphVersion`` labels."""
+    dependencies = set()
+    for fact in atomic_facts:
+        if isinstance(fact, ClassIs):
+            dependencies.add(('class', fact.class_name,))
+        elif isinstance(fact, (EdgeExists, PathExists,)):
+            dependencies.add(('edge', fact.edge_label,))
+    return dependencies
+
+
+def normalize_query(query_string):
+    """The query with each run of whitespace made a single space. String
+       literals can't contain spaces, so this doesn't change its meaning."""
+    return ' '.join(query_string.split())
+
+
+def freeze(value):
+    """A hashable equivalent of ``value``, a parameter dictionary or one of
+       its values."""
+    if isinstance(value, dict):
+        return tuple(sorted((key, freeze(item)) for
+                            key, item in value.iteritems()))
+    elif isinstance(value, (list, tuple,)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def estimate_size(value):
+    """Rough number of bytes taken by ``value`` and the lists, tuples and
+       dictionaries it contains, counting each object once."""
+    seen = set()
+    stack = [value]
+    size = 0
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        size += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.iterkeys())
+            stack.extend(item.itervalues())
+        elif isinstance(item, (list, tuple,)):
+            stack.extend(item)
+    return size
+
+
+class ResultCache(QueryCache):
+    """LRU cache of query results, each the list of rows of one query, with
+       the ``version`` of the graph it was computed at. Least recently used
+       results are evicted once there are more than ``max_size`` of them or
+       they take more than ``max_bytes`` (as estimated by
+       ``estimate_size``)."""
+    def __init__(self, max_size=256, max_bytes=DEFAULT_MAX_BYTES):
+        QueryCache.__init__(self, max_size=max_size)
+        self.max_bytes = max_bytes
+        self.sizes = {}
+        self.total_bytes = 0
+
+    def get(self, key, version=None):
+        """Return the rows cached for ``key`` at ``version``, or ``None``.
+           Rows cached at another version are dropped."""
+        entry = self.entries.get(key, None)
+        if entry is not None and entry[0] != version:
+            self.discard(key)
+        entry = QueryCache.get(self, key)
+        return None if entry is None else entry[1]
+
+    def put(self, key, rows, version=None):
+        size = estimate_size(rows)
+        self.discard(key)
+        if size > self.max_bytes:
+            return
+        self.entries[key] = (version, rows,)
+        self.sizes[key] = size
+        self.total_bytes += size
+        while (len(self.entries) > self.max_size or
+               self.total_bytes > self.max_bytes):
+            self.discard(next(iter(self.entries)))
+
+    def discard(self, key):
+        if key in self.entries:
+            del self.entries[key]
+            self.total_bytes -= self.sizes.pop(key)
+
+    def clear(self):
+        QueryCache.clear(self)
+        self.sizes.clear()
+        self.total_bytes = 0
+
+    def stats(self):
+        stats = QueryCache.stats(self)
+        stats['bytes'] = self.total_bytes
+        stats['max_bytes'] = self.max_bytes
+        return stats
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+This script contains ``StandingQuery``, a MATCH query whose matches are
+kept up to date as nodes and edges are added to a graph, so that only the
+new ones need to be found each time instead of running the query again.
+
+Since nodes and edges are only ever added, a match that has been found
+stays a match, and every new one involves something new: a new node bound
+to one of the designations, or a new edge satisfying one of the edge facts.
+So the new matches are found by searches anchored there (see the
+``anchors`` of ``PatternMatcher``), whose cost depends on the new elements
+and their neighbourhoods rather than on the size of the graph. The
+assignments already found are remembered so that none is reported twice
+(as when two new nodes are bound in the same match, or a new edge runs
+alongside an old one with the same label).
+
+A match is what it binds to the query's named designations: the anonymous
+ones (``_v0``, ``_e0``...) are left out, so that an edge alongside an old
+one isn't a new match, whether it's created in the same call or a later
+one.
+"""
+
+import re
+
+from cypher_parser import *
+
+# The designations given to anonymous nodes and edges when a query is parsed
+ANONYMOUS_DESIGNATION = re.compile(r'_[ev][0-9]+$')
+
+
+def assignment_key(assignment):
+    return frozenset(
+        (designation, value,) for designation, value in
+        assignment.iteritems() if
+        not ANONYMOUS_DESIGNATION.match(designation))
+
+
+class StandingQuery(object):
+    """A MATCH query on ``graph_object`` whose new rows are passed to
+       ``callback`` (as a list) whenever creating nodes or edges through
+       ``parser`` makes new matches. The matches that exist when it's
+       created are found then, and not reported. Every match is kept in
+       ``matched`` for as long as the query is watched, so its memory grows
+       with the number of matches, like that of the query's result."""
+    def __init__(self, parser, graph_object, query_string, callback,
+                 params=None):
+        self.parser = parser
+        self.graph_object = graph_object
+        self.query_string = query_string
+        self.callback = callback
+        self.parsed_query, self.atomic_facts = parser.parse_cached(
+            query_string, params)
+        self._check_supported()
+        self.node_designations = designations_from_node_facts(
+            self.atomic_facts)
+        self.edge_facts = [fact for fact in self.atomic_facts if
+                           isinstance(fact, (EdgeExists, PathExists,))]
+        self.matched = set()
+        for assignment in self._matcher().matches():
+            self.matched.add(assignment_key(assignment))
+
+    def _check_supported(self):
+        parsed_query = self.parsed_query
+        if (parsed_query.mode is not None or
+                not isinstance(parsed_query.clause_list[0], MatchWhere)):
+            raise Exception("Only MATCH queries can be watched.")
+        for clause in parsed_query.clause_list:
+            if isinstance(clause, (Paging, OrderBy,)) or (
+                    isinstance(clause, ReturnVariables) and any(
+                        isinstance(variable, Aggregate) for
+                        variable in clause.variable_list)):
+                raise Exception(
+                    "Watched queries can't have aggregates, ORDER BY, SKIP "
+                    "or LIMIT.")
+        for fact in self.atomic_facts:
+            if isinstance(fact, PathExists) and (
+                    fact.shortest or fact.min_hops != 1 or
+                    fact.max_hops != 1):
+                raise Exception(
+                    "Watched queries can't have variable-length "
+                    "relationships.")
+
+    def _matcher(self, anchors=None):
+        return self.parser.matcher_class(
+            self.parser, self.graph_object, self.atomic_facts,
+            anchors=anchors)
+
+    def __len__(self):
+        """The number of matches so far."""
+        return len(self.matched)
+
+    def update(self, nodes=(), edges=()):
+        """Find the matches made by the new ``nodes`` and ``edges`` (``(edge
+           id, source, target, edge label)`` tuples), and pass their rows to
+           the callback, if there are any."""
+        rows = []
+        for anchors in self._anchors(nodes, edges):
+            for assignment in self._matcher(anchors=anchors).matches():
+                key = assignment_key(assignment)
+                if key in self.matched:
+                    continue
+                self.matched.add(key)
+                rows.extend(self.parser.assignment_rows(
+                    self.graph_object, self.parsed_query, assignment))
+        if rows:
+            self.callback(rows)
+
+    def _anchors(self, nodes, edges):
+        """The ``anchors`` of the searches for new matches: each node
+           designation anchored on all the new nodes, and the ends of each
+           edge fact on the ends of each new edge that could satisfy it."""
+        nodes = list(nodes)
+        if nodes:
+            for designation in self.node_designations:
+                yield {designation: nodes}
+        for _, source, target, edge_label in edges:
+            for fact in self.edge_facts:
+                if fact.edge_label not in (None, edge_label,):
+                    continue
+                ends = [(source, target,)]
+                if not getattr(fact, 'directed', True):
+                    ends.append((target, source,))
+                for node_1, node_2 in ends:
+                    if fact.node_1 == fact.node_2:
+                        if node_1 == node_2:
+                            yield {fact.node_1: [node_1]}
+                    else:
+                        yield {fact.node_1: [node_1], fact.node_2: [node_2]}
+
+
+def designations_from_node_facts(atomic_facts):
+    """The designations of the nodes in a query, in order."""
+    return sorted(set(fact.designation for fact in atomic_facts if
+                      isinstance(fact, ClassIs)))
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+This script contains the breadth-first searches behind variable-length
+relationship patterns such as ``(a)-[:DEPENDS*1..3]->(b)`` and behind
+``shortestPath``. They expand a frontier one hop at a time, following only
+edges with the pattern's label, and keep a set of the nodes already seen so
+that no node is expanded twice.
+
+A variable-length pattern matches each pair of nodes joined by some walk of
+an allowed length once, however many such walks there are, rather than once
+for every path as in Neo4j. When both ends of a pattern are bound, the two
+are searched from at once (a bidirectional search), which meets in the
+middle after exploring far fewer nodes than a search from either end.
+"""
+
+# A path pattern whose near end is bound checks each candidate for its far
+# end with a bidirectional search if there are at most this many of them,
+# instead of searching everything reachable from the near end.
+BIDIRECTIONAL_MAX_TARGETS = 16
+
+
+def reachable(neighbors, source, min_hops=1, max_hops=None):
+    """Return the set of nodes that can be reached from ``source`` by a walk
+       of between ``min_hops`` and ``max_hops`` (unbounded if ``None``)
+       hops, where ``neighbors(node)`` gives the nodes one hop on from
+       ``node``. The first ``min_hops`` levels are computed as whole
+       frontiers, since a node may be reached again by a longer walk; after
+       that, each node is only expanded the first time it's reached."""
+    frontier = set([source])
+    depth = 0
+    while depth < min_hops and frontier:
+        frontier = set(neighbor for node in frontier for
+                       neighbor in neighbors(node))
+        depth += 1
+    found = set(frontier)
+    while frontier and (max_hops is None or depth < max_hops):
+        next_frontier = set()
+        for node in frontier:
+            for neighbor in neighbors(node):
+                if neighbor not in found:
+                    found.add(neighbor)
+                    next_frontier.add(neighbor)
+        frontier = next_frontier
+        depth += 1
+    return found
+
+
+def breadth_first_parents(neighbors, source, max_hops=None):
+    """Search from ``source`` up to ``max_hops`` hops out, returning a
+       dictionary from each node reached to the node it was first reached
+       from (``None`` for ``source``)."""
+    parents = {source: None}
+    frontier = [source]
+    depth = 0
+    while frontier and (max_hops is None or depth < max_hops):
+        next_frontier = []
+        for node in frontier:
+            for neighbor in neighbors(node):
+                if neighbor not in parents:
+                    parents[neighbor] = node
+                    next_frontier.append(neighbor)
+        frontier = next_frontier
+        depth += 1
+    return parents
+
+
+def path_to(parents, node):
+    """The list of nodes from the source of ``parents`` to ``node``."""
+    path = []
+    while node is not None:
+        path.append(node)
+        node = parents[node]
+    path.reverse()
+    return path
+
+
+def shortest_path(forward, backward, source, target, max_hops=None):
+    """Return a shortest path from ``source`` to ``target`` of at most
+       ``max_hops`` hops, as a list of nodes, or ``None`` if there's none.
+       ``forward(node)`` gives the nodes one hop on from ``node`` and
+       ``backward(node)`` those one hop before it. The smaller of the two
+       frontiers is expanded a level at a time until they meet."""
+    if source == target:
+        return [source]
+    forward_parents = {source: None}
+    backward_parents = {target: None}
+    forward_frontier, backward_frontier = [source], [target]
+    hops = 0
+    while (forward_frontier and backward_frontier and
+            (max_hops is None or hops < max_hops)):
+        hops += 1
+        if len(forward_frontier) <= len(backward_frontier):
+            frontier, neighbors = forward_frontier, forward
+            parents, other_parents = forward_parents, backward_parents
+        else:
+            frontier, neighbors = backward_frontier, backward
+            parents, other_parents = backward_parents, forward_parents
+        next_frontier = []
+        for node in frontier:
+            for neighbor in neighbors(node):
+                if neighbor in parents:
+                    continue
+                parents[neighbor] = node
+                if neighbor in other_parents:
+                    path = path_to(forward_parents, neighbor)
+                    path.pop()
+                    path.extend(reversed(path_to(backward_parents, neighbor)))
+                    return path
+                next_frontier.append(neighbor)
+        if frontier is forward_frontier:
+            forward_frontier = next_frontier
+        else:
+            backward_frontier = next_frontier
+    return None
+
+
+class PathSearch(object):
+    """The searches for one ``PathExists`` fact, over the graph of a
+       backend (a ``CypherParserBaseClass`` child), whose ``_neighbors``
+       gives the nodes one labeled hop away."""
+    def __init__(self, parser, graph_object, fact):
+        self.fact = fact
+        if fact.directed:
+            self.forward = self._neighbor_function(
+                parser, graph_object, fact.edge_label, (True,))
+            self.backward = self._neighbor_function(
+                parser, graph_object, fact.edge_label, (False,))
+        else:
+            self.forward = self.backward = self._neighbor_function(
+                parser, graph_object, fact.edge_label, (True, False,))
+        # The last search from a node, since the same node is often
+        # searched from for every binding of the designations after it
+        self._last_search = (None, None, None,)
+
+    @staticmethod
+    def _neighbor_function(parser, graph_object, edge_label, directions):
+        def _neighbors(node):
+            for outgoing in directions:
+                for neighbor in parser._neighbors(
+                        graph_object, node, edge_label=edge_label,
+                        outgoing=outgoing):
+                    yield neighbor
+        return _neighbors
+
+    def path(self, source, target):
+        """Return a path matching the fact from ``source`` to ``target`` as
+           a list of nodes, or ``None`` if there's none. For
+           ``shortestPath`` it's a shortest path; otherwise the path is only
+           meaningful as a sign that there is one."""
+        fact = self.fact
+        if fact.shortest or (fact.min_hops <= 1 and source != target):
+            path = shortest_path(self.forward, self.backward, source,
+                                 target, max_hops=fact.max_hops)
+            if path is None or len(path) - 1 < fact.min_hops:
+                return None
+            return path
+        if target in self._search(source, True):
+            return [source, target]
+        return None
+
+    def reached_from(self, node, forward, domain=None):
+        """Generator over ``(other_node, path)`` pairs for the nodes that
+           the fact joins to ``node``: ``node`` is its first node if
+           ``forward`` and its second otherwise. ``path`` runs from the
+           first node to the second for ``shortestPath`` and is ``None``
+           otherwise. Only nodes in ``domain`` (if it isn't ``None``) are
+           returned."""
+        fact = self.fact
+        if domain is not None and len(domain) <= BIDIRECTIONAL_MAX_TARGETS:
+            for other_node in domain:
+                if forward:
+                    path = self.path(node, other_node)
+                else:
+                    path = self.path(other_node, node)
+                if path is not None:
+                    yield other_node, path if fact.shortest else None
+            return
+        found = self._search(node, forward)
+        if not fact.shortest:
+            for other_node in found:
+                if domain is None or other_node in domain:
+                    yield other_node, None
+            return
+        for other_node in found:
+            if domain is not None and other_node not in domain:
+                continue
+            path = path_to(found, other_node)
+            if len(path) - 1 < fact.min_hops:
+                continue
+            if not forward:
+                path.reverse()
+            yield other_node, path
+
+    def _search(self, node, forward):
+        """Everything reachable from ``node`` along the fact, either as a
+           set or (for ``shortestPath``) as a dictionary of parents."""
+        if self._last_search[:2] == (node, forward,):
+            return self._last_search[2]
+        neighbors = self.forward if forward else self.backward
+        if self.fact.shortest:
+            found = breadth_first_parents(neighbors, node,
+                                          max_hops=self.fact.max_hops)
+        else:
+            found = reachable(neighbors, node, min_hops=self.fact.min_hops,
+                              max_hops=self.fact.max_hops)
+        self._last_search = (node, forward, found,)
+        return found
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""
+This script evaluates single-variable WHERE constraints such as
+``m.bar > 10 AND m.baz = 3`` for every node of a class at once, using NumPy
+arrays, instead of one assignment at a time. The surviving nodes become the
+variable's domain for pattern matching.
+
+Values are kept in a ``PropertyColumn`` for each node class and keypath:
+an ``int64`` or ``float64`` array with a null mask when all the values are
+numbers, and an object array otherwise. Missing values compare exactly as
+``None`` does in Python 2 (it's less than everything), so the results are
+the same as checking each node in turn.
+
+NumPy is optional; without it nothing is vectorized. It's only imported
+(by ``load_numpy``) when a WHERE clause is first vectorized, since importing
+it takes longer than importing the rest of the package.
+"""
+
+from cypher_parser import *
+from constraint_compiler import OPERATORS
+
+# The ``numpy`` module once ``load_numpy`` has imported it
+numpy = None
+_numpy_loaded = False
+
+# Classes with fewer nodes than this aren't worth building columns for
+VECTORIZE_MIN_NODES = 1000
+
+# Largest integer that a float64 holds exactly
+_EXACT_FLOAT_INTEGER = 2 ** 53
+_INT64_MAX = 2 ** 63 - 1
+
+
+def load_numpy():
+    """Import NumPy the first time this is called, and return it, or
+       ``None`` if it isn't installed."""
+    global numpy, _numpy_loaded
+    if not _numpy_loaded:
+        try:
+            import numpy as module
+        except ImportError:
+            module = None
+        numpy, _numpy_loaded = module, True
+    return numpy
+
+
+def _is_number(value):
+    return isinstance(value, (int, long, float,)) and not isinstance(
+        value, bool)
+
+
+def _within(values, bound):
+    """True if every value other than ``None`` lies in ``[-bound,
+       bound]``."""
+    present = [value for value in values if value is not None]
+    return len(present) == 0 or (
+        -bound <= min(present) and max(present) <= bound)
+
+
+def _object_array(values):
+    """A one-dimensional object array of ``values``, even if they are
+       tuples or lists themselves."""
+    array = numpy.empty(len(values), dtype=object)
+    for position, value in enumerate(values):
+        array[position] = value
+    return array
+
+
+class PropertyColumn(object):
+    """The values at one keypath for a list of nodes. ``numbers`` is a
+       numeric array (with ``null`` marking the missing values) if every
+       value is a number, and ``objects`` an object array holding all of
+       them, built when first needed."""
+    def __init__(self, nodes, values):
+        self.nodes = _object_array(nodes)
+        self.values = values
+        self.numbers = None
+        self.null = None
+        self._objects = None
+        types = set(map(type, values))
+        types.discard(type(None))
+        if types <= set([int]):
+            self.numbers = self._numeric(numpy.int64, 0)
+        elif types <= set([int, long]):
+            if _within(values, _INT64_MAX):
+                self.numbers = self._numeric(numpy.int64, 0)
+        elif types <= set([int, long, float]):
+            if _within([value for value in values if
+                        not isinstance(value, float)], _EXACT_FLOAT_INTEGER):
+                self.numbers = self._numeric(numpy.float64, 0.0)
+
+    def _numeric(self, dtype, fill):
+        self.null = numpy.array([value is None for value in self.values],
+                                dtype=bool)
+        if not self.null.any():
+            return numpy.array(self.values, dtype=dtype)
+        return numpy.array([fill if value is None else value for
+                            value in self.values], dtype=dtype)
+
+    @property
+    def objects(self):
+        if self._objects is None:
+            self._objects = _object_array(self.values)
+        return self._objects
+
+    def _exactly_comparable(self, value):
+        """True if comparing ``numbers`` with ``value`` gives exactly what
+           Python would, with no loss of precision in converting either."""
+        if self.numbers is None or not _is_number(value):
+            return False
+        elif self.numbers.dtype == numpy.int64:
+            return (isinstance(value, (int, long,)) and
+                    abs(value) <= _INT64_MAX)
+        return (isinstance(value, float) or
+                abs(value) <= _EXACT_FLOAT_INTEGER)
+
+    def compare(self, function_string, value):
+        """Boolean mask of the nodes whose value satisfies
+           ``function_string`` (an operator such as ``'>'``) against
+           ``value``."""
+        function = OPERATORS[function_string]
+        if self._exactly_comparable(value):
+            mask = function(self.numbers, value)
+            # What a missing value (``None``) gives is the same for all
+            if function(None, value):
+                return mask | self.null
+            return mask & ~self.null
+        return numpy.frompyfunc(function, 2, 1)(
+            self.objects, value).astype(bool)
+
+
+class ColumnStore(object):
+    """Cache of ``PropertyColumn`` objects keyed by ``(node_class,
+       keypath)``. A class's columns are dropped whenever a node is added
+       to it, and rebuilt when next needed."""
+    def __init__(self):
+        self.columns = {}
+
+    def column(self, node_class, keypath, load):
+        """Return the column for ``keypath`` over ``node_class``.
+           ``load(keypath)`` must return the class's nodes and their values
+           at ``keypath`` (``None`` where there's none) as two lists."""
+        key = (node_class, tuple(keypath),)
+        column = self.columns.get(key, None)
+        if column is None:
+            nodes, values = load(keypath)
+            column = self.columns[key] = PropertyColumn(nodes, values)
+        return column
+
+    def invalidate(self, node_class):
+        for key in [key for key in self.columns if key[0] == node_class]:
+            del self.columns[key]
+
+    def clear(self):
+        self.columns = {}
+
+
+def vectorizable(constraint, designation):
+    """True if ``constraint`` only compares keypaths of ``designation`` with
+       literal values, combined with AND, OR and NOT."""
+    if isinstance(constraint, And):
+        return (vectorizable(constraint.left_conjunct, designation) and
+                vectorizable(constraint.right_conjunct, designation))
+    elif isinstance(constraint, Or):
+        return (vectorizable(constraint.left_disjunct, designation) and
+                vectorizable(constraint.right_disjunct, designation))
+    elif isinstance(constraint, Not):
+        return vectorizable(constraint.argument, designation)
+    elif isinstance(constraint, Constraint):
+        return (len(constraint.keypath) > 1 and
+                constraint.keypath[0] == designation and
+                constraint.function_string in OPERATORS and
+                isinstance(constraint.value,
+                           (int, long, float, str, unicode,)))
+    return False
+
+
+def constraint_mask(constraint, get_column):
+    """Boolean mask of the nodes satisfying ``constraint``, where
+       ``get_column(keypath)`` returns the ``PropertyColumn`` for the
+       attributes in ``keypath``."""
+    if isinstance(constraint, And):
+        return (constraint_mask(constraint.left_conjunct, get_column) &
+                constraint_mask(constraint.right_conjunct, get_column))
+    elif isinstance(constraint, Or):
+        return (constraint_mask(constraint.left_disjunct, get_column) |
+                constraint_mask(constraint.right_disjunct, get_column))
+    elif isinstance(constraint, Not):
+        return ~constraint_mask(constraint.argument, get_column)
+    return get_column(constraint.keypath[1:]).compare(
+        constraint.function_string, constraint.value)
+
+
+def filter_nodes(column_store, node_class, designation, constraint, load):
+    """Return the set of nodes of ``node_class`` that satisfy
+       ``constraint`` when bound to ``designation``, or ``None`` if it can't
+       be done in a vectorized way. ``load`` is as for
+       ``ColumnStore.column``."""
+    if not vectorizable(constraint, designation) or load_numpy() is None:
+        return None
+
+    def _get_column(keypath):
+        return column_store.column(node_class, keypath, load)
+    mask = constraint_mask(constraint, _get_column)
+    nodes = _get_column(_first_keypath(constraint)).nodes
+    return set(nodes[mask].tolist())
+
+
+def _first_keypath(constraint):
+    if isinstance(constraint, And):
+        return _first_keypath(constraint.left_conjunct)
+    elif isinstance(constraint, Or):
+        return _first_keypath(constraint.left_disjunct)
+    elif isinstance(constraint, Not):
+        return _first_keypath(constraint.argument)
+    return constraint.keypath[1:]
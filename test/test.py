@@ -1,6 +1,11 @@
 import unittest
 import networkx as nx
 from python_cypher import python_cypher
+from python_cypher import compact_graph
+from python_cypher import vectorized
+from python_cypher import instrumentation
+from python_cypher import result_cache
+from python_cypher.indexes import graph_indexes
 
 
 class TestPythonCypher(unittest.TestCase):
@@ -41,6 +46,561 @@ class TestPythonCypher(unittest.TestCase):
         out = list(test_parser.query(g, match_query))
         # self.assertEqual(out[0], ['bar'])
 
+    def test_match_pattern_prunes_to_matching_rows(self):
+        """Test the matcher returns only assignments satisfying the pattern"""
+        g = nx.MultiDiGraph()
+        for i in range(20):
+            g.add_node('n' + str(i), **{'class': 'SOMECLASS', 'bar': i})
+        g.add_node('m', **{'class': 'ANOTHERCLASS', 'bar': 10})
+        g.add_edge('n3', 'm', **{'edge_label': 'EDGECLASS', '_id': 'e0'})
+        g.add_edge('n4', 'm', **{'edge_label': 'OTHERCLASS', '_id': 'e1'})
+        query = ('MATCH (n:SOMECLASS)-[e:EDGECLASS]->(m:ANOTHERCLASS) '
+                 'RETURN n.bar, m.bar, e')
+        test_parser = python_cypher.CypherToNetworkx()
+        out = list(test_parser.query(g, query))
+        self.assertEqual(
+            out, [[3, 10, {'edge_label': 'EDGECLASS', '_id': 'e0'}]])
+
+    def test_edge_index(self):
+        """Test edges are found by id, including after a rebuild"""
+        g = nx.MultiDiGraph()
+        test_parser = python_cypher.CypherToNetworkx()
+        n, m = 'n', 'm'
+        g.add_nodes_from([n, m], **{'class': 'SOMECLASS'})
+        edge_id = test_parser._create_edge(g, n, m, edge_label='EDGECLASS')
+        self.assertTrue(test_parser._is_edge(g, edge_id))
+        self.assertFalse(test_parser._is_edge(g, n))
+        self.assertEqual(test_parser._get_edge_from_id(g, edge_id),
+                         {'edge_label': 'EDGECLASS', '_id': edge_id})
+        g.add_edge(m, n, **{'edge_label': 'EDGECLASS', '_id': 'loaded'})
+        test_parser.rebuild_indexes(g)
+        self.assertTrue(test_parser._is_edge(g, 'loaded'))
+
+    def test_label_index_domain(self):
+        """Test the domain of a classed designation is only that class"""
+        g = nx.MultiDiGraph()
+        g.add_node('loaded', **{'class': 'ANOTHERCLASS'})
+        test_parser = python_cypher.CypherToNetworkx()
+        new_node = test_parser._create_node(g, 'SOMECLASS', foo='bar')
+        self.assertEqual(
+            test_parser._get_domain(g, node_class='SOMECLASS'), {new_node})
+        self.assertEqual(
+            test_parser._get_domain(g, node_class='ANOTHERCLASS'), {'loaded'})
+        self.assertEqual(
+            test_parser._get_domain(g, node_class='MISSING'), set())
+
+    def test_indexes_follow_direct_changes(self):
+        """Test nodes and edges added to the graph directly are found"""
+        g = nx.MultiDiGraph()
+        test_parser = python_cypher.CypherToNetworkx()
+        test_parser._create_node(g, 'SOMECLASS', foo='bar')
+        self.assertEqual(
+            len(list(test_parser.query(g, 'MATCH (n:SOMECLASS) RETURN n'))),
+            1)
+        g.add_node('a', **{'class': 'SOMECLASS', 'foo': 'baz'})
+        g.add_node('b', **{'class': 'SOMECLASS', 'foo': 'qux'})
+        self.assertEqual(
+            len(list(test_parser.query(g, 'MATCH (n:SOMECLASS) RETURN n'))),
+            3)
+        g.add_edge('a', 'b', **{'edge_label': 'EDGECLASS', '_id': 'loaded'})
+        out = list(test_parser.query(
+            g, 'MATCH (n:SOMECLASS)-[e:EDGECLASS]->(m:SOMECLASS) RETURN e'))
+        self.assertEqual(out, [[{'edge_label': 'EDGECLASS',
+                                 '_id': 'loaded'}]])
+
+    def test_property_indexes(self):
+        """Test hash and sorted property indexes seed matching correctly"""
+        g = nx.MultiDiGraph()
+        for i in range(10):
+            g.add_node('n' + str(i), **{'class': 'SOMECLASS', 'bar': i,
+                                        'foo': {'goo': 'g' + str(i % 2)}})
+        test_parser = python_cypher.CypherToNetworkx()
+        test_parser.create_index(g, 'SOMECLASS', 'bar', kind='sorted')
+        test_parser.create_index(g, 'SOMECLASS', 'foo.goo', kind='hash')
+        self.assertEqual(
+            test_parser._indexed_candidates(
+                g, 'SOMECLASS', ['bar'], '>=', 8), {'n8', 'n9'})
+        self.assertIsNone(
+            test_parser._indexed_candidates(
+                g, 'SOMECLASS', ['foo', 'goo'], '>', 'g0'))
+        query = ('MATCH (n:SOMECLASS) WHERE n.bar > 5 AND n.foo.goo = "g1" '
+                 'RETURN n.bar')
+        out = sorted(test_parser.query(g, query))
+        self.assertEqual(out, [[7], [9]])
+
+    def test_parameters_and_query_cache(self):
+        """Test parameterized queries are parsed once and bound per call"""
+        g = nx.MultiDiGraph()
+        for i in range(5):
+            g.add_node('n' + str(i), **{'class': 'SOMECLASS', 'bar': i})
+        test_parser = python_cypher.CypherToNetworkx()
+        query = 'MATCH (n:SOMECLASS) WHERE n.bar > $low RETURN n.bar'
+        out = sorted(test_parser.query(g, query, params={'low': 2}))
+        self.assertEqual(out, [[3], [4]])
+        out = sorted(test_parser.query(g, query, params={'low': 3}))
+        self.assertEqual(out, [[4]])
+        query = 'MATCH (n:SOMECLASS {bar: $bar}) RETURN n.bar'
+        out = list(test_parser.query(g, query, params={'bar': 1}))
+        self.assertEqual(out, [[1]])
+        stats = test_parser.query_cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 2))
+
+    def test_list_parameter_is_a_value(self):
+        """Test a list given as a parameter isn't taken for a keypath"""
+        g = nx.MultiDiGraph()
+        g.add_node('n0', **{'class': 'SOMECLASS', 'tags': ['a', 'b'],
+                            'bar': 1, 'baz': 1})
+        g.add_node('n1', **{'class': 'SOMECLASS', 'tags': ['c'],
+                            'bar': 2, 'baz': 3})
+        test_parser = python_cypher.CypherToNetworkx()
+        query = 'MATCH (n:SOMECLASS) WHERE n.tags = $t RETURN n.bar'
+        out = list(test_parser.query(g, query, params={'t': ['a', 'b']}))
+        self.assertEqual(out, [[1]])
+        query = 'MATCH (n:SOMECLASS) WHERE n.bar = n.baz RETURN n.bar'
+        self.assertEqual(list(test_parser.query(g, query)), [[1]])
+
+    def test_where_pushdown(self):
+        """Test WHERE conjuncts prune as soon as their variables are bound"""
+        checked = []
+
+        class CountingDict(dict):
+            def __getitem__(self, key):
+                checked.append(key)
+                return dict.__getitem__(self, key)
+
+            def get(self, key, default=None):
+                checked.append(key)
+                return dict.get(self, key, default)
+        g = nx.MultiDiGraph()
+        for i in range(30):
+            g.add_node('n' + str(i))
+            g.node['n' + str(i)] = CountingDict(
+                **{'class': 'SOMECLASS', 'bar': i})
+        test_parser = python_cypher.CypherToNetworkx()
+        query = ('MATCH (m:SOMECLASS), (n:SOMECLASS) '
+                 'WHERE m.bar = 1 AND (n.bar = 2 OR m.bar = 5) '
+                 'RETURN m.bar, n.bar')
+        out = sorted(test_parser.query(g, query))
+        self.assertEqual(out, [[1, 2]])
+        # 30 checks of m.bar = 1, then the disjunction only for m = n1:
+        # 30 checks of n.bar = 2, and 29 of m.bar = 5 where that fails.
+        # The last two reads are for the RETURN clause.
+        self.assertEqual(checked.count('bar'), 91)
+
+    def test_compiled_where_clause(self):
+        """Test compiled WHERE clauses, including AND, >= and <="""
+        g = nx.MultiDiGraph()
+        for i in range(6):
+            g.add_node('n' + str(i), **{'class': 'SOMECLASS', 'bar': i,
+                                        'foo': {'goo': i % 2}})
+        test_parser = python_cypher.CypherToNetworkx()
+        query = ('MATCH (n:SOMECLASS) WHERE n.bar >= 2 AND n.bar <= 4 '
+                 'AND NOT n.foo.goo = 1 RETURN n.bar')
+        out = sorted(test_parser.query(g, query))
+        self.assertEqual(out, [[2], [4]])
+        query = ('MATCH (n:SOMECLASS), (m:SOMECLASS) '
+                 'WHERE n.bar = m.foo.goo AND m.bar > 4 RETURN n.bar, m.bar')
+        out = sorted(test_parser.query(g, query))
+        self.assertEqual(out, [[1, 5]])
+
+    def test_planner_starts_at_most_selective_variable(self):
+        """Test the binding order follows statistics, not variable names"""
+        g = nx.MultiDiGraph()
+        for i in range(50):
+            g.add_node('hub' + str(i), **{'class': 'HUB'})
+            g.add_edge('hub' + str(i), 'hub' + str((i + 1) % 50),
+                       **{'edge_label': 'NEXT', '_id': 'next' + str(i)})
+        g.add_node('leaf', **{'class': 'LEAF'})
+        g.add_edge('hub7', 'leaf', **{'edge_label': 'HAS', '_id': 'has'})
+        test_parser = python_cypher.CypherToNetworkx()
+        query = ('MATCH (a:HUB)-[:NEXT]->(b:HUB)-[:HAS]->(z:LEAF) '
+                 'RETURN a, z')
+        parsed_query, atomic_facts = test_parser.parse_cached(query)
+        matcher = python_cypher.PatternMatcher(test_parser, g, atomic_facts)
+        self.assertEqual(matcher.designations, ['z', 'b', 'a'])
+        self.assertEqual(len(list(test_parser.query(g, query))), 1)
+
+    def test_expand_walks_adjacency(self):
+        """Test edge hops expand from bound nodes instead of scanning"""
+        class NoScanParser(python_cypher.CypherToNetworkx):
+            def _get_domain(self, obj, node_class=None):
+                if node_class is None:
+                    raise AssertionError("Scanned every node.")
+                return python_cypher.CypherToNetworkx._get_domain(
+                    self, obj, node_class=node_class)
+        g = nx.MultiDiGraph()
+        g.add_node('n', **{'class': 'SOMECLASS'})
+        for i in range(5):
+            g.add_node('m' + str(i), **{'bar': i})
+            g.add_edge('n', 'm' + str(i), **{
+                'edge_label': 'EDGECLASS' if i % 2 else 'OTHERCLASS',
+                '_id': 'e' + str(i)})
+        g.add_edge('m0', 'n', **{'edge_label': 'EDGECLASS', '_id': 'back'})
+        test_parser = NoScanParser()
+        query = 'MATCH (n:SOMECLASS)-[e:EDGECLASS]->(m) RETURN m.bar, e'
+        out = sorted(row[0] for row in test_parser.query(g, query))
+        self.assertEqual(out, [1, 3])
+        query = 'MATCH (n:SOMECLASS)<-[:EDGECLASS]-(m) RETURN m.bar'
+        self.assertEqual(list(test_parser.query(g, query)), [[0]])
+
+    def test_document_matching_does_not_copy(self):
+        """Test node documents are compared in place, ignoring the class"""
+        document = {'foo': {'goo': 'bar'}, 'baz': 1}
+        self.assertTrue(python_cypher.document_equals(
+            {'class': 'SOMECLASS', 'foo': {'goo': 'bar'}, 'baz': 1},
+            document))
+        self.assertTrue(python_cypher.document_equals(
+            {'foo': {'goo': 'bar'}, 'baz': 1}, document))
+        self.assertFalse(python_cypher.document_equals(
+            {'class': 'SOMECLASS', 'foo': {'goo': 'bar'}}, document))
+        self.assertFalse(python_cypher.document_equals(
+            {'foo': {'goo': 'bar', 'extra': 2}, 'baz': 1}, document))
+        g = nx.MultiDiGraph()
+        g.add_node('n', **{'class': 'SOMECLASS', 'foo': {'goo': 'bar'}})
+        g.add_node('m', **{'class': 'SOMECLASS', 'foo': {'goo': 'baz'}})
+        test_parser = python_cypher.CypherToNetworkx()
+        original_deepcopy = python_cypher.copy.deepcopy
+        python_cypher.copy.deepcopy = None
+        try:
+            out = list(test_parser.query(
+                g, 'MATCH (n:SOMECLASS {foo: {goo: "bar"}}) RETURN n.foo.goo'))
+        finally:
+            python_cypher.copy.deepcopy = original_deepcopy
+        self.assertEqual(out, [['bar']])
+        self.assertEqual(g.node['n']['class'], 'SOMECLASS')
+
+    def test_unwind_bulk_create(self):
+        """Test UNWIND... CREATE and create_many insert in bulk"""
+        g = nx.MultiDiGraph()
+        test_parser = python_cypher.CypherToNetworkx()
+        test_parser.create_index(g, 'SOMECLASS', 'bar', kind='sorted')
+        rows = [{'name': 'n' + str(i), 'bar': i % 3} for i in range(10)]
+        query = ('UNWIND $rows AS r CREATE (n:SOMECLASS {name: r.name, '
+                 'bar: r.bar, foo: {goo: r.goo}})-[:EDGECLASS]->'
+                 '(m:ANOTHERCLASS {bar: r.bar})')
+        list(test_parser.query(g, query, params={'rows': rows}))
+        self.assertEqual((len(g.nodes()), len(g.edges())), (20, 10))
+        self.assertEqual(
+            len(test_parser._indexed_candidates(
+                g, 'SOMECLASS', ['bar'], '=', 1)), 3)
+        query = ('MATCH (n:SOMECLASS)-[:EDGECLASS]->(m:ANOTHERCLASS) '
+                 'WHERE n.name = "n4" RETURN n.foo, m.bar')
+        self.assertEqual(list(test_parser.query(g, query)), [[{}, 1]])
+        documents = [{'bar': 7, 'foo': {'goo': i}} for i in range(5)]
+        new_ids = test_parser.create_many(g, 'SOMECLASS', documents)
+        self.assertEqual(len(set(new_ids)), 5)
+        documents[0]['foo']['goo'] = 'changed'
+        self.assertEqual(g.node[new_ids[0]]['foo'], {'goo': 0})
+        query = 'MATCH (n:SOMECLASS) WHERE n.bar > 2 RETURN n.bar'
+        self.assertEqual(list(test_parser.query(g, query)), [[7]] * 5)
+
+    def test_compact_graph_backend(self):
+        """Test queries run unchanged against the array-backed backend"""
+        g = compact_graph.CompactGraph()
+        test_parser = python_cypher.CypherToCompactGraph()
+        create_query = ('CREATE (n:SOMECLASS {foo: {goo: "bar"}})'
+                        '-[e:EDGECLASS]->(m:ANOTHERCLASS {bar: 10}) RETURN n')
+        list(test_parser.query(g, create_query))
+        rows = [{'bar': i} for i in range(4)]
+        list(test_parser.query(
+            g, 'UNWIND $rows AS r CREATE (n:SOMECLASS {bar: r.bar})'
+            '-[:OTHERCLASS]->(m:ANOTHERCLASS {bar: r.bar})',
+            params={'rows': rows}))
+        self.assertEqual((g.number_of_nodes(), g.number_of_edges()),
+                         (10, 5))
+        query = ('MATCH (n:SOMECLASS {foo: {goo: "bar"}})-[e:EDGECLASS]->'
+                 '(m:ANOTHERCLASS) WHERE m.bar = 10 RETURN n, m.bar, e')
+        self.assertEqual(
+            list(test_parser.query(g, query)),
+            [[{'class': 'SOMECLASS', 'foo': {'goo': 'bar'}}, 10,
+              {'edge_label': 'EDGECLASS', '_id': -1}]])
+        query = 'MATCH (n:SOMECLASS)-->(m) WHERE n.bar > 1 RETURN m.bar'
+        self.assertEqual(sorted(test_parser.query(g, query)), [[2], [3]])
+        # Edges added after the CSR arrays were built are found as well
+        g._build_adjacency()
+        test_parser._create_edge(g, 9, 2, edge_label='OTHERCLASS')
+        query = 'MATCH (n)<-[:OTHERCLASS]-(m) RETURN n.bar, m.bar'
+        self.assertEqual(sorted(test_parser.query(g, query)),
+                         [[0, 0], [0, 3], [1, 1], [2, 2], [3, 3]])
+
+    @unittest.skipIf(vectorized.load_numpy() is None,
+                     'NumPy is not installed')
+    def test_vectorized_where(self):
+        """Test WHERE conjuncts evaluated over columns give the same rows"""
+        g = nx.MultiDiGraph()
+        test_parser = python_cypher.CypherToNetworkx()
+        test_parser.create_many(
+            g, 'SOMECLASS', [{'bar': i, 'baz': 'x' if i % 2 else 'y'} for
+                             i in range(10)] + [{'baz': 'x'}])
+        query = ('MATCH (n:SOMECLASS) WHERE (n.bar < 4 OR n.bar > 7) '
+                 'AND n.baz = "x" RETURN n.bar')
+        expected = sorted(test_parser.query(g, query))
+        self.assertEqual(expected, [[None], [1], [3], [9]])
+        minimum = vectorized.VECTORIZE_MIN_NODES
+        vectorized.VECTORIZE_MIN_NODES = 0
+        try:
+            self.assertEqual(sorted(test_parser.query(g, query)), expected)
+            self.assertEqual(len(graph_indexes(g).columns.columns), 2)
+            # New nodes invalidate the columns for their class
+            test_parser.create_many(g, 'SOMECLASS', [{'bar': 2, 'baz': 'x'}])
+            self.assertEqual(sorted(test_parser.query(g, query)),
+                             [[None], [1], [2], [3], [9]])
+        finally:
+            vectorized.VECTORIZE_MIN_NODES = minimum
+
+    def test_parallel_query(self):
+        """Test a MATCH split among worker processes finds the same rows"""
+        g = nx.MultiDiGraph()
+        test_parser = python_cypher.CypherToNetworkx()
+        nodes = test_parser.create_many(
+            g, 'SOMECLASS', [{'bar': i} for i in range(20)])
+        test_parser._create_edges(
+            g, [(nodes[i], nodes[(i * 7) % 20]) for i in range(20)],
+            edge_label='EDGECLASS')
+        query = ('MATCH (n:SOMECLASS)-[:EDGECLASS]->(m:SOMECLASS) '
+                 'WHERE n.bar > 4 RETURN n.bar, m.bar')
+        serial = list(test_parser.query(g, query))
+        self.assertEqual(len(serial), 15)
+        self.assertEqual(
+            sorted(test_parser.query(g, query, workers=2)), sorted(serial))
+        self.assertEqual(
+            list(test_parser.query(g, query, workers=3, ordered=True)),
+            serial)
+
+    def test_aquery_yields_in_steps(self):
+        """Test the cooperative query returns the rows in bounded steps"""
+        g = nx.MultiDiGraph()
+        test_parser = python_cypher.CypherToNetworkx()
+        test_parser.create_many(
+            g, 'SOMECLASS', [{'bar': i} for i in range(10)])
+        query = 'MATCH (n:SOMECLASS) WHERE n.bar > 2 RETURN n.bar'
+        steps = list(test_parser.aquery(g, query, pause_every=4))
+        self.assertEqual(len(steps), 3)
+        self.assertEqual([row for rows in steps for row in rows],
+                         list(test_parser.query(g, query)))
+
+    def test_skip_limit(self):
+        """Test SKIP and LIMIT return a slice of the rows"""
+        g = nx.MultiDiGraph()
+        test_parser = python_cypher.CypherToNetworkx()
+        test_parser.create_many(
+            g, 'SOMECLASS', [{'bar': i} for i in range(10)])
+        query = 'MATCH (n:SOMECLASS) WHERE n.bar > 2 RETURN n.bar'
+        rows = list(test_parser.query(g, query))
+        self.assertEqual(
+            list(test_parser.query(g, query + ' SKIP 2 LIMIT 3')), rows[2:5])
+        self.assertEqual(
+            list(test_parser.query(g, query + ' LIMIT 0')), [])
+        self.assertEqual(
+            list(test_parser.query(g, query + ' SKIP $n', params={'n': 5})),
+            rows[5:])
+        self.assertEqual(
+            [row for step in test_parser.aquery(
+                g, query + ' SKIP 1 LIMIT 2', pause_every=2)
+             for row in step], rows[1:3])
+
+    def test_aggregation(self):
+        """Test aggregate functions in RETURN, grouped by the other items"""
+        g = nx.MultiDiGraph()
+        test_parser = python_cypher.CypherToNetworkx()
+        test_parser.create_many(
+            g, 'SOMECLASS', [{'bar': i % 2, 'baz': i} for i in range(6)])
+        query = ('MATCH (n:SOMECLASS) RETURN n.bar, count(*), sum(n.baz), '
+                 'avg(n.baz), min(n.baz), max(n.baz), collect(n.goo)')
+        self.assertEqual(sorted(test_parser.query(g, query)),
+                         [[0, 3, 6, 2.0, 0, 4, []], [1, 3, 9, 3.0, 1, 5, []]])
+        query = 'MATCH (n:ANOTHERCLASS) RETURN count(*), avg(n.baz)'
+        self.assertEqual(list(test_parser.query(g, query)), [[0, None]])
+
+    def test_order_by(self):
+        """Test ORDER BY, with and without a sorted index to read from"""
+        g = nx.MultiDiGraph()
+        test_parser = python_cypher.CypherToNetworkx()
+        test_parser.create_many(
+            g, 'SOMECLASS', [{'bar': (i * 7) % 10, 'baz': i % 3} for
+                             i in range(10)])
+        query = 'MATCH (n:SOMECLASS) RETURN n.bar ORDER BY n.bar DESC LIMIT 3'
+        self.assertEqual(list(test_parser.query(g, query)), [[9], [8], [7]])
+        test_parser.create_index(g, 'SOMECLASS', 'bar', kind='sorted')
+        self.assertEqual(list(test_parser.query(g, query)), [[9], [8], [7]])
+        query = ('MATCH (n:SOMECLASS) RETURN n.baz, n.bar '
+                 'ORDER BY n.baz, n.bar DESC SKIP 2 LIMIT 2')
+        self.assertEqual(list(test_parser.query(g, query)), [[0, 1], [0, 0]])
+        query = ('MATCH (n:SOMECLASS) RETURN n.baz, count(*) '
+                 'ORDER BY count(*) DESC, n.baz DESC')
+        self.assertEqual(list(test_parser.query(g, query)),
+                         [[0, 4], [2, 3], [1, 3]])
+
+    def test_variable_length_paths(self):
+        """Test variable-length relationships and shortestPath"""
+        g = nx.MultiDiGraph()
+        test_parser = python_cypher.CypherToNetworkx()
+        test_parser.create_many(g, 'SOMECLASS', [{'bar': i} for i in range(5)])
+        nodes = {g.node[node]['bar']: node for node in g.node}
+        for i in range(4):
+            g.add_edge(nodes[i], nodes[i + 1], edge_label='EDGECLASS')
+        g.add_edge(nodes[4], nodes[0], edge_label='OTHERCLASS')
+        test_parser.rebuild_indexes(g)
+        query = ('MATCH (n:SOMECLASS {bar: 0})-[:EDGECLASS*2..3]->'
+                 '(m:SOMECLASS) RETURN m.bar')
+        self.assertEqual(sorted(test_parser.query(g, query)), [[2], [3]])
+        query = ('MATCH (n:SOMECLASS)-[*3..4]->(m:SOMECLASS {bar: 1}) '
+                 'RETURN n.bar')
+        self.assertEqual(sorted(test_parser.query(g, query)), [[2], [3]])
+        query = ('MATCH p = shortestPath((n:SOMECLASS {bar: 3})-[*]-'
+                 '(m:SOMECLASS {bar: 0})) RETURN p')
+        self.assertEqual([[node['bar'] for node in path] for
+                          [path] in test_parser.query(g, query)],
+                         [[3, 4, 0]])
+
+    def test_explain_profile(self):
+        """Test EXPLAIN returns the plan and PROFILE annotates it"""
+        g = nx.MultiDiGraph()
+        test_parser = python_cypher.CypherToNetworkx()
+        test_parser.create_many(
+            g, 'SOMECLASS', [{'bar': i} for i in range(10)])
+        query = 'MATCH (n:SOMECLASS) WHERE n.bar > 5 RETURN n.bar LIMIT 2'
+        [plan] = test_parser.query(g, 'EXPLAIN ' + query)
+        self.assertEqual(
+            [line.split()[0] for line in str(plan).splitlines()[:4]],
+            ['+ProduceResults', '+Limit', '+Filter', '+NodeByLabelScan'])
+        rows = list(test_parser.query(g, 'PROFILE ' + query))
+        self.assertEqual(rows, list(test_parser.query(g, query)))
+        profile = test_parser.last_profile.as_dict()['plan']
+        self.assertEqual(profile['rows_out'], 2)
+        scan = profile['children'][0]['children'][0]['children'][0]
+        self.assertEqual(scan['operator'], 'NodeByLabelScan')
+        self.assertTrue(scan['rows_out'] >= 2 and scan['db_hits'] > 0)
+
+    def test_observers_and_metrics(self):
+        """Test observers see each phase and get the query's metrics"""
+        g = nx.MultiDiGraph()
+        test_parser = python_cypher.CypherToNetworkx()
+        nodes = test_parser.create_many(
+            g, 'SOMECLASS', [{'bar': i} for i in range(5)])
+        test_parser._create_edges(
+            g, zip(nodes[:3], nodes[1:3] + nodes[:1]), edge_label='NEXT')
+
+        class Recorder(instrumentation.QueryObserver):
+            def __init__(self):
+                self.events = []
+
+            def parse_finished(self, query_string, cache_hit):
+                self.events.append(('parse', cache_hit,))
+
+            def plan_chosen(self, query_string, plan):
+                self.events.append(('plan', plan.binding_order,))
+
+            def row_emitted(self, query_string, row):
+                self.events.append(('row', row,))
+
+            def query_finished(self, query_string, metrics):
+                self.events.append(('finished', metrics,))
+        recorder = Recorder()
+        aggregator = instrumentation.LatencyAggregator()
+        test_parser.add_observer(recorder)
+        test_parser.add_observer(aggregator)
+        query = ('MATCH (a:SOMECLASS)-[:NEXT]->(b:SOMECLASS)-[:NEXT]->'
+                 '(c:SOMECLASS)-[:NEXT]->(a) WHERE a.bar = {} RETURN b.bar')
+        self.assertEqual(list(test_parser.query(g, query.format(4))), [])
+        for bar in (0, 0):
+            del recorder.events[:]
+            list(test_parser.query(g, query.format(bar)))
+        self.assertEqual(recorder.events[0], ('parse', True,))
+        self.assertEqual(recorder.events[1][0], 'plan')
+        self.assertEqual(recorder.events[2:-1], [('row', [1],)])
+        metrics = recorder.events[-1][1]
+        self.assertTrue(metrics.candidates > 0 and metrics.expansions > 0)
+        self.assertEqual((metrics.assignments, metrics.rows,), (1, 1,))
+        self.assertTrue(metrics.edge_lookups > 0)
+        self.assertEqual(
+            aggregator.snapshot()[query.format('?')]['count'], 3)
+        test_parser.remove_observer(recorder)
+        test_parser.remove_observer(aggregator)
+        self.assertEqual(len(list(test_parser.query(
+            g, 'MATCH (a:SOMECLASS) RETURN a.bar'))), 5)
+        self.assertEqual(len(recorder.events), 4)
+
+    def test_standing_query(self):
+        """Test a watched query reports only the new matches"""
+        g = nx.MultiDiGraph()
+        test_parser = python_cypher.CypherToNetworkx()
+        foos = test_parser.create_many(
+            g, 'FOO', [{'bar': i} for i in range(3)])
+        goos = test_parser.create_many(
+            g, 'GOO', [{'baz': i} for i in range(3)])
+        test_parser._create_edges(g, [(foos[0], goos[0])], edge_label='TO')
+        found = []
+        standing_query = test_parser.watch(
+            g, 'MATCH (f:FOO)-[:TO]->(g:GOO) WHERE g.baz > 0 '
+            'RETURN f.bar, g.baz', found.append)
+        self.assertEqual(len(standing_query), 0)
+        # The edges go in four batches, but are reported all at once
+        batch_size = python_cypher.CREATE_BATCH_SIZE
+        python_cypher.CREATE_BATCH_SIZE = 1
+        try:
+            test_parser._create_edges(
+                g, [(foos[1], goos[1]), (foos[1], goos[1]),
+                    (foos[2], goos[0]), (foos[2], goos[2])],
+                edge_label='TO')
+        finally:
+            python_cypher.CREATE_BATCH_SIZE = batch_size
+        self.assertEqual(found, [[[1, 1], [2, 2]]])
+        # Nor is an edge alongside an old one a new match
+        test_parser._create_edges(g, [(foos[1], goos[1])], edge_label='TO')
+        self.assertEqual(found, [[[1, 1], [2, 2]]])
+        test_parser._create_edge(g, foos[0], goos[2], edge_label='FROM')
+        list(test_parser.query(g, 'CREATE (f:FOO {bar: 7})-[:TO]->'
+                                  '(g:GOO {baz: 8})'))
+        self.assertEqual(found, [[[1, 1], [2, 2]], [[7, 8]]])
+        test_parser.unwatch(standing_query)
+        test_parser._create_edge(g, foos[0], goos[2], edge_label='TO')
+        self.assertEqual(len(found), 2)
+
+    def test_result_cache(self):
+        """Test cached results last until their classes are written to"""
+        g = nx.MultiDiGraph()
+        cache = result_cache.ResultCache(max_size=2)
+        test_parser = python_cypher.CypherToNetworkx(result_cache=cache)
+        foos = test_parser.create_many(
+            g, 'FOO', [{'bar': i} for i in range(3)])
+        test_parser._create_edges(g, [(foos[0], foos[1])], edge_label='TO')
+        query = 'MATCH (f:FOO)-[:TO]->(g:FOO) RETURN f.bar, g.bar'
+        self.assertEqual(list(test_parser.query(g, query)), [[0, 1]])
+        self.assertEqual(list(test_parser.query(g, query)), [[0, 1]])
+        self.assertEqual((cache.hits, cache.misses,), (1, 1,))
+        test_parser.create_many(g, 'GOO', [{'baz': 1}])
+        test_parser._create_edges(g, [(foos[0], foos[2])], edge_label='BY')
+        list(test_parser.query(g, query))
+        self.assertEqual((cache.hits, cache.misses,), (2, 1,))
+        test_parser._create_edges(g, [(foos[1], foos[2])], edge_label='TO')
+        self.assertEqual(sorted(test_parser.query(g, query)),
+                         [[0, 1], [1, 2]])
+        self.assertEqual(cache.misses, 2)
+        for bar in range(3):
+            list(test_parser.query(g, 'MATCH (f:FOO) WHERE f.bar = $bar '
+                                      'RETURN f', params={'bar': bar}))
+        self.assertEqual(len(cache.entries), 2)
+        cache.max_bytes = max(cache.sizes.values())
+        list(test_parser.query(g, query))
+        self.assertEqual(len(cache.entries), 1)
+        self.assertTrue(cache.total_bytes <= cache.max_bytes)
+
+    def test_result_cache_direct_changes(self):
+        """Test cached results don't outlast nodes and edges added directly"""
+        g = nx.MultiDiGraph()
+        test_parser = python_cypher.CypherToNetworkx(
+            result_cache=result_cache.ResultCache())
+        foos = test_parser.create_many(g, 'FOO', [{'bar': 1}, {'bar': 2}])
+        query = 'MATCH (n:FOO) RETURN n.bar'
+        self.assertEqual(sorted(test_parser.query(g, query)), [[1], [2]])
+        g.add_node('new_foo', **{'class': 'FOO', 'bar': 3})
+        self.assertEqual(sorted(test_parser.query(g, query)),
+                         [[1], [2], [3]])
+        query = 'MATCH (f:FOO)-[:TO]->(g:FOO) RETURN f.bar, g.bar'
+        self.assertEqual(list(test_parser.query(g, query)), [])
+        g.add_edge(foos[0], foos[1], edge_label='TO', _id='new_edge')
+        self.assertEqual(list(test_parser.query(g, query)), [[1, 2]])
 
 if __name__ == '__main__':
     unittest.main()